@@ -1,101 +1,92 @@
-import os
 import sys
-import pickle
 import streamlit as st
-import numpy as np
 from recommender.logger.log import logging
-from recommender.config.configuration import AppConfiguration
-from recommender.pipelines.training_pipeline import TrainingPipeline
+from recommender.pipelines.training_job import TrainingJobRunner, RUNNING_STATES
 from recommender.exception.exception_handler import AppException
+from recommender.config.configuration import AppConfiguration
+from recommender.serving.poster_cache import PosterCache
+from recommender.serving.recommendation import Recommendation as RecommendationEngine
+
 
+class Recommendation(RecommendationEngine):
+    """Streamlit front end, all recommendation logic lives in recommender.serving.recommendation"""
 
-class Recommendation:
-    def __init__(self,app_config = AppConfiguration()):
+    def train_engine(self):
         try:
-            self.recommendation_config= app_config.get_recommendation_config()
+            # training runs in its own process, sessions keep serving the current artifacts meanwhile
+            if get_training_job_runner().start():
+                logging.info("Training job started")
+            else:
+                st.warning("A training run is already in progress.")
         except Exception as e:
             raise AppException(e, sys) from e
 
-
-    def fetch_poster(self,suggestion):
+    
+    def recommendations_engine(self,selected_books):
         try:
-            book_name = []
-            ids_index = []
-            poster_url = []
-            book_pivot =  pickle.load(open(self.recommendation_config.book_pivot_serialized_objects,'rb'))
-            final_rating =  pickle.load(open(self.recommendation_config.final_rating_serialized_objects,'rb'))
+            recommended_books,poster_url = self.recommend_book(selected_books)
+            # covers are served from the local thumbnail cache instead of the remote urls
+            poster_url = get_poster_cache().get_posters(poster_url)
+            # one column per neighbor, a title with few co-readers can have less than five
+            if len(recommended_books) < 2:
+                st.info("No similar books found for this title.")
+                return
+            for col, book, poster in zip(st.columns(len(recommended_books) - 1), recommended_books[1:], poster_url[1:]):
+                with col:
+                    st.text(book)
+                    st.image(poster)
+        except Exception as e:
+            raise AppException(e, sys) from e
 
-            for book_id in suggestion:
-                book_name.append(book_pivot.index[book_id])
 
-            for name in book_name[0]: 
-                ids = np.where(final_rating['title'] == name)[0][0]
-                ids_index.append(ids)
 
-            for idx in ids_index:
-                url = final_rating.iloc[idx]['image_url']
-                poster_url.append(url)
+@st.cache_resource
+def get_recommendation() -> Recommendation:
+    # one engine per process, shared by every session
+    return Recommendation()
 
-            return poster_url
-        
-        except Exception as e:
-            raise AppException(e, sys) from e
-        
 
+@st.cache_resource
+def get_poster_cache() -> PosterCache:
+    # one thumbnail cache and fetch pool per process
+    return PosterCache(AppConfiguration().get_poster_cache_config())
 
-    def recommend_book(self,book_name):
-        try:
-            books_list = []
-            model = pickle.load(open(self.recommendation_config.trained_model_path,'rb'))
-            book_pivot =  pickle.load(open(self.recommendation_config.book_pivot_serialized_objects,'rb'))
-            book_id = np.where(book_pivot.index == book_name)[0][0]
-            distance, suggestion = model.kneighbors(book_pivot.iloc[book_id,:].values.reshape(1,-1), n_neighbors=6 )
-
-            poster_url = self.fetch_poster(suggestion)
-            
-            for i in range(len(suggestion)):
-                    books = book_pivot.index[suggestion[i]]
-                    for j in books:
-                        books_list.append(j)
-            return books_list , poster_url   
-        
-        except Exception as e:
-            raise AppException(e, sys) from e
 
+@st.cache_resource
+def get_training_job_runner() -> TrainingJobRunner:
+    return TrainingJobRunner()
 
-    def train_engine(self):
-        try:
-            obj = TrainingPipeline()
-            obj.start_training_pipeline()
-            st.text("Training Completed!")
-            logging.info("Recommended successfully!")
-        except Exception as e:
-            raise AppException(e, sys) from e
 
-    
-    def recommendations_engine(self,selected_books):
-        try:
-            recommended_books,poster_url = self.recommend_book(selected_books)
-            col1, col2, col3, col4, col5 = st.columns(5)
-            with col1:
-                st.text(recommended_books[1])
-                st.image(poster_url[1])
-            with col2:
-                st.text(recommended_books[2])
-                st.image(poster_url[2])
-
-            with col3:
-                st.text(recommended_books[3])
-                st.image(poster_url[3])
-            with col4:
-                st.text(recommended_books[4])
-                st.image(poster_url[4])
-            with col5:
-                st.text(recommended_books[5])
-                st.image(poster_url[5])
-        except Exception as e:
-            raise AppException(e, sys) from e
+def training_progress():
+    # the status file is only polled while a job runs, idle sessions render it once
+    status = get_training_job_runner().status()
+    if status['state'] in RUNNING_STATES:
+        training_progress_live()
+    else:
+        training_outcome(status)
+
 
+@st.fragment(run_every=2)
+def training_progress_live():
+    # reruns on its own every 2 seconds, without rerunning the rest of the page
+    runner = get_training_job_runner()
+    status = runner.status()
+    if status['state'] not in RUNNING_STATES:
+        # the whole page reruns once, which renders the outcome and stops the polling
+        st.rerun()
+    stage = status.get('stage') or 'starting'
+    st.progress(status['stages_done'] / status['n_stages'], text=f"Training: {stage.replace('_', ' ')}")
+    if st.button("Cancel Training"):
+        runner.cancel()
+
+
+def training_outcome(status):
+    if status['state'] == 'succeeded':
+        st.success("Training Completed!")
+    elif status['state'] == 'cancelled':
+        st.info("Training cancelled.")
+    elif status['state'] == 'failed':
+        st.error(f"Training failed: {status.get('error')}")
 
 
 if __name__ == "__main__":
@@ -103,36 +94,46 @@ if __name__ == "__main__":
     st.title("📚 Book Recommender System")
     st.caption("A collaborative filtering-based engine to suggest similar books.")
 
-    obj = Recommendation()
+    obj = get_recommendation()
 
     with st.sidebar:
         st.header("Recommender Controls")
         if st.button('Train Recommender System'):
-            with st.spinner("Training in progress..."):
-                obj.train_engine()
+            obj.train_engine()
+        training_progress()
+        st.caption(f"Model version: {obj.recommendation_config.version or 'unversioned'}")
 
     tab1, tab2 = st.tabs(["📖 Get Book Recommendations", "ℹ️ About This App"])
 
     with tab1:
         try:
-            book_names = pickle.load(open(os.path.join('templates', 'book_names.pkl'), 'rb'))
+            query = st.text_input("🔎 Search a book by title or author", placeholder="e.g. harry potter, tolkien")
+
+            # only the best matches go to the browser, not the whole catalog
+            matches = obj.search_titles(query, limit=20)
+            authors = {match['title']: match['author'] for match in matches}
+            if query and not matches:
+                st.info("No book matches your search.")
 
             selected_book = st.selectbox(
                 "📚 Choose a book you like:",
-                book_names,
+                list(authors),
+                format_func=lambda title: f"{title} — {authors[title]}" if authors[title] else title,
                 help="This book will be used as a reference to recommend similar titles."
             )
 
-            if st.button("🔍 Show Recommendations"):
+            if selected_book and st.button("🔍 Show Recommendations"):
                 with st.spinner("Finding great reads..."):
                     recommended_books, poster_urls = obj.recommend_book(selected_book)
+                    posters = get_poster_cache().get_posters(poster_urls[1:])
 
                     st.subheader(f"Books similar to *{selected_book}*")
-                    cols = st.columns(len(poster_urls) - 1)
-
-                    for i in range(1, len(poster_urls)):
-                        with cols[i - 1]:
-                            st.image(poster_urls[i], use_container_width="always", caption=recommended_books[i])
+                    if len(recommended_books) < 2:
+                        st.info("No similar books found for this title.")
+                    else:
+                        for col, book, poster in zip(st.columns(len(recommended_books) - 1), recommended_books[1:], posters):
+                            with col:
+                                st.image(poster, use_container_width="always", caption=book)
 
         except Exception as e:
             st.error("⚠️ Something went wrong. Please make sure the data is available.")
@@ -143,7 +144,7 @@ if __name__ == "__main__":
         ### How it works:
         - Uses **collaborative filtering** to recommend similar books.
         - Trained on user rating data to find relationships between books.
-        - Powered by **Scikit-learn KNN**, Streamlit, and preprocessed rating data.
+        - Powered by a configurable model (**KNN** over rating vectors, **item-item cosine** similarity or **SVD** title embeddings), Streamlit, and preprocessed rating data.
         
         ### Features:
         - Train the system from the sidebar.
@@ -0,0 +1,90 @@
+"""
+Import-time guard of the serving path.
+
+    python benchmarks/check_import_time.py --budget 0.4
+
+Imports the serving entry modules in fresh interpreters and fails (exit status 1) when a
+training-only dependency comes along, or when the fastest of --repeat cold imports takes
+longer than the budget. On failure the slowest imports reported by python -X importtime
+are printed.
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# what serve.py and the Streamlit app import before the first request
+SERVING_MODULES = ('recommender.serving.server', 'recommender.serving.recommendation',
+                   'recommender.serving.poster_cache', 'recommender.pipelines.training_job')
+# imported on demand by training, incremental updates and batch scoring only, submodules included
+TRAINING_ONLY_MODULES = ('pandas', 'sklearn', 'scipy', 'pyarrow', 'kaggle', 'dotenv',
+                         'recommender.pipelines.training_pipeline', 'recommender.components')
+# numpy alone takes ~0.1s, the serving path measured ~0.23s on one core (0.64s when it still pulled in pandas and scipy)
+DEFAULT_BUDGET_SECONDS = 0.4
+
+_MEASURE = """
+import sys, json, time
+start = time.perf_counter()
+for module in {modules!r}:
+    __import__(module)
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'modules': sorted(sys.modules)}}))
+"""
+
+
+def measure_imports(modules=SERVING_MODULES, cwd=REPO_ROOT) -> dict:
+    """Seconds to import modules in a fresh interpreter, with every module and top-level package it loaded"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get('PYTHONPATH')])))
+    output = subprocess.run([sys.executable, '-c', _MEASURE.format(modules=tuple(modules))],
+                            cwd=cwd, env=env, capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['packages'] = sorted({module.split('.')[0] for module in result['modules']})
+    return result
+
+
+def leaked_modules(modules) -> list:
+    """The TRAINING_ONLY_MODULES entries that were imported, directly or through one of their submodules"""
+    return sorted(forbidden for forbidden in TRAINING_ONLY_MODULES
+                  if any(module == forbidden or module.startswith(forbidden + '.') for module in modules))
+
+
+def slowest_imports(modules=SERVING_MODULES, cwd=REPO_ROOT, limit: int = 15) -> list:
+    """(cumulative seconds, module) of the slowest imports, from python -X importtime"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get('PYTHONPATH')])))
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', ';'.join(f"import {module}" for module in modules)],
+                            cwd=cwd, env=env, capture_output=True, text=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        parts = line.split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        rows.append((int(parts[1]) / 1e6, parts[2].rstrip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check the import time of the serving path")
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET_SECONDS, help="seconds the fastest cold import may take")
+    parser.add_argument('--repeat', type=int, default=5, help="fresh interpreters to measure, the fastest counts")
+    args = parser.parse_args()
+
+    runs = [measure_imports() for _ in range(args.repeat)]
+    seconds = min(run['seconds'] for run in runs)
+    leaked = leaked_modules(runs[0]['modules'])
+
+    print(f"serving import: {seconds:.3f}s (budget {args.budget:.3f}s)")
+    if leaked:
+        print(f"training-only modules imported on the serving path: {', '.join(leaked)}")
+    if leaked or seconds > args.budget:
+        print("slowest imports:")
+        for cumulative, module in slowest_imports():
+            print(f"  {cumulative:8.3f}s {module}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Compares two benchmark result files from run_benchmarks.py.
+
+    python benchmarks/compare_benchmarks.py baseline.json candidate.json --threshold 10
+
+Prints every metric of the scales both files contain with its relative change, and exits
+with status 1 when a metric got worse by more than threshold percent.
+"""
+import sys
+import json
+import argparse
+
+# training stages shorter than this are too noisy to flag
+MIN_STAGE_SECONDS = 0.05
+
+
+def flatten(run: dict) -> dict:
+    """{metric name: (value, higher_is_better)} of one scale's run"""
+    metrics = {'training.total_seconds': (run['training']['total_seconds'], False)}
+    for stage, stage_result in run['training']['stages'].items():
+        if stage_result.get('status') != 'completed':
+            continue
+        metrics[f"training.{stage}.seconds"] = (stage_result['seconds'], False)
+        if stage_result.get('peak_rss_mb') is not None:
+            metrics[f"training.{stage}.peak_rss_mb"] = (stage_result['peak_rss_mb'], False)
+
+    # quality should not drop when a configuration gets faster
+    for model, evaluation in run.get('evaluation', {}).items():
+        for metric in ('hit_rate_at_k', 'ndcg_at_k', 'coverage'):
+            metrics[f"evaluation.{model}.{metric}"] = (evaluation[metric], True)
+        metrics[f"evaluation.{model}.train.seconds"] = (evaluation['train_seconds'], False)
+        # absent from runs recorded before indexing and lookup latency were reported,
+        # the microsecond row lookups are left out, the serving benchmarks time recommend_book end to end
+        if 'index_seconds' in evaluation:
+            metrics[f"evaluation.{model}.index.seconds"] = (evaluation['index_seconds'], False)
+        if 'user_scoring_ms_p95' in evaluation:
+            metrics[f"evaluation.{model}.user_scoring_ms_p95"] = (evaluation['user_scoring_ms_p95'], False)
+
+    if 'startup' in run:
+        metrics['startup.serving_import_seconds'] = (run['startup']['serving_import_seconds'], False)
+
+    serving = run['serving']
+    metrics['serving.load_seconds'] = (serving['load_seconds'], False)
+    for operation, stats in serving.items():
+        if not isinstance(stats, dict):
+            continue
+        for percentile in ('p50_ms', 'p95_ms', 'p99_ms'):
+            metrics[f"serving.{operation}.{percentile}"] = (stats[percentile], False)
+        metrics[f"serving.{operation}.throughput_per_s"] = (stats['throughput_per_s'], True)
+    return metrics
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> list:
+    """Rows of (scale, metric, baseline, candidate, change %, regressed)"""
+    rows = []
+    candidate_runs = {run['scale']: run for run in candidate['runs']}
+    for baseline_run in baseline['runs']:
+        candidate_run = candidate_runs.get(baseline_run['scale'])
+        if candidate_run is None:
+            continue
+        baseline_metrics, candidate_metrics = flatten(baseline_run), flatten(candidate_run)
+        for name, (old, higher_is_better) in baseline_metrics.items():
+            if name not in candidate_metrics or not old:
+                continue
+            new = candidate_metrics[name][0]
+            change = (new - old) / old * 100
+            worse = -change if higher_is_better else change
+            noisy = name.endswith('.seconds') and max(old, new) < MIN_STAGE_SECONDS
+            rows.append((baseline_run['scale'], name, old, new, change, worse > threshold and not noisy))
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=10.0, help="percent change that counts as a regression")
+    args = parser.parse_args()
+
+    with open(args.baseline) as baseline_file, open(args.candidate) as candidate_file:
+        rows = compare(json.load(baseline_file), json.load(candidate_file), args.threshold)
+
+    for scale, name, old, new, change, regressed in rows:
+        print(f"{scale:>10} {name:<48} {old:>14.4f} {new:>14.4f} {change:>+8.1f}%{'  REGRESSION' if regressed else ''}")
+    regressions = sum(row[-1] for row in rows)
+    print(f"{regressions} regression(s) above {args.threshold}%")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+"""
+Pipeline and serving benchmarks on synthetic Book-Crossing-shaped data.
+
+    python benchmarks/run_benchmarks.py --scales 10k,100k,1M --output benchmark.json
+
+Every scale runs in its own process and working directory: the dataset is generated, the
+full training pipeline runs with per-stage wall time and peak RSS, then recommendation
+latency percentiles and throughput are measured on the published artifacts. The holdout
+quality of every evaluated model type is copied from the model evaluation report. Results are
+written as JSON, compare two runs with benchmarks/compare_benchmarks.py.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+SCHEMA_VERSION = 1
+# per model type from the evaluation report, compare_benchmarks flags drops in the quality ones
+EVALUATION_METRICS = ('hit_rate_at_k', 'ndcg_at_k', 'coverage', 'train_seconds', 'index_seconds',
+                      'lookup_ms_p95', 'user_scoring_ms_p95')
+
+
+def parse_scale(value: str) -> int:
+    """'10k' -> 10000, '1M' -> 1000000"""
+    value = value.strip().lower()
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(value[-1:], 1)
+    return int(float(value.rstrip('km')) * multiplier)
+
+
+def reset_peak_rss() -> bool:
+    """Resets the process peak RSS (Linux only), so each stage reports its own peak"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _proc_status_mb(field: str):
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+
+
+def rss_mb() -> float:
+    """Current resident memory of this process in MB, None where /proc is not available"""
+    return _proc_status_mb('VmRSS')
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process in MB since the last reset_peak_rss()"""
+    peak = _proc_status_mb('VmHWM')
+    if peak is not None:
+        return peak
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        return None
+
+
+def latency_stats(latencies: list, items_per_call: int = 1) -> dict:
+    import numpy as np
+    latencies = np.asarray(latencies)
+    total = latencies.sum()
+    return {
+        'calls': int(len(latencies)),
+        'p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'p95_ms': float(np.percentile(latencies, 95) * 1000),
+        'p99_ms': float(np.percentile(latencies, 99) * 1000),
+        'mean_ms': float(latencies.mean() * 1000),
+        'throughput_per_s': float(len(latencies) * items_per_call / total) if total > 0 else None,
+    }
+
+
+def time_calls(fn, args_list: list, warmup: int) -> list:
+    for args in args_list[:warmup]:
+        fn(*args)
+    latencies = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def write_benchmark_config(work_dir: str, n_ratings: int, scale_thresholds: bool) -> dict:
+    """
+    Copies config.yaml into work_dir, book_ratings_threshold scaled down for datasets smaller than
+    Book-Crossing, and with the model evaluation comparing every candidate
+    """
+    import yaml
+    from synthetic_data import BX_RATINGS
+    with open(os.path.join(REPO_ROOT, 'config', 'config.yaml')) as config_file:
+        config = yaml.safe_load(config_file)
+
+    data_validation_config = config['data_validation_config']
+    if scale_thresholds and n_ratings < BX_RATINGS:
+        # the user threshold is a per-user count and holds at every scale, but a dataset smaller
+        # than Book-Crossing has too few heavy users for any book to reach the book threshold
+        data_validation_config['book_ratings_threshold'] = max(
+            2, round(int(data_validation_config['book_ratings_threshold']) * n_ratings / BX_RATINGS))
+    # the quality and cost of every model type go into the results, not only the configured one
+    config.setdefault('model_evaluation_config', {})['compare_candidates'] = True
+    os.makedirs(os.path.join(work_dir, 'config'), exist_ok=True)
+    with open(os.path.join(work_dir, 'config', 'config.yaml'), 'w') as config_file:
+        yaml.safe_dump(config, config_file, sort_keys=False)
+    return {'user_ratings_threshold': int(data_validation_config['user_ratings_threshold']),
+            'book_ratings_threshold': int(data_validation_config['book_ratings_threshold'])}
+
+
+def benchmark_training(result: dict) -> None:
+    from recommender.pipelines.training_pipeline import TrainingPipeline
+
+    stages = {}
+
+    def on_stage(stage, event):
+        if event == 'started':
+            reset_peak_rss()
+            stages[stage] = {'start_rss_mb': rss_mb(), 'started': time.perf_counter()}
+        else:
+            # memory of pool worker processes is not included
+            stages[stage].update(status=event, seconds=time.perf_counter() - stages[stage].pop('started'), peak_rss_mb=peak_rss_mb())
+
+    start = time.perf_counter()
+    pipeline = TrainingPipeline()
+    pipeline.start_training_pipeline(force=True, on_stage=on_stage)
+    result['training'] = {'total_seconds': time.perf_counter() - start, 'stages': stages}
+
+    # holdout quality of every model type, next to the cost of training and indexing it
+    evaluation_config = pipeline.app_config.get_model_evaluation_config()
+    # a failed evaluation does not fail the run, it leaves no report
+    if evaluation_config.enabled and os.path.exists(evaluation_config.evaluation_report_path):
+        with open(evaluation_config.evaluation_report_path) as report_file:
+            report = json.load(report_file)
+        result['evaluation'] = {name: {metric: model[metric] for metric in EVALUATION_METRICS}
+                                for name, model in report['models'].items()}
+
+
+def benchmark_serving(result: dict, n_queries: int, batch_size: int, seed: int) -> None:
+    import numpy as np
+    from recommender.serving.recommendation import Recommendation
+
+    reset_peak_rss()
+    start = time.perf_counter()
+    engine = Recommendation()
+    engine.load_artifacts()
+    load_seconds = time.perf_counter() - start
+
+    titles = engine.get_book_titles()
+    rng = np.random.default_rng(seed)
+    queries = [str(title) for title in titles[rng.integers(0, len(titles), n_queries)]]
+    batches = [queries[i:i + batch_size] for i in range(0, len(queries) - batch_size + 1, batch_size)] or [queries]
+    warmup = min(50, n_queries // 10)
+
+    serving = {'titles': int(len(titles)), 'load_seconds': load_seconds}
+    serving['title_lookup'] = latency_stats(time_calls(engine.has_title, [(title,) for title in queries], warmup))
+    # what a search box sends while the title is typed, lowercase and cut mid-word
+    serving['title_search'] = latency_stats(time_calls(engine.search_titles, [(title.lower()[:10],) for title in queries], warmup))
+    serving['fetch_poster'] = latency_stats(time_calls(engine.get_poster_url, [(title,) for title in queries], warmup))
+    # uncached latency of the full lookup, then the same queries through the result cache
+    engine.result_cache.enabled = False
+    serving['recommend_book'] = latency_stats(time_calls(engine.recommend_book, [(title,) for title in queries], warmup))
+    engine.result_cache.enabled = True
+    serving['recommend_book_cached'] = dict(latency_stats(time_calls(engine.recommend_book, [(title,) for title in queries], warmup)),
+                                            hit_ratio=engine.result_cache.stats()['hit_ratio'])
+    serving['recommend_books_batch'] = dict(latency_stats(time_calls(engine.recommend_books, [(batch,) for batch in batches], 1),
+                                                          len(batches[0])), batch_size=len(batches[0]))
+    # every batch of titles is scored as batch_size one-title histories in a single sparse product
+    serving['recommend_for_users_batch'] = dict(
+        latency_stats(time_calls(engine.recommend_for_users, [([[title] for title in batch],) for batch in batches], 1), len(batches[0])),
+        batch_size=len(batches[0]))
+    serving['peak_rss_mb'] = peak_rss_mb()
+    result['serving'] = serving
+
+
+def benchmark_startup(result: dict) -> None:
+    from check_import_time import measure_imports, TRAINING_ONLY_MODULES
+    # in a fresh interpreter, this process already imported the training side
+    imports = measure_imports(cwd=os.getcwd())
+    result['startup'] = {'serving_import_seconds': imports['seconds'],
+                         'training_only_modules': sorted(set(TRAINING_ONLY_MODULES).intersection(imports['packages']))}
+
+
+def run_scale(args) -> None:
+    """Benchmarks one scale, runs in its own process with work_dir as working directory"""
+    from synthetic_data import generate_dataset
+
+    result = {'scale': args.scale}
+    os.makedirs(args.work_dir, exist_ok=True)
+    os.chdir(args.work_dir)
+    result['thresholds'] = write_benchmark_config(args.work_dir, args.scale, not args.keep_thresholds)
+
+    start = time.perf_counter()
+    result['dataset'] = generate_dataset(args.scale, os.path.join('artifacts', 'dataset', 'raw_data', 'bookrecommendation.zip'), args.seed)
+    result['dataset']['generate_seconds'] = time.perf_counter() - start
+
+    # the zip is already local, the Kaggle client only needs credentials to be importable
+    os.environ.setdefault('KAGGLE_USERNAME', 'benchmark')
+    os.environ.setdefault('KAGGLE_KEY', 'benchmark')
+    benchmark_training(result)
+    benchmark_serving(result, args.queries, args.batch_size, args.seed)
+    benchmark_startup(result)
+
+    with open(args.result_file, 'w') as result_file:
+        json.dump(result, result_file, indent=2)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the training pipeline and recommendation latency")
+    parser.add_argument('--scales', default='10k,100k', help="comma separated rating counts, e.g. 10k,100k,1M,10M")
+    parser.add_argument('--queries', type=int, default=2000, help="single-title queries per scale")
+    parser.add_argument('--batch-size', type=int, default=32, help="titles per batch request")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--keep-thresholds', action='store_true', help="use config.yaml's thresholds unscaled")
+    parser.add_argument('--work-dir', help="where datasets and artifacts are written (default: a temporary directory)")
+    parser.add_argument('--keep-artifacts', action='store_true', help="keep the temporary work directory after the run")
+    parser.add_argument('--output', default='benchmark.json', help="JSON result file")
+    # internal: benchmark a single scale in this process
+    parser.add_argument('--scale', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scale is not None:
+        return run_scale(args)
+
+    root_dir = os.path.abspath(args.work_dir) if args.work_dir else tempfile.mkdtemp(prefix='recommender-benchmark-')
+    report = {
+        'schema_version': SCHEMA_VERSION,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'settings': {'queries': args.queries, 'batch_size': args.batch_size, 'seed': args.seed,
+                     'scaled_thresholds': not args.keep_thresholds},
+        'runs': [],
+    }
+    try:
+        for scale in [parse_scale(value) for value in args.scales.split(',')]:
+            work_dir = os.path.join(root_dir, f"scale_{scale}")
+            result_file = os.path.join(root_dir, f"result_{scale}.json")
+            print(f"Benchmarking {scale} ratings in {work_dir}", flush=True)
+            # a fresh process per scale: imports, caches and peak RSS start from zero
+            subprocess.run([sys.executable, os.path.abspath(__file__), '--scale', str(scale), '--result-file', result_file,
+                            '--work-dir', work_dir, '--queries', str(args.queries), '--batch-size', str(args.batch_size),
+                            '--seed', str(args.seed)] + (['--keep-thresholds'] if args.keep_thresholds else []), check=True)
+            with open(result_file) as run_file:
+                run = json.load(run_file)
+            report['runs'].append(run)
+            print(f"  training {run['training']['total_seconds']:.1f}s, "
+                  f"recommend_book p50 {run['serving']['recommend_book']['p50_ms']:.3f}ms "
+                  f"p99 {run['serving']['recommend_book']['p99_ms']:.3f}ms", flush=True)
+
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+        print(f"Results written to {args.output}")
+    finally:
+        # a work directory given on the command line is never removed
+        if not args.work_dir and not args.keep_artifacts:
+            shutil.rmtree(root_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
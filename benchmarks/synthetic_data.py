@@ -0,0 +1,97 @@
+import os
+import zipfile
+import numpy as np
+import pandas as pd
+
+# shape of the real Book-Crossing dump the generator scales from
+BX_RATINGS = 1149780
+BX_USERS = 105283
+BX_BOOKS = 271379
+# about 62% of Book-Crossing ratings are implicit (rating 0)
+IMPLICIT_SHARE = 0.62
+# explicit ratings 1..10 lean high like the real data
+EXPLICIT_WEIGHTS = np.array([1, 1, 2, 2, 8, 6, 11, 17, 13, 14], dtype=float)
+# ratings per user are lognormal: median ~2, mean ~11, ~0.6% of users above 200
+USER_ACTIVITY_SIGMA = 1.8
+# book popularity falls off as rank ** -BOOK_POPULARITY_EXPONENT, the top book gets ~0.25% of the ratings
+BOOK_POPULARITY_EXPONENT = 0.6
+# share of books that are another edition (new ISBN) of an existing title
+EDITION_SHARE = 0.1
+
+CHUNK_ROWS = 1_000_000
+
+
+def _isbns(ids: np.ndarray) -> np.ndarray:
+    return np.char.zfill(ids.astype(str), 10)
+
+
+def write_books(file_path: str, n_books: int, rng) -> None:
+    isbns = _isbns(np.arange(n_books))
+    title_ids = np.arange(n_books)
+    editions = rng.random(n_books) < EDITION_SHARE
+    title_ids[editions] = rng.integers(0, n_books, editions.sum())
+    books = pd.DataFrame({
+        'ISBN': isbns,
+        'Book-Title': np.char.add('Synthetic Book ', title_ids.astype(str)),
+        'Book-Author': np.char.add('Author ', (title_ids // 3).astype(str)),
+        'Year-Of-Publication': rng.integers(1950, 2005, n_books),
+        'Publisher': np.char.add('Publisher ', (title_ids % 500).astype(str)),
+    })
+    image_url = np.char.add(np.char.add('http://images.amazon.com/images/P/', isbns), '.01.LZZZZZZZ.jpg')
+    books['Image-URL-S'] = np.char.replace(image_url, 'LZZZZZZZ', 'THUMBZZZ')
+    books['Image-URL-M'] = np.char.replace(image_url, 'LZZZZZZZ', 'MZZZZZZZ')
+    books['Image-URL-L'] = image_url
+    books.to_csv(file_path, sep=';', index=False, encoding='latin-1', quoting=1)
+
+
+def write_ratings(file_path: str, n_ratings: int, n_users: int, n_books: int, rng) -> int:
+    """Writes about n_ratings distinct (user, book) ratings, returns the exact count"""
+    activity = rng.lognormal(0.0, USER_ACTIVITY_SIGMA, n_users)
+    counts = np.maximum(np.round(activity * n_ratings / activity.sum()), 1).astype(np.int64)
+    user_ids = np.repeat(np.arange(1, n_users + 1), counts)[:n_ratings]
+    rng.shuffle(user_ids)
+
+    popularity = (np.arange(1, n_books + 1) ** -BOOK_POPULARITY_EXPONENT)
+    book_ids = rng.choice(n_books, size=len(user_ids), p=popularity / popularity.sum())
+    # a user rates a book once
+    pairs = np.unique(user_ids * np.int64(n_books) + book_ids)
+    rng.shuffle(pairs)
+
+    written = 0
+    for start in range(0, len(pairs), CHUNK_ROWS):
+        chunk = pairs[start:start + CHUNK_ROWS]
+        explicit = rng.random(len(chunk)) >= IMPLICIT_SHARE
+        rating = np.where(explicit, rng.choice(np.arange(1, 11), len(chunk), p=EXPLICIT_WEIGHTS / EXPLICIT_WEIGHTS.sum()), 0)
+        pd.DataFrame({'User-ID': chunk // n_books, 'ISBN': _isbns(chunk % n_books), 'Book-Rating': rating}).to_csv(
+            file_path, sep=';', index=False, encoding='latin-1', quoting=1, mode='w' if start == 0 else 'a', header=start == 0)
+        written += len(chunk)
+    return written
+
+
+def generate_dataset(n_ratings: int, zip_file_path: str, seed: int = 0) -> dict:
+    """
+    Writes a Book-Crossing-shaped dataset of about n_ratings ratings as the zip the ingestion stage expects.
+
+    Users, books, rating values and the skew of user activity and book popularity follow the
+    proportions of the real dump, so thresholds and sparsity behave the same at every scale.
+    Returns the generated counts.
+    """
+    rng = np.random.default_rng(seed)
+    n_users = max(int(n_ratings * BX_USERS / BX_RATINGS), 10)
+    n_books = max(int(n_ratings * BX_BOOKS / BX_RATINGS), 10)
+
+    work_dir = os.path.dirname(zip_file_path)
+    os.makedirs(work_dir, exist_ok=True)
+    books_file = os.path.join(work_dir, 'BX-Books.csv')
+    ratings_file = os.path.join(work_dir, 'BX-Book-Ratings.csv')
+    write_books(books_file, n_books, rng)
+    written = write_ratings(ratings_file, n_ratings, n_users, n_books, rng)
+
+    # stored, not deflated, the benchmark measures the pipeline and not zlib
+    with zipfile.ZipFile(zip_file_path, 'w', compression=zipfile.ZIP_STORED) as zip_file:
+        zip_file.write(books_file, 'BX-Books.csv')
+        zip_file.write(ratings_file, 'BX-Book-Ratings.csv')
+    os.remove(books_file)
+    os.remove(ratings_file)
+
+    return {'n_ratings': written, 'n_users': n_users, 'n_books': n_books, 'seed': seed}
@@ -1,4 +1,29 @@
-from recommender.pipelines.training_pipeline import TrainingPipeline
+import argparse
+from recommender.config.configuration import AppConfiguration
+from recommender.utils.artifact_versions import ArtifactVersions
 
-obj = TrainingPipeline()
-obj.start_training_pipeline()
\ No newline at end of file
+parser = argparse.ArgumentParser(description="Train the book recommender")
+parser.add_argument('--delta', help="ratings csv (BX-Book-Ratings format) to fold into the last trained model instead of a full rebuild")
+parser.add_argument('--force', action='store_true', help="rerun every stage even when its inputs are unchanged")
+parser.add_argument('--rollback', nargs='?', const='', metavar='VERSION',
+                    help="serve a previously published artifact version (default: the one before the current version)")
+parser.add_argument('--list-versions', action='store_true', help="list the published artifact versions")
+args = parser.parse_args()
+
+if args.list_versions or args.rollback is not None:
+    # version management does not need the training dependencies
+    artifact_versions = ArtifactVersions(AppConfiguration().get_artifact_versions_config())
+    if args.list_versions:
+        current = artifact_versions.current()
+        for version in artifact_versions.list_versions():
+            manifest = artifact_versions.read_manifest(version)
+            print(f"{'*' if version == current else ' '} {version}  {manifest['source']}")
+    else:
+        print(f"Serving version {artifact_versions.rollback(args.rollback or None)}")
+else:
+    from recommender.pipelines.training_pipeline import TrainingPipeline
+    obj = TrainingPipeline()
+    if args.delta:
+        obj.start_incremental_pipeline(args.delta)
+    else:
+        obj.start_training_pipeline(force=args.force)
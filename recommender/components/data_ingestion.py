@@ -2,15 +2,11 @@ import os
 import sys
 import zipfile
 import pandas as pd
-from dotenv import load_dotenv
 from abc import ABC, abstractmethod
-from kaggle.api.kaggle_api_extended import KaggleApi
 import logging
 from recommender.exception.exception_handler import AppException
 from recommender.config.configuration import AppConfiguration
 
-load_dotenv() # Load environment variables from .env file
-
 # Abstract class for data ingestion
 class DataIngestion(ABC):
     @abstractmethod
@@ -20,8 +16,9 @@ class DataIngestion(ABC):
 
 # Concrete class for ingesting data from a ZIP file
 class ZipDataIngestion(DataIngestion):
-    def __init__(self, app_config=AppConfiguration()):
+    def __init__(self, app_config: AppConfiguration = None):
         try:
+            app_config = app_config or AppConfiguration()
             self.data_ingestion_config = app_config.get_data_ingestion_config()
             logging.info(f"{'='*20}Data Ingestion Initialized{'='*20}")
         except Exception as e:
@@ -30,6 +27,10 @@ class ZipDataIngestion(DataIngestion):
     def download_data(self) -> str:
         """Downloads the dataset from Kaggle and returns the zip file path"""
         try:
+            # dotenv and the Kaggle client are only needed to download, kaggle authenticates on import
+            from dotenv import load_dotenv
+            load_dotenv() # Load environment variables from .env file
+
             # Load Kaggle credentials from environment variables
             username = os.getenv("KAGGLE_USERNAME")
             key = os.getenv("KAGGLE_KEY")
@@ -48,6 +49,7 @@ class ZipDataIngestion(DataIngestion):
                 logging.info(f"Zip file already exists at {zip_file_path}. Skipping download.")
                 return zip_file_path
 
+            from kaggle.api.kaggle_api_extended import KaggleApi
             api = KaggleApi()
             api.authenticate()
 
@@ -1,14 +1,18 @@
 import os
 import sys
+import numpy as np
 import pandas as pd
-import pickle
+from scipy.sparse import coo_matrix
 from recommender.logger.log import logging
 from recommender.exception.exception_handler import AppException
 from recommender.config.configuration import AppConfiguration
+from recommender.utils.array_io import save_array, save_rating_matrix, atomic_write
+from recommender.utils.title_search import save_title_search
 
 class DataTransformation:
-    def __init__(self, app_config=AppConfiguration()):
+    def __init__(self, app_config: AppConfiguration = None):
         try:
+            app_config = app_config or AppConfiguration()
             self.data_transformation_config = app_config.get_data_transformation_config()
             self.data_validation_config= app_config.get_data_validation_config()
             logging.info(f"{'='*20}Data Transformation Initialized{'='*20}")
@@ -19,30 +23,69 @@ class DataTransformation:
     
     def get_data_transformer(self):
         try:
-            df = pd.read_csv(self.data_transformation_config.clean_data_file_path)
+            df = pd.read_parquet(self.data_transformation_config.clean_data_file_path,
+                                 columns=['title', 'user_id', 'rating', 'author', 'year', 'publisher', 'image_url'])
+            df = df.drop_duplicates(['title', 'user_id'])
 
-            # Lets create a pivot table
-            book_pivot = df.pivot_table(columns='user_id', index='title', values= 'rating')
-            logging.info(f" Shape of book pivot table: {book_pivot.shape}")
-            book_pivot.fillna(0, inplace=True)
+            # Lets build the sparse titles x users matrix straight from categorical codes,
+            # categories are sorted so rows/columns keep the order pivot_table used to give
+            titles = pd.Categorical(df['title']).remove_unused_categories()
+            users = pd.Categorical(df['user_id'])
+            book_sparse = coo_matrix((df['rating'].to_numpy(dtype=np.float32), (titles.codes, users.codes)),
+                                     shape=(len(titles.categories), len(users.categories))).tocsr()
+            # unrated cells used to be filled with 0, so explicit 0 ratings are the same as missing
+            book_sparse.eliminate_zeros()
+            logging.info(f" Shape of book matrix: {book_sparse.shape}, non-zero ratings: {book_sparse.nnz}")
 
-            #saving pivot table data
+            #keeping books name
+            book_names = pd.Index(titles.categories, name='title')
+
+            #per-title metadata aligned with the matrix rows, poster of a row id is book_metadata['image_url'][row_id]
+            book_metadata = (df.drop_duplicates('title')
+                               .set_index('title')
+                               .reindex(book_names)[['author', 'year', 'publisher', 'image_url']]
+                               .reset_index())
+
+            self.save_book_matrix(book_sparse, book_names, users.categories)
+            self.save_title_artifacts(book_names, book_metadata)
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def save_book_matrix(self, book_sparse, book_names, user_ids):
+        try:
+            #saving sparse matrix (uint8 ratings, int32 indices) with its title and user id arrays
             os.makedirs(self.data_transformation_config.transformed_data_dir, exist_ok=True)
-            pickle.dump(book_pivot,open(os.path.join(self.data_transformation_config.transformed_data_dir,"transformed_data.pkl"),'wb'))
-            logging.info(f"Saved pivot table data to {self.data_transformation_config.transformed_data_dir}")
+            save_rating_matrix(self.data_transformation_config.book_matrix_file_path, book_sparse)
+            save_array(self.data_transformation_config.book_titles_file_path, np.asarray(book_names, dtype=str))
+            save_array(self.data_transformation_config.user_ids_file_path, np.asarray(user_ids, dtype=np.int64))
+            logging.info(f"Saved sparse book matrix to {self.data_transformation_config.transformed_data_dir}")
 
-            #keeping books name
-            book_names = book_pivot.index
+        except Exception as e:
+            raise AppException(e, sys) from e
 
-            #saving book_names objects for web app
-            os.makedirs(self.data_validation_config.serialized_objects_dir, exist_ok=True)
-            pickle.dump(book_names,open(os.path.join(self.data_validation_config.serialized_objects_dir, "book_names.pkl"),'wb'))
-            logging.info(f"Saved book_names serialization object to {self.data_validation_config.serialized_objects_dir}")
 
-            #saving book_pivot objects for web app
+    def save_title_artifacts(self, book_names, book_metadata):
+        try:
             os.makedirs(self.data_validation_config.serialized_objects_dir, exist_ok=True)
-            pickle.dump(book_pivot,open(os.path.join(self.data_validation_config.serialized_objects_dir, "book_pivot.pkl"),'wb'))
-            logging.info(f"Saved book_pivot serialization object to {self.data_validation_config.serialized_objects_dir}")
+            with atomic_write(self.data_transformation_config.book_metadata_file_path) as tmp_path:
+                book_metadata.to_parquet(tmp_path, index=False)
+            logging.info(f"Saved book_metadata to {self.data_transformation_config.book_metadata_file_path}")
+
+            #poster urls as a raw array so serving workers can memory-map them
+            save_array(self.data_transformation_config.poster_urls_file_path, book_metadata['image_url'].fillna('').to_numpy(dtype=str))
+            logging.info(f"Saved poster_urls to {self.data_transformation_config.poster_urls_file_path}")
+
+            #fuzzy title/author search index for the book selector, rows aligned with the title row ids
+            save_title_search(self.data_transformation_config.title_search_prefix, book_names, book_metadata['author'].tolist())
+            logging.info(f"Saved title search index to {self.data_transformation_config.title_search_prefix}_*.npy")
+
+            #title -> row id index so serving never scans the titles, written last so it never points past the other tables
+            title_index = pd.DataFrame({'title': book_names, 'row_id': np.arange(len(book_names), dtype=np.int32)})
+            with atomic_write(self.data_transformation_config.title_index_file_path) as tmp_path:
+                title_index.to_parquet(tmp_path, index=False)
+            logging.info(f"Saved title_index to {self.data_transformation_config.title_index_file_path}")
 
         except Exception as e:
             raise AppException(e, sys) from e
@@ -1,15 +1,25 @@
 import os
 import sys
 import pandas as pd
-import pickle
 from recommender.logger.log import logging
 from recommender.exception.exception_handler import AppException
 from recommender.config.configuration import AppConfiguration
+from recommender.utils.array_io import atomic_write
+
+
+def list_ratings_files(data_validation_config) -> list:
+    """The raw ratings csv followed by the delta files folded in by incremental training, oldest first"""
+    files = [data_validation_config.ratings_csv_file]
+    delta_dir = data_validation_config.delta_data_dir
+    if os.path.isdir(delta_dir):
+        files += [os.path.join(delta_dir, f) for f in sorted(os.listdir(delta_dir)) if f.endswith('.csv')]
+    return files
 
 
 class DataValidation:
-    def __init__(self, app_config=AppConfiguration()):
+    def __init__(self, app_config: AppConfiguration = None):
         try:
+            app_config = app_config or AppConfiguration()
             self.data_validation_config = app_config.get_data_validation_config()
             logging.info(f"{'='*20}Data Validation Initialized{'='*20}")
         except Exception as e:
@@ -17,8 +27,10 @@ class DataValidation:
         
     def preprocess_data(self):
         try:
-            ratings = pd.read_csv(self.data_validation_config.ratings_csv_file, sep=";", on_bad_lines='skip', encoding='latin-1')
-            books = pd.read_csv(self.data_validation_config.books_csv_file, sep=";", on_bad_lines='skip', encoding='latin-1', low_memory=False)
+            # ISBNs are ids, a file whose ISBNs all look numeric must not lose their leading zeros
+            ratings = pd.concat([pd.read_csv(file_path, sep=";", on_bad_lines='skip', encoding='latin-1', dtype={'ISBN': str})
+                                 for file_path in self.ratings_files()], ignore_index=True)
+            books = pd.read_csv(self.data_validation_config.books_csv_file, sep=";", on_bad_lines='skip', encoding='latin-1', low_memory=False, dtype={'ISBN': str})
             
             logging.info(f" Shape of ratings data file: {ratings.shape}")
             logging.info(f" Shape of books data file: {books.shape}")
@@ -39,7 +51,8 @@ class DataValidation:
                                 'Book-Rating':'rating'},inplace=True)
 
             # Lets store users who had at least rated more than 200 books
-            x = ratings['user_id'].value_counts() > 200
+            user_counts = ratings['user_id'].value_counts()
+            x = user_counts > self.data_validation_config.user_ratings_threshold
             y = x[x].index
             ratings = ratings[ratings['user_id'].isin(y)]
 
@@ -50,28 +63,142 @@ class DataValidation:
             final_rating = ratings_with_books.merge(number_rating, on='title')
 
             # Lets take those books which got at least 50 rating of user
-            final_rating = final_rating[final_rating['num_of_rating'] >= 50]
+            final_rating = final_rating[final_rating['num_of_rating'] >= self.data_validation_config.book_ratings_threshold]
 
             # lets drop the duplicates
             final_rating.drop_duplicates(['user_id','title'],inplace=True)
             logging.info(f" Shape of the final clean dataset: {final_rating.shape}")
                         
+            self.save_clean_data(final_rating)
+            self.save_rating_counts(user_counts, number_rating.set_index('title')['num_of_rating'])
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+        
+    def ratings_files(self) -> list:
+        """The raw ratings csv followed by the delta files folded in by incremental training, oldest first"""
+        try:
+            return list_ratings_files(self.data_validation_config)
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def iter_ratings(self, usecols=None, files=None):
+        """Yields the ratings in chunks with user_id/ISBN/rating columns, never holding a whole file"""
+        try:
+            for file_path in files or self.ratings_files():
+                for chunk in pd.read_csv(file_path, sep=";", on_bad_lines='skip', encoding='latin-1',
+                                         usecols=usecols, dtype={'ISBN': str}, chunksize=self.data_validation_config.chunk_size):
+                    yield chunk.rename(columns={"User-ID": 'user_id', 'Book-Rating': 'rating'})
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def read_books(self):
+        """Compact ISBN -> book metadata map, only the columns needed downstream"""
+        try:
+            books = pd.read_csv(self.data_validation_config.books_csv_file, sep=";", on_bad_lines='skip', encoding='latin-1', low_memory=False,
+                                dtype={'ISBN': str}, usecols=['ISBN', 'Book-Title', 'Book-Author', 'Year-Of-Publication', 'Publisher', 'Image-URL-L'])
+            books.rename(columns={"Book-Title":'title',
+                                'Book-Author':'author',
+                                "Year-Of-Publication":'year',
+                                "Publisher":"publisher",
+                                "Image-URL-L":"image_url"},inplace=True)
+            return books.drop_duplicates('ISBN').set_index('ISBN')
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def save_rating_counts(self, user_counts, title_counts):
+        """Keeps the filter counts so incremental training can update threshold membership"""
+        try:
+            os.makedirs(self.data_validation_config.clean_data_dir, exist_ok=True)
+            with atomic_write(self.data_validation_config.user_counts_file_path) as tmp_path:
+                pd.DataFrame({'user_id': user_counts.index.astype('int64'), 'count': user_counts.to_numpy(dtype='int64')}) \
+                  .to_parquet(tmp_path, index=False)
+            with atomic_write(self.data_validation_config.title_counts_file_path) as tmp_path:
+                pd.DataFrame({'title': title_counts.index.astype(str), 'count': title_counts.to_numpy(dtype='int64')}) \
+                  .to_parquet(tmp_path, index=False)
+            logging.info(f"Saved rating counts to {self.data_validation_config.clean_data_dir}")
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def save_clean_data(self, final_rating):
+        try:
+            # explicit compact dtypes so later stages don't re-infer them from text
+            final_rating = final_rating.astype({'user_id': 'int32',
+                                                'rating': 'uint8',
+                                                'num_of_rating': 'int32',
+                                                'title': 'category'})
+            final_rating['year'] = pd.to_numeric(final_rating['year'], errors='coerce').astype('Int16')
+
             # Saving the cleaned data for transformation
             os.makedirs(self.data_validation_config.clean_data_dir, exist_ok=True)
-            final_rating.to_csv(os.path.join(self.data_validation_config.clean_data_dir,'clean_data.csv'), index = False)
-            logging.info(f"Saved cleaned data to {self.data_validation_config.clean_data_dir}")
+            with atomic_write(self.data_validation_config.clean_data_file_path) as tmp_path:
+                final_rating.to_parquet(tmp_path, index=False)
+            logging.info(f"Saved cleaned data to {self.data_validation_config.clean_data_file_path}")
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def preprocess_data_streaming(self):
+        """
+        Same output as preprocess_data, but the ratings files are never held in memory.
+
+        The ratings are read in chunks three times: the first pass counts ratings per user,
+        the second counts ratings per title among the surviving users (a title's count depends
+        on the user filter, so it needs its own pass) and the third keeps only the surviving rows.
+        Only counts and a compact ISBN -> book metadata map are kept between passes, so peak
+        memory scales with the filtered output instead of the raw dump.
+        """
+        try:
+            books = self.read_books()
+            isbn_to_title = books['title']
+            logging.info(f" Shape of books data file: {books.shape}")
+
+            # pass 1: ratings per user
+            user_counts = pd.Series(dtype='int64')
+            n_ratings = 0
+            for chunk in self.iter_ratings(usecols=['User-ID']):
+                user_counts = user_counts.add(chunk['user_id'].value_counts(), fill_value=0)
+                n_ratings += len(chunk)
+            user_counts = user_counts.astype('int64')
+            kept_users = user_counts.index[user_counts > self.data_validation_config.user_ratings_threshold]
+            logging.info(f" Streamed {n_ratings} ratings, {len(kept_users)} of {len(user_counts)} users kept")
+
+            # pass 2: ratings per title among the kept users
+            title_counts = pd.Series(dtype='int64')
+            for chunk in self.iter_ratings(usecols=['User-ID', 'ISBN']):
+                chunk = chunk[chunk['user_id'].isin(kept_users)]
+                titles = chunk['ISBN'].map(isbn_to_title).dropna()
+                title_counts = title_counts.add(titles.value_counts(), fill_value=0)
+            title_counts = title_counts.astype('int64')
+            kept_titles = title_counts.index[title_counts >= self.data_validation_config.book_ratings_threshold]
+            logging.info(f" {len(kept_titles)} of {len(title_counts)} titles kept")
+
+            # pass 3: join only the surviving rows against the metadata map
+            kept_isbns = isbn_to_title.index[isbn_to_title.isin(kept_titles)]
+            parts = []
+            for chunk in self.iter_ratings():
+                chunk = chunk[chunk['user_id'].isin(kept_users) & chunk['ISBN'].isin(kept_isbns)]
+                parts.append(chunk.join(books, on='ISBN', how='inner'))
+
+            final_rating = pd.concat(parts, ignore_index=True)
+            final_rating['num_of_rating'] = final_rating['title'].map(title_counts)
+
+            # lets drop the duplicates
+            final_rating.drop_duplicates(['user_id','title'],inplace=True)
+            logging.info(f" Shape of the final clean dataset: {final_rating.shape}")
 
-            #saving final_rating objects for web app
-            os.makedirs(self.data_validation_config.serialized_objects_dir, exist_ok=True)
-            pickle.dump(final_rating, open(os.path.join(self.data_validation_config.serialized_objects_dir, "final_rating.pkl"),'wb'))
-            logging.info(f"Saved final_rating serialization object to {self.data_validation_config.serialized_objects_dir}")
+            self.save_clean_data(final_rating)
+            self.save_rating_counts(user_counts, title_counts)
 
         except Exception as e:
             raise AppException(e, sys) from e
         
     def start_data_validation(self):
         try:
-            self.preprocess_data()
+            if self.data_validation_config.streaming:
+                self.preprocess_data_streaming()
+            else:
+                self.preprocess_data()
             logging.info(f"{'='*20}Data Validation completed{'='*20} \n\n")
         except Exception as e:
             raise AppException(e, sys) from e
\ No newline at end of file
@@ -0,0 +1,348 @@
+import os
+import sys
+import time
+import shutil
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_matrix, csr_matrix, diags
+from sklearn.metrics import pairwise_distances
+from recommender.logger.log import logging
+from recommender.config.configuration import AppConfiguration
+from recommender.exception.exception_handler import AppException
+from recommender.engines.neighbor_engine import NeighborEngineFactory
+from recommender.components.data_validation import DataValidation
+from recommender.components.data_transformation import DataTransformation
+from recommender.components.model_training import ModelTrainer
+from recommender.components.neighbor_indexing import NeighborIndexer, block_kneighbors
+from recommender.engines.item_similarity import item_cosine_similarity, similarity_neighbor_table
+from recommender.engines.item_embedding import svd_item_embeddings, embedding_neighbor_table
+from recommender.utils.array_io import load_csr_buffers, load_rating_matrix
+
+
+class IncrementalTrainer:
+    """
+    Folds a delta ratings file into the artifacts of the last full training run.
+
+    The saved user/title counts are updated with the delta, so users and titles that cross
+    the thresholds are picked up exactly as a full rebuild would pick them up. The raw
+    ratings are only re-read when threshold membership changes. New titles and users are
+    appended to the sparse matrix (existing row ids stay stable) and only the titles whose
+    neighbor lists can have changed are queried again. The svd model has no such shortcut
+    and is factorized again.
+    """
+
+    def __init__(self, app_config: AppConfiguration = None):
+        try:
+            app_config = app_config or AppConfiguration()
+            self.data_validation = DataValidation(app_config)
+            self.data_transformation = DataTransformation(app_config)
+            self.model_trainer = ModelTrainer(app_config)
+            self.neighbor_indexer = NeighborIndexer(app_config)
+            self.data_validation_config = self.data_validation.data_validation_config
+            self.data_transformation_config = self.data_transformation.data_transformation_config
+            self.model_trainer_config = self.model_trainer.model_trainer_config
+            self.neighbor_index_config = self.neighbor_indexer.neighbor_index_config
+            logging.info(f"{'='*20}Incremental Training Initialized{'='*20}")
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def load_rating_counts(self):
+        try:
+            for file_path in (self.data_validation_config.user_counts_file_path, self.data_validation_config.title_counts_file_path):
+                if not os.path.exists(file_path):
+                    raise FileNotFoundError(f"{file_path} not found, run the full training pipeline once before incremental updates")
+
+            user_counts = pd.read_parquet(self.data_validation_config.user_counts_file_path).set_index('user_id')['count']
+            title_counts = pd.read_parquet(self.data_validation_config.title_counts_file_path).set_index('title')['count']
+            return user_counts, title_counts
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def scan_ratings(self, files, keep):
+        """Streams the given ratings files and keeps the rows selected by keep(chunk)"""
+        try:
+            parts = [chunk[keep(chunk)] for chunk in self.data_validation.iter_ratings(files=files)]
+            return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=['user_id', 'ISBN', 'rating'])
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def collect_new_ratings(self, delta_file_path):
+        """
+        Updates the counts with the delta and returns them with the clean rows the delta adds.
+
+        Rows are returned in ratings file order, so keeping the first rating of a (user, title)
+        pair gives the same result as the full rebuild.
+        """
+        try:
+            user_threshold = self.data_validation_config.user_ratings_threshold
+            book_threshold = self.data_validation_config.book_ratings_threshold
+            user_counts, title_counts = self.load_rating_counts()
+            books = self.data_validation.read_books()
+            isbn_to_title = books['title']
+            files = self.data_validation.ratings_files() + [delta_file_path]
+
+            delta = pd.concat(list(self.data_validation.iter_ratings(files=[delta_file_path])), ignore_index=True)
+            logging.info(f" Shape of delta ratings: {delta.shape}")
+
+            # user membership, users only ever gain ratings so the kept set can only grow
+            old_users = user_counts.index[user_counts > user_threshold]
+            user_counts = user_counts.add(delta['user_id'].value_counts(), fill_value=0).astype('int64')
+            kept_users = user_counts.index[user_counts > user_threshold]
+            new_users = kept_users.difference(old_users)
+
+            # title counts only count kept users, delta rows of already kept users are counted directly
+            old_titles = title_counts.index[title_counts >= book_threshold]
+            delta_rows = delta[delta['user_id'].isin(old_users)]
+            title_counts = title_counts.add(delta_rows['ISBN'].map(isbn_to_title).dropna().value_counts(), fill_value=0)
+
+            # users that just crossed the threshold bring their whole history, which needs one pass over the raw files
+            parts = []
+            if len(new_users):
+                logging.info(f" {len(new_users)} users crossed the ratings threshold, scanning their history")
+                new_user_rows = self.scan_ratings(files, lambda chunk: chunk['user_id'].isin(new_users))
+                title_counts = title_counts.add(new_user_rows['ISBN'].map(isbn_to_title).dropna().value_counts(), fill_value=0)
+                parts.append(new_user_rows)
+            title_counts = title_counts.astype('int64')
+            kept_titles = title_counts.index[title_counts >= book_threshold]
+            new_titles = kept_titles.difference(old_titles)
+
+            # titles that just crossed the threshold need the ratings of every kept user
+            if len(new_titles):
+                logging.info(f" {len(new_titles)} titles crossed the ratings threshold, scanning their ratings")
+                new_title_isbns = isbn_to_title.index[isbn_to_title.isin(new_titles)]
+                parts.append(self.scan_ratings(files, lambda chunk: chunk['ISBN'].isin(new_title_isbns) & chunk['user_id'].isin(old_users)))
+            parts.append(delta_rows)
+
+            kept_isbns = isbn_to_title.index[isbn_to_title.isin(kept_titles)]
+            new_rows = pd.concat(parts, ignore_index=True)
+            new_rows = new_rows[new_rows['user_id'].isin(kept_users) & new_rows['ISBN'].isin(kept_isbns)]
+            new_rows = new_rows.join(books, on='ISBN', how='inner').drop_duplicates(['user_id', 'title'])
+            return user_counts, title_counts, new_rows
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def patch_book_matrix(self, new_rows):
+        """Appends the new titles/users to the matrix and adds the new ratings, returns the changed row ids"""
+        try:
+            book_sparse = load_rating_matrix(self.data_transformation_config.book_matrix_file_path)
+            book_titles = np.load(self.data_transformation_config.book_titles_file_path)
+            user_ids = np.load(self.data_transformation_config.user_ids_file_path)
+
+            # new labels go after the existing ones so every saved row id stays valid
+            added_titles = np.sort(pd.Index(new_rows['title'].unique()).difference(book_titles).to_numpy(dtype=str))
+            added_users = np.sort(pd.Index(new_rows['user_id'].unique()).difference(user_ids).to_numpy(dtype=np.int64))
+            book_titles = np.concatenate([book_titles, added_titles])
+            user_ids = np.concatenate([user_ids, added_users])
+
+            rows = pd.Index(book_titles).get_indexer(new_rows['title'])
+            cols = pd.Index(user_ids).get_indexer(new_rows['user_id'])
+            ratings = new_rows['rating'].to_numpy(dtype=np.float32)
+
+            book_sparse.resize((len(book_titles), len(user_ids)))
+            patch = coo_matrix((ratings, (rows, cols)), shape=book_sparse.shape).tocsr()
+            book_sparse = (book_sparse + patch).tocsr()
+            book_sparse.eliminate_zeros()
+
+            # explicit 0 ratings do not change a vector, but a brand new title still needs its own row
+            changed = np.union1d(rows[ratings != 0], np.arange(len(book_titles) - len(added_titles), len(book_titles)))
+            logging.info(f" Patched book matrix to {book_sparse.shape}: {len(added_titles)} new titles, "
+                         f"{len(added_users)} new users, {len(changed)} changed rows")
+            return book_sparse, book_titles, user_ids, changed.astype(np.int64)
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def find_affected_rows(self, book_sparse, model, changed, old_indices, old_distances, n_neighbors, block_size=4096):
+        """
+        Rows whose top-K can differ after the update: the changed rows, the rows that list a
+        changed row among their neighbors, and the rows a changed row is now at least as close
+        to as their current K-th neighbor.
+        """
+        try:
+            n_titles = book_sparse.shape[0]
+            if old_indices.shape[1] < n_neighbors:
+                return np.arange(n_titles)
+
+            n_old = old_indices.shape[0]
+            metric = 'euclidean' if model.metric == 'minkowski' else model.metric
+            lists_changed = np.isin(old_indices[:, :n_neighbors], changed).any(axis=1)
+            kth = old_distances[:, n_neighbors - 1].astype(np.float64)
+            # neighbor distances are stored as float32, a small slack only adds rows to the recompute
+            kth = kth * (1 + 1e-5) + 1e-6
+
+            closer = np.zeros(n_old, dtype=bool)
+            changed_vectors = book_sparse[changed]
+            for start in range(0, n_old, block_size):
+                end = min(start + block_size, n_old)
+                distances = pairwise_distances(book_sparse[start:end], changed_vectors, metric=metric)
+                closer[start:end] = (distances <= kth[start:end, None]).any(axis=1)
+
+            return np.union1d(changed, np.flatnonzero(lists_changed | closer))
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def update_item_similarity(self, book_sparse, changed):
+        """
+        Recomputes the similarity rows of the changed titles and of every title sharing a reader
+        with them, the only rows whose cosine values can move since ratings are only added.
+        """
+        try:
+            n_titles = book_sparse.shape[0]
+            similarity = load_csr_buffers(self.model_trainer_config.item_similarity_prefix).copy()
+            similarity.resize((n_titles, n_titles))
+
+            co_rated = np.flatnonzero(np.asarray((book_sparse @ book_sparse[changed].T).getnnz(axis=1)))
+            affected = np.union1d(changed, co_rated)
+            logging.info(f" Recomputing similarities of {len(affected)} of {n_titles} titles")
+
+            updated_rows = item_cosine_similarity(book_sparse, self.model_trainer_config.similarity_top_k, rows=affected,
+                                                  workers=self.model_trainer_config.workers,
+                                                  block_size=self.model_trainer_config.block_size)
+            # drop the affected rows, then scatter the recomputed ones into their places
+            keep = np.ones(n_titles, dtype=np.float32)
+            keep[affected] = 0
+            scatter = csr_matrix((np.ones(len(affected), dtype=np.float32), (affected, np.arange(len(affected)))),
+                                 shape=(n_titles, len(affected)))
+            similarity = (diags(keep) @ similarity + scatter @ updated_rows).tocsr()
+            similarity.eliminate_zeros()
+
+            n_neighbors = min(self.neighbor_index_config.top_k + 1, n_titles)
+            distances, indices = similarity_neighbor_table(similarity, n_neighbors)
+            return similarity, indices, distances
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def update_item_embeddings(self, book_sparse):
+        """
+        Factorizes the patched matrix again: new ratings move the singular vectors, and with
+        them every embedding, so all neighbor rows are recomputed.
+        """
+        try:
+            embeddings = svd_item_embeddings(book_sparse, self.model_trainer_config.svd_rank)
+            n_neighbors = min(self.neighbor_index_config.top_k + 1, embeddings.shape[0])
+            logging.info(f" Recomputing neighbors of all {embeddings.shape[0]} titles from rank {embeddings.shape[1]} embeddings")
+            distances, indices = embedding_neighbor_table(embeddings, n_neighbors,
+                                                          workers=self.neighbor_index_config.workers,
+                                                          block_size=self.neighbor_index_config.block_size)
+            return embeddings, indices, distances
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def update_neighbor_index(self, book_sparse, changed):
+        try:
+            if self.model_trainer_config.model_type == 'item_cosine':
+                return self.update_item_similarity(book_sparse, changed)
+            if self.model_trainer_config.model_type == 'svd':
+                return self.update_item_embeddings(book_sparse)
+
+            # refitting only stores (brute) or re-buckets (lsh / ivf) the vectors, the queries are the expensive part
+            model = NeighborEngineFactory.get_neighbor_engine(self.model_trainer_config.neighbor_engine,
+                                                              **self.model_trainer_config.engine_params)
+            model.fit(book_sparse)
+
+            old_indices = np.load(self.neighbor_index_config.neighbor_indices_path)
+            old_distances = np.load(self.neighbor_index_config.neighbor_distances_path)
+            n_titles = book_sparse.shape[0]
+            n_neighbors = min(self.neighbor_index_config.top_k + 1, n_titles)
+
+            affected = self.find_affected_rows(book_sparse, model, changed, old_indices, old_distances, n_neighbors)
+            logging.info(f" Recomputing neighbors of {len(affected)} of {n_titles} titles")
+
+            indices = np.empty((n_titles, n_neighbors), dtype=np.int64)
+            distances = np.empty((n_titles, n_neighbors), dtype=np.float64)
+            n_old = min(old_indices.shape[0], n_titles)
+            if old_indices.shape[1] >= n_neighbors:
+                indices[:n_old] = old_indices[:n_old, :n_neighbors]
+                distances[:n_old] = old_distances[:n_old, :n_neighbors]
+            if len(affected):
+                distances[affected], indices[affected] = block_kneighbors(model, book_sparse, n_neighbors, rows=affected,
+                                                                          workers=self.neighbor_index_config.workers,
+                                                                          block_size=self.neighbor_index_config.block_size)
+            return model, indices, distances
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def stage_delta(self, delta_file_path):
+        """Keeps the delta next to the raw ratings so the next full rebuild includes it"""
+        try:
+            os.makedirs(self.data_validation_config.delta_data_dir, exist_ok=True)
+            staged_path = os.path.join(self.data_validation_config.delta_data_dir,
+                                       f"{time.strftime('%Y%m%d%H%M%S')}_{os.path.basename(delta_file_path)}")
+            shutil.copyfile(delta_file_path, staged_path)
+            logging.info(f"Staged delta ratings at {staged_path}")
+            return staged_path
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def update(self, delta_file_path):
+        try:
+            user_counts, title_counts, new_rows = self.collect_new_ratings(delta_file_path)
+            logging.info(f" {len(new_rows)} new clean ratings")
+
+            # clean data keeps the first rating of a pair, pairs already in it are not rated again
+            clean = pd.read_parquet(self.data_validation_config.clean_data_file_path)
+            existing_pairs = pd.MultiIndex.from_arrays([clean['user_id'].astype('int64'), clean['title'].astype(str)])
+            new_pairs = pd.MultiIndex.from_arrays([new_rows['user_id'].astype('int64'), new_rows['title'].astype(str)])
+            new_rows = new_rows[~new_pairs.isin(existing_pairs)]
+
+            if len(new_rows):
+                book_sparse, book_titles, user_ids, changed = self.patch_book_matrix(new_rows)
+                model, indices, distances = self.update_neighbor_index(book_sparse, changed)
+
+                # metadata of a new title comes from its first clean row, like in the full transformation
+                book_metadata = pd.read_parquet(self.data_transformation_config.book_metadata_file_path)
+                added_titles = pd.Index(book_titles[len(book_metadata):], name='title')
+                added_metadata = (new_rows.drop_duplicates('title')
+                                          .set_index('title')
+                                          .reindex(added_titles)[['author', 'year', 'publisher', 'image_url']]
+                                          .reset_index())
+                added_metadata['year'] = pd.to_numeric(added_metadata['year'], errors='coerce')
+                book_metadata = pd.concat([book_metadata, added_metadata.astype(book_metadata.dtypes.to_dict())], ignore_index=True)
+
+                # the model and neighbor rows of new titles are published before the title lookups that point at them
+                if self.model_trainer_config.model_type == 'item_cosine':
+                    self.model_trainer.save_item_similarity(model)
+                elif self.model_trainer_config.model_type == 'svd':
+                    self.model_trainer.save_item_embeddings(model)
+                else:
+                    self.model_trainer.save_model(model)
+                self.neighbor_indexer.save_neighbor_table(indices, distances)
+                self.data_transformation.save_book_matrix(book_sparse, book_titles, user_ids)
+                self.data_transformation.save_title_artifacts(pd.Index(book_titles, name='title'), book_metadata)
+
+                clean = pd.concat([clean.astype({'title': str}), new_rows.reindex(columns=clean.columns)], ignore_index=True)
+            else:
+                logging.info("Delta does not change the clean data, model and neighbor index are kept")
+
+            clean['num_of_rating'] = clean['title'].astype(str).map(title_counts)
+            self.data_validation.save_clean_data(clean)
+            self.data_validation.save_rating_counts(user_counts, title_counts)
+            self.stage_delta(delta_file_path)
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def initiate_incremental_training(self, delta_file_path):
+        try:
+            start = time.perf_counter()
+            self.update(delta_file_path)
+            logging.info(f"{'='*20}Incremental Training completed in {time.perf_counter() - start:.1f}s{'='*20} \n\n")
+        except Exception as e:
+            raise AppException(e, sys) from e
@@ -0,0 +1,251 @@
+import os
+import sys
+import json
+import time
+import numpy as np
+from scipy.sparse import csr_matrix
+from recommender.logger.log import logging
+from recommender.config.configuration import AppConfiguration
+from recommender.exception.exception_handler import AppException
+from recommender.engines.neighbor_engine import NeighborEngineFactory
+from recommender.engines.item_similarity import item_cosine_similarity, similarity_neighbor_table
+from recommender.engines.item_embedding import svd_item_embeddings, embedding_neighbor_table
+from recommender.components.neighbor_indexing import block_kneighbors, neighbor_graph
+from recommender.utils.array_io import load_rating_matrix, atomic_write
+
+
+def top_k_per_row(scores: csr_matrix, k: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (rows, columns, ranks) of the k largest entries of every row of a sparse score matrix.
+    One sort over all entries: by row, then highest score, then lower column on ties.
+    """
+    try:
+        rows = np.repeat(np.arange(scores.shape[0]), np.diff(scores.indptr))
+        order = np.lexsort((scores.indices, -scores.data, rows))
+        ranks = np.arange(len(order)) - scores.indptr[rows[order]]
+        top = order[ranks < k]
+        return rows[top], scores.indices[top], ranks[ranks < k]
+    except Exception as e:
+        raise AppException(e, sys) from e
+
+
+class ModelEvaluator:
+    """
+    Holdout evaluation of the model types on the rating matrix.
+
+    A random holdout_fraction of the ratings of every user with enough ratings is hidden. Each
+    candidate is trained on the rest, and every user gets the top k titles scored from the
+    neighbors of their remaining titles, the way recommend_for_users scores histories.
+    Hit rate@k, NDCG@k and catalog coverage are reported next to the training and indexing
+    time of each candidate, and the p50 / p95 latency of serving lookups on its neighbor table.
+    """
+
+    def __init__(self, app_config: AppConfiguration = None):
+        try:
+            app_config = app_config or AppConfiguration()
+            self.model_evaluation_config = app_config.get_model_evaluation_config()
+            logging.info(f"{'='*20}Model Evaluation Initialized{'='*20}")
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def split_holdout(self, book_sparse):
+        """Returns the training matrix (titles x users) and the held-out ratings as a users x titles indicator"""
+        try:
+            config = self.model_evaluation_config
+            rng = np.random.default_rng(config.random_state)
+            by_user = book_sparse.tocsc()
+            by_user.sort_indices()
+            counts = np.diff(by_user.indptr)
+            users = np.repeat(np.arange(by_user.shape[1]), counts)
+
+            # shuffle the ratings within every user, the first n_holdout of each user are held out
+            order = np.lexsort((rng.random(by_user.nnz), users))
+            position = np.arange(by_user.nnz) - by_user.indptr[users[order]]
+            n_holdout = np.where(counts >= config.min_user_ratings,
+                                 np.maximum(1, np.floor(config.holdout_fraction * counts)), 0).astype(np.int64)
+            held_out = np.zeros(by_user.nnz, dtype=bool)
+            held_out[order] = position < n_holdout[users[order]]
+
+            titles = by_user.indices
+            train = csr_matrix((by_user.data[~held_out], (titles[~held_out], users[~held_out])), shape=book_sparse.shape)
+            holdout = csr_matrix((np.ones(int(held_out.sum()), dtype=np.float32), (users[held_out], titles[held_out])),
+                                 shape=(book_sparse.shape[1], book_sparse.shape[0]))
+            return train, holdout
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def build_neighbor_table(self, candidate, train):
+        """Trains a candidate on the training matrix, returns its neighbor table and the train / indexing seconds"""
+        try:
+            config = self.model_evaluation_config
+            n_neighbors = min(config.top_k + 1, train.shape[0])
+            model_type = candidate['model_type']
+
+            start = time.perf_counter()
+            if model_type == 'item_cosine':
+                similarity = item_cosine_similarity(train, config.similarity_top_k, workers=config.workers, block_size=config.block_size)
+                train_seconds = time.perf_counter() - start
+                start = time.perf_counter()
+                distances, indices = similarity_neighbor_table(similarity, n_neighbors)
+            elif model_type == 'svd':
+                embeddings = svd_item_embeddings(train, config.svd_rank)
+                train_seconds = time.perf_counter() - start
+                start = time.perf_counter()
+                distances, indices = embedding_neighbor_table(embeddings, n_neighbors, workers=config.workers, block_size=config.block_size)
+            elif model_type == 'knn':
+                engine = candidate['neighbor_engine']
+                model = NeighborEngineFactory.get_neighbor_engine(engine, **(config.engine_params.get(engine) or {}))
+                model.fit(train)
+                train_seconds = time.perf_counter() - start
+                start = time.perf_counter()
+                distances, indices = block_kneighbors(model, train, n_neighbors, workers=config.workers, block_size=config.block_size)
+            else:
+                raise ValueError(f"Unsupported model type: {model_type}")
+            index_seconds = time.perf_counter() - start
+            return distances, indices, train_seconds, index_seconds
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def score(self, train, holdout, distances, indices) -> dict:
+        """Hit rate@k, NDCG@k and coverage of the top k titles of every evaluated user"""
+        try:
+            k = self.model_evaluation_config.k
+            n_titles = train.shape[0]
+            users = np.flatnonzero(np.diff(holdout.indptr))
+
+            # users x titles histories without the held-out ratings, scored in one sparse product
+            history = train.T.tocsr()[users]
+            history.data[:] = 1
+            scores = (history @ neighbor_graph(indices, distances)).tocsr()
+            scores = (scores - scores.multiply(history > 0)).tocsr()
+            scores.eliminate_zeros()
+            rows, titles, ranks = top_k_per_row(scores, k)
+
+            # a recommended title is a hit when the user's held-out ratings contain it
+            held_out = holdout[users]
+            held_keys = np.repeat(np.arange(len(users)), np.diff(held_out.indptr)) * n_titles + held_out.indices
+            hits = np.isin(rows.astype(np.int64) * n_titles + titles, held_keys)
+
+            gains = np.zeros(len(users))
+            np.add.at(gains, rows[hits], 1.0 / np.log2(ranks[hits] + 2))
+            n_relevant = np.minimum(np.diff(held_out.indptr), k)
+            ideal = np.cumsum(1.0 / np.log2(np.arange(k) + 2))[n_relevant - 1]
+
+            return {
+                'n_users': int(len(users)),
+                'hit_rate_at_k': float(np.bincount(rows[hits], minlength=len(users)).astype(bool).mean()) if len(users) else 0.0,
+                'ndcg_at_k': float((gains / ideal).mean()) if len(users) else 0.0,
+                'coverage': float(len(np.unique(titles)) / n_titles) if n_titles else 0.0,
+            }
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def time_lookups(self, train, distances, indices) -> dict:
+        """
+        p50 / p95 milliseconds of serving lookups on a neighbor table: the row lookup of
+        recommend_book for a sample of titles, and recommend_for_users scoring of the
+        history of one user at a time for a sample of users.
+        """
+        try:
+            config = self.model_evaluation_config
+            rng = np.random.default_rng(config.random_state)
+            k = min(config.k, indices.shape[1] - 1)
+
+            lookup_seconds = []
+            for book_id in rng.choice(train.shape[0], size=min(config.latency_sample_size, train.shape[0]), replace=False):
+                start = time.perf_counter()
+                row = indices[book_id, :k + 1]
+                np.concatenate(([book_id], row[row != book_id][:k]))
+                lookup_seconds.append(time.perf_counter() - start)
+
+            graph = neighbor_graph(indices, distances)
+            histories = train.T.tocsr()
+            readers = np.flatnonzero(np.diff(histories.indptr))
+            scoring_seconds = []
+            for user in rng.choice(readers, size=min(config.latency_sample_size, len(readers)), replace=False):
+                start = time.perf_counter()
+                history = histories[user]
+                history.data[:] = 1
+                scores = (history @ graph).tocsr()
+                scores = (scores - scores.multiply(history > 0)).tocsr()
+                scores.eliminate_zeros()
+                np.lexsort((scores.indices, -scores.data))[:k]
+                scoring_seconds.append(time.perf_counter() - start)
+
+            lookup_ms = np.percentile(1000 * np.array(lookup_seconds), [50, 95]) if lookup_seconds else [0.0, 0.0]
+            scoring_ms = np.percentile(1000 * np.array(scoring_seconds), [50, 95]) if scoring_seconds else [0.0, 0.0]
+            return {
+                'lookup_ms_p50': float(lookup_ms[0]),
+                'lookup_ms_p95': float(lookup_ms[1]),
+                'user_scoring_ms_p50': float(scoring_ms[0]),
+                'user_scoring_ms_p95': float(scoring_ms[1]),
+            }
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def evaluate(self):
+        try:
+            config = self.model_evaluation_config
+            book_sparse = load_rating_matrix(config.book_matrix_file_path)
+            train, holdout = self.split_holdout(book_sparse)
+            logging.info(f" Held out {holdout.nnz} of {book_sparse.nnz} ratings from {np.count_nonzero(np.diff(holdout.indptr))} users")
+
+            models = {}
+            for candidate in config.candidates:
+                name = candidate['model_type'] if candidate['model_type'] != 'knn' else f"knn/{candidate['neighbor_engine']}"
+                distances, indices, train_seconds, index_seconds = self.build_neighbor_table(candidate, train)
+                result = {
+                    **candidate,
+                    'train_seconds': train_seconds,
+                    'index_seconds': index_seconds,
+                    **self.time_lookups(train, distances, indices),
+                    **self.score(train, holdout, distances, indices),
+                }
+                models[name] = result
+                logging.info(f" {name}: hit rate@{config.k} {result['hit_rate_at_k']:.4f}, NDCG@{config.k} {result['ndcg_at_k']:.4f}, "
+                             f"coverage {result['coverage']:.3f}, trained in {train_seconds:.2f}s, indexed in {index_seconds:.2f}s, "
+                             f"user scoring p95 {result['user_scoring_ms_p95']:.3f} ms")
+
+            # cheapest to train and index among the candidates close enough to the best NDCG
+            best_ndcg = max((result['ndcg_at_k'] for result in models.values()), default=0.0)
+            eligible = [name for name, result in models.items() if result['ndcg_at_k'] >= config.min_relative_ndcg * best_ndcg]
+            pick = min(eligible, key=lambda name: models[name]['train_seconds'] + models[name]['index_seconds'], default=None)
+
+            report = {
+                'k': config.k,
+                'holdout_fraction': config.holdout_fraction,
+                'min_user_ratings': config.min_user_ratings,
+                'n_holdout_ratings': int(holdout.nnz),
+                'min_relative_ndcg': config.min_relative_ndcg,
+                'cheapest_within_quality_bar': pick,
+                'models': models,
+            }
+            os.makedirs(config.evaluation_dir, exist_ok=True)
+            with atomic_write(config.evaluation_report_path) as tmp_path:
+                with open(tmp_path, 'w') as report_file:
+                    json.dump(report, report_file, indent=2)
+            logging.info(f"Saved evaluation report to {config.evaluation_report_path}, cheapest model within the quality bar: {pick}")
+            return report
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def initiate_model_evaluation(self):
+        try:
+            if not self.model_evaluation_config.enabled:
+                logging.info("Model evaluation disabled, skipping")
+                return
+            self.evaluate()
+            logging.info(f"{'='*20}Model Evaluation completed{'='*20} \n\n")
+        except Exception as e:
+            raise AppException(e, sys) from e
@@ -1,37 +1,159 @@
 import os
 import sys
+import json
+import time
 import pickle
-from sklearn.neighbors import NearestNeighbors
-from scipy.sparse import csr_matrix
+import numpy as np
 from recommender.logger.log import logging
 from recommender.config.configuration import AppConfiguration
 from recommender.exception.exception_handler import AppException
+from recommender.engines.neighbor_engine import NeighborEngineFactory, BruteForceEngine
+from recommender.engines.item_similarity import item_cosine_similarity
+from recommender.engines.item_embedding import svd_item_embeddings, embedding_neighbor_table
+from recommender.utils.array_io import save_array, save_csr_buffers, load_rating_matrix, atomic_write
 
 
 class ModelTrainer:
-    def __init__(self, app_config = AppConfiguration()):
+    def __init__(self, app_config: AppConfiguration = None):
         try:
+            app_config = app_config or AppConfiguration()
             self.model_trainer_config = app_config.get_model_trainer_config()
             logging.info(f"{'='*20}Model Training Initialized{'='*20}")
         except Exception as e:
             raise AppException(e, sys) from e
 
+
+    def evaluate_recall(self, book_sparse, search, metric, engine, engine_params):
+        """
+        Compares an approximate model against exact search in the same (cosine) space.
+        search(rows, k) returns the neighbor ids of the given title rows.
+        """
+        try:
+            rng = np.random.default_rng(0)
+            n_queries = min(self.model_trainer_config.recall_sample_size, book_sparse.shape[0])
+            k = min(self.model_trainer_config.recall_k, book_sparse.shape[0])
+            rows = np.sort(rng.choice(book_sparse.shape[0], n_queries, replace=False))
+
+            exact = BruteForceEngine(metric=metric).fit(book_sparse)
+            start = time.perf_counter()
+            _, exact_indices = exact.kneighbors(book_sparse[rows], n_neighbors=k)
+            exact_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            approx_indices = search(rows, k)
+            approx_seconds = time.perf_counter() - start
+
+            hits = sum(len(np.intersect1d(a, e)) for a, e in zip(approx_indices, exact_indices))
+            report = {
+                'engine': engine,
+                'engine_params': engine_params,
+                'k': int(k),
+                'n_queries': int(n_queries),
+                'recall_at_k': hits / float(n_queries * k),
+                'approx_query_ms': 1000 * approx_seconds / n_queries,
+                'exact_query_ms': 1000 * exact_seconds / n_queries,
+            }
+
+            with open(self.model_trainer_config.recall_report_path, 'w') as report_file:
+                json.dump(report, report_file, indent=2)
+            logging.info(f"Recall@{k} of {report['engine']} engine: {report['recall_at_k']:.3f}, "
+                         f"{report['approx_query_ms']:.3f} ms/query vs {report['exact_query_ms']:.3f} ms/query exact")
+            return report
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
     
+    def save_model(self, model):
+        try:
+            os.makedirs(self.model_trainer_config.trained_model_dir, exist_ok=True)
+            file_name = os.path.join(self.model_trainer_config.trained_model_dir,self.model_trainer_config.trained_model_name)
+            # written next to the old model and renamed into place, serving never sees a partial pickle
+            with atomic_write(file_name) as tmp_path:
+                with open(tmp_path, 'wb') as model_file:
+                    pickle.dump(model, model_file)
+            logging.info(f"Saving final model to {file_name}")
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def save_item_similarity(self, similarity):
+        try:
+            os.makedirs(self.model_trainer_config.trained_model_dir, exist_ok=True)
+            save_csr_buffers(self.model_trainer_config.item_similarity_prefix, similarity)
+            logging.info(f"Saving item similarity with {similarity.nnz} entries to {self.model_trainer_config.item_similarity_prefix}")
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def train_item_similarity(self, book_sparse):
+        try:
+            # pruned cosine similarity, computed in row blocks across the worker pool
+            similarity = item_cosine_similarity(book_sparse, self.model_trainer_config.similarity_top_k,
+                                                workers=self.model_trainer_config.workers,
+                                                block_size=self.model_trainer_config.block_size)
+            logging.info(f"Computed item-item cosine similarity on {book_sparse.shape}, "
+                         f"top {self.model_trainer_config.similarity_top_k} per title")
+            self.save_item_similarity(similarity)
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def save_item_embeddings(self, embeddings):
+        try:
+            os.makedirs(self.model_trainer_config.trained_model_dir, exist_ok=True)
+            save_array(self.model_trainer_config.item_embeddings_path, embeddings)
+            logging.info(f"Saving {embeddings.shape} item embeddings to {self.model_trainer_config.item_embeddings_path}")
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def train_item_embeddings(self, book_sparse):
+        try:
+            # a title becomes svd_rank numbers instead of one rating per kept user
+            embeddings = svd_item_embeddings(book_sparse, self.model_trainer_config.svd_rank)
+            logging.info(f"Factorized {book_sparse.shape} book matrix into rank {embeddings.shape[1]} item embeddings")
+            self.save_item_embeddings(embeddings)
+
+            #the low-rank neighbors are approximate, recall is measured against exact cosine on the ratings
+            self.evaluate_recall(book_sparse, lambda rows, k: embedding_neighbor_table(embeddings, k, rows=rows)[1],
+                                 metric='cosine', engine='svd', engine_params={'rank': int(embeddings.shape[1])})
+            return embeddings
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
     def train(self):
         try:
-            #loading pivot data
-            book_pivot = pickle.load(open(self.model_trainer_config.transformed_data_file_dir,'rb'))
-            book_sparse = csr_matrix(book_pivot)
+            #loading sparse book matrix
+            book_sparse = load_rating_matrix(self.model_trainer_config.book_matrix_file_path)
+
+            if self.model_trainer_config.model_type == 'item_cosine':
+                return self.train_item_similarity(book_sparse)
+            if self.model_trainer_config.model_type == 'svd':
+                return self.train_item_embeddings(book_sparse)
+            if self.model_trainer_config.model_type != 'knn':
+                raise ValueError(f"Unsupported model type: {self.model_trainer_config.model_type}")
 
             #Training model
-            model = NearestNeighbors(algorithm= 'brute')
+            model = NeighborEngineFactory.get_neighbor_engine(self.model_trainer_config.neighbor_engine,
+                                                              **self.model_trainer_config.engine_params)
             model.fit(book_sparse)
+            logging.info(f"Fitted {self.model_trainer_config.neighbor_engine} neighbor engine on {book_sparse.shape}")
 
             #Saving model object for recommendations
-            os.makedirs(self.model_trainer_config.trained_model_dir, exist_ok=True)
-            file_name = os.path.join(self.model_trainer_config.trained_model_dir,self.model_trainer_config.trained_model_name)
-            pickle.dump(model,open(file_name,'wb'))
-            logging.info(f"Saving final model to {file_name}")
+            self.save_model(model)
+
+            #approximate engines get a recall vs brute force report next to the model
+            if self.model_trainer_config.neighbor_engine != 'brute':
+                self.evaluate_recall(book_sparse, lambda rows, k: model.kneighbors(book_sparse[rows], n_neighbors=k)[1],
+                                     model.metric, self.model_trainer_config.neighbor_engine,
+                                     self.model_trainer_config.engine_params)
 
         except Exception as e:
             raise AppException(e, sys) from e
@@ -43,4 +165,4 @@ class ModelTrainer:
             self.train()
             logging.info(f"{'='*20}Model Training completed{'='*20} \n\n")
         except Exception as e:
-            raise AppException(e, sys) from e
\ No newline at end of file
+            raise AppException(e, sys) from e
@@ -0,0 +1,199 @@
+import os
+import sys
+import json
+import pickle
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.metrics import pairwise_distances
+from recommender.logger.log import logging
+from recommender.config.configuration import AppConfiguration
+from recommender.exception.exception_handler import AppException
+from recommender.utils.array_io import save_array, load_array, save_csr_buffers, load_csr_buffers, load_rating_matrix
+from recommender.engines.neighbor_engine import BruteForceEngine
+from recommender.engines.item_similarity import similarity_neighbor_table
+from recommender.engines.item_embedding import embedding_neighbor_table
+from recommender.utils.parallel import map_row_blocks
+
+
+def _kneighbors_block(shared, start, end):
+    rows = shared['rows'][start:end]
+    distances, indices = shared['model'].kneighbors(shared['book_sparse'][rows], n_neighbors=shared['n_neighbors'])
+    return distances.astype(np.float32), indices.astype(np.int32)
+
+
+def block_kneighbors(model, book_sparse, n_neighbors, rows=None, workers=1, block_size=1024):
+    """
+    Top-K neighbors of the given rows (all rows by default), queried in row blocks.
+
+    Blocks are spread over workers processes and stacked back in row order, a block only
+    holds block_size x n_titles distances at a time.
+    """
+    try:
+        rows = np.arange(book_sparse.shape[0]) if rows is None else np.asarray(rows)
+        shared = {'model': model, 'book_sparse': book_sparse, 'rows': rows, 'n_neighbors': n_neighbors}
+        blocks = map_row_blocks(_kneighbors_block, len(rows), block_size, workers, shared)
+        if not blocks:
+            return np.empty((0, n_neighbors), dtype=np.float32), np.empty((0, n_neighbors), dtype=np.int32)
+        return np.vstack([d for d, _ in blocks]), np.vstack([i for _, i in blocks])
+    except Exception as e:
+        raise AppException(e, sys) from e
+
+
+def neighbor_graph(indices, distances) -> csr_matrix:
+    """Sparse titles x titles matrix of a neighbor table weighted by 1 / (1 + distance), without the titles themselves"""
+    try:
+        n_titles = indices.shape[0]
+        rows = np.repeat(np.arange(n_titles), indices.shape[1])
+        graph = csr_matrix((1.0 / (1.0 + distances.ravel().astype(np.float32)), (rows, indices.ravel())),
+                           shape=(n_titles, n_titles))
+        graph.setdiag(0)
+        graph.eliminate_zeros()
+        return graph
+    except Exception as e:
+        raise AppException(e, sys) from e
+
+
+class NeighborIndexer:
+    def __init__(self, app_config: AppConfiguration = None):
+        try:
+            app_config = app_config or AppConfiguration()
+            self.neighbor_index_config = app_config.get_neighbor_index_config()
+            logging.info(f"{'='*20}Neighbor Indexing Initialized{'='*20}")
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def verify_precision(self, vectors, indices, distances, metric, exact=True, block_size=16):
+        """
+        Checks the float32 neighbor table against an exact float64 search over vectors (the rating
+        rows, or the embeddings of the svd model) on a sample of titles.
+
+        A listed neighbor counts as a match when its float64 distance is within the float64
+        distance of the true K-th neighbor, so titles tied at the K-th place may swap without
+        counting as an error. Approximate engines are bounded by their recall and are only
+        reported, exact ones fail the stage below min_precision_match.
+        """
+        try:
+            # item_cosine tables start with the title itself and only list titles sharing a reader
+            item_cosine = self.neighbor_index_config.model_type == 'item_cosine'
+            skip = 1 if item_cosine else 0
+            n_titles = vectors.shape[0]
+            rng = np.random.default_rng(0)
+            sample = np.sort(rng.choice(n_titles, min(self.neighbor_index_config.precision_check_sample_size, n_titles), replace=False))
+            baseline = vectors.astype(np.float64)
+
+            n_expected, n_matched, max_error = 0, 0, 0.0
+            for start in range(0, len(sample), block_size):
+                # only block_size x n_titles float64 distances at a time
+                block = sample[start:start + block_size]
+                exact_distances = pairwise_distances(baseline[block], baseline, metric=metric)
+                for title, title_distances in zip(block, exact_distances):
+                    candidates = np.ones(n_titles, dtype=bool)
+                    if item_cosine:
+                        candidates[title] = False
+                        candidates &= title_distances < 1
+                    k = min(indices.shape[1] - skip, int(candidates.sum()))
+                    if k == 0:
+                        continue
+                    kth = np.partition(title_distances[candidates], k - 1)[k - 1]
+                    listed = indices[title, skip:skip + k]
+                    matched = candidates[listed] & (title_distances[listed] <= kth + 1e-5 * max(1.0, kth))
+                    n_expected += k
+                    n_matched += int(matched.sum())
+                    if matched.any():
+                        error = np.abs(distances[title, skip:skip + k][matched] - title_distances[listed][matched]).max()
+                        max_error = max(max_error, float(error))
+
+            report = {
+                'model_type': self.neighbor_index_config.model_type,
+                'metric': metric,
+                'n_queries': int(len(sample)),
+                'top_k_match': n_matched / n_expected if n_expected else 1.0,
+                'max_distance_error': max_error,
+                'min_precision_match': self.neighbor_index_config.min_precision_match,
+                'enforced': exact,
+            }
+            os.makedirs(self.neighbor_index_config.neighbor_index_dir, exist_ok=True)
+            with open(self.neighbor_index_config.precision_report_path, 'w') as report_file:
+                json.dump(report, report_file, indent=2)
+            logging.info(f"Top-k match of the float32 neighbor table vs float64 exact search: {report['top_k_match']:.4f}, "
+                         f"max distance error {max_error:.2e}")
+
+            if exact and report['top_k_match'] < self.neighbor_index_config.min_precision_match:
+                raise ValueError(f"Neighbor table matches the float64 baseline on {report['top_k_match']:.4f} of the top-k, "
+                                 f"below min_precision_match {self.neighbor_index_config.min_precision_match}")
+            return report
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def build_neighbor_index(self):
+        try:
+            #loading sparse book matrix, float32 ratings with int32 indices
+            book_sparse = load_rating_matrix(self.neighbor_index_config.book_matrix_file_path)
+
+            if self.neighbor_index_config.model_type == 'item_cosine':
+                # the similarity rows already hold every title's neighbors, the table is a re-layout of them
+                similarity = load_csr_buffers(self.neighbor_index_config.item_similarity_prefix)
+                n_neighbors = min(self.neighbor_index_config.top_k + 1, similarity.shape[0])
+                distances, indices = similarity_neighbor_table(similarity, n_neighbors)
+                logging.info(f" Shape of neighbor table: {indices.shape}")
+                # checked before saving, a table that fails the check never replaces the current one
+                self.verify_precision(book_sparse, indices, distances, metric='cosine')
+                return self.save_neighbor_table(indices, distances)
+
+            if self.neighbor_index_config.model_type == 'svd':
+                # dot products of the unit-length embeddings, scored in row blocks across the worker pool
+                embeddings = load_array(self.neighbor_index_config.item_embeddings_path)
+                n_neighbors = min(self.neighbor_index_config.top_k + 1, embeddings.shape[0])
+                distances, indices = embedding_neighbor_table(embeddings, n_neighbors,
+                                                              workers=self.neighbor_index_config.workers,
+                                                              block_size=self.neighbor_index_config.block_size)
+                logging.info(f" Shape of neighbor table: {indices.shape}")
+                self.verify_precision(embeddings, indices, distances, metric='cosine')
+                return self.save_neighbor_table(indices, distances)
+
+            #loading trained model
+            model = pickle.load(open(self.neighbor_index_config.trained_model_path,'rb'))
+
+            # every title is queried in row blocks across the worker pool, the first column is the title itself
+            n_neighbors = min(self.neighbor_index_config.top_k + 1, book_sparse.shape[0])
+            distances, indices = block_kneighbors(model, book_sparse, n_neighbors,
+                                                  workers=self.neighbor_index_config.workers,
+                                                  block_size=self.neighbor_index_config.block_size)
+            logging.info(f" Shape of neighbor table: {indices.shape}")
+
+            metric = 'euclidean' if model.metric == 'minkowski' else model.metric
+            self.verify_precision(book_sparse, indices, distances, metric, exact=isinstance(model, BruteForceEngine))
+            self.save_neighbor_table(indices, distances)
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+
+    def save_neighbor_table(self, indices, distances):
+        try:
+            #saving neighbor table for recommendations
+            os.makedirs(self.neighbor_index_config.neighbor_index_dir, exist_ok=True)
+            save_array(self.neighbor_index_config.neighbor_indices_path, indices.astype(np.int32))
+            save_array(self.neighbor_index_config.neighbor_distances_path, distances.astype(np.float32))
+            logging.info(f"Saved neighbor table to {self.neighbor_index_config.neighbor_index_dir}")
+
+            #sparse titles x titles neighbor graph, used for batch scoring
+            graph = neighbor_graph(indices, distances)
+            save_csr_buffers(self.neighbor_index_config.neighbor_graph_prefix, graph)
+            logging.info(f"Saved neighbor graph with {graph.nnz} edges to {self.neighbor_index_config.neighbor_index_dir}")
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+
+    def initiate_neighbor_indexing(self):
+        try:
+            self.build_neighbor_index()
+            logging.info(f"{'='*20}Neighbor Indexing completed{'='*20} \n\n")
+        except Exception as e:
+            raise AppException(e, sys) from e
@@ -1,10 +1,12 @@
 import os
 import sys
+import json
 from recommender.logger.log import logging
 from recommender.utils.load_yaml import read_yaml_file
 from recommender.exception.exception_handler import AppException
-from recommender.entity.config_entity import DataIngestionConfig, DataValidationConfig, DataTransformationConfig, ModelTrainerConfig, ModelRecommendationConfig
+from recommender.entity.config_entity import PipelineManifestConfig, ArtifactVersionsConfig, DataIngestionConfig, DataValidationConfig, DataTransformationConfig, ModelTrainerConfig, NeighborIndexConfig, ModelEvaluationConfig, ModelRecommendationConfig, ServingConfig, PosterCacheConfig, ResultCacheConfig, TrainingJobConfig, MetricsConfig
 from recommender.constants import CONFIG_FILE_PATH
+from recommender.utils.artifact_versions import VERSION_MANIFEST_NAME
 
 class AppConfiguration:
     """
@@ -21,11 +23,54 @@ class AppConfiguration:
     def __init__(self, config_file_path: str = CONFIG_FILE_PATH) -> None:
         """Initialize the AppConfiguration with a given config file path."""
         try:
-            self.config_info = read_yaml_file(file_path=config_file_path)
+            self.config_file_path = os.path.abspath(config_file_path)
+            self.config_info = read_yaml_file(file_path=self.config_file_path)
         except Exception as e:
             raise AppException(e, sys) from e
         #logging.info(f"Configuration file loaded from: {config_file_path}")
 
+    def get_config_section(self, section: str) -> dict:
+        """Raw dict of one config.yaml section"""
+        try:
+            return self.config_info[section]
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def get_pipeline_manifest_config(self) -> PipelineManifestConfig:
+        try:
+            # get the config dict
+            artifacts_config = self.config_info['artifacts_config']
+            artifacts_dir = artifacts_config['artifacts_dir']
+
+            response = PipelineManifestConfig(
+                manifest_file_path = os.path.join(artifacts_dir, artifacts_config.get('manifest_file_name', 'pipeline_manifest.json')),
+                skip_unchanged_stages = bool(artifacts_config.get('skip_unchanged_stages', True)),
+            )
+            logging.info("Pipeline Manifest Config Loaded")
+            return response
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def get_artifact_versions_config(self) -> ArtifactVersionsConfig:
+        try:
+            # get the config dict
+            artifacts_config = self.config_info['artifacts_config']
+            artifacts_dir = artifacts_config['artifacts_dir']
+            versions_dir = os.path.join(artifacts_dir, artifacts_config.get('versions_dir', 'versions'))
+
+            response = ArtifactVersionsConfig(
+                artifacts_dir = artifacts_dir,
+                versions_dir = versions_dir,
+                pointer_file_path = os.path.join(versions_dir, artifacts_config.get('current_pointer_name', 'CURRENT')),
+                keep_versions = int(artifacts_config.get('keep_versions', 5)),
+            )
+            logging.info("Artifact Versions Config Loaded")
+            return response
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
     def get_data_ingestion_config(self) -> DataIngestionConfig:
         try:
             # get the config dict
@@ -73,6 +118,7 @@ class AppConfiguration:
             # nested directory paths
             serialized_objects_dir = os.path.join(artifacts_dir, serialized_dir)
             clean_data_dir = os.path.join(artifacts_dir, dataset_dir, clean_dir)
+            delta_data_dir = os.path.join(artifacts_dir, dataset_dir, data_validation_config.get('delta_data_dir', 'delta_data'))
 
             # nested csv file paths
             books_csv_file_path = os.path.join(artifacts_dir, dataset_dir, ingested_dir, books_csv_file)
@@ -81,9 +127,17 @@ class AppConfiguration:
 
             response = DataValidationConfig(
                 clean_data_dir = clean_data_dir,
+                clean_data_file_path = os.path.join(clean_data_dir, 'clean_data.parquet'),
                 serialized_objects_dir = serialized_objects_dir,
                 books_csv_file = books_csv_file_path,
                 ratings_csv_file = ratings_csv_file_path,
+                user_ratings_threshold = int(data_validation_config.get('user_ratings_threshold', 200)),
+                book_ratings_threshold = int(data_validation_config.get('book_ratings_threshold', 50)),
+                streaming = bool(data_validation_config.get('streaming', False)),
+                chunk_size = int(data_validation_config.get('chunk_size', 100000)),
+                delta_data_dir = delta_data_dir,
+                user_counts_file_path = os.path.join(clean_data_dir, 'user_counts.parquet'),
+                title_counts_file_path = os.path.join(clean_data_dir, 'title_counts.parquet'),
             )
             logging.info("Data Validation Config Loaded")
             return response
@@ -104,16 +158,35 @@ class AppConfiguration:
             transformed_dir = data_transformation_config['transformed_data_dir']
             clean_dir = data_validation_config['clean_data_dir']
 
-            # csv file path
-            clean_data_csv = 'clean_data.csv'
+            # parquet file path
+            clean_data_file = 'clean_data.parquet'
 
             # nested directory paths
-            clean_data_file_path = os.path.join(artifacts_dir, dataset_dir, clean_dir, clean_data_csv)
+            clean_data_file_path = os.path.join(artifacts_dir, dataset_dir, clean_dir, clean_data_file)
             transformed_data_dir = os.path.join(artifacts_dir, dataset_dir, transformed_dir)
 
+            # sparse matrix and its row/column label files
+            book_matrix_file_path = os.path.join(transformed_data_dir, 'book_matrix.npz')
+            book_titles_file_path = os.path.join(transformed_data_dir, 'book_titles.npy')
+            user_ids_file_path = os.path.join(transformed_data_dir, 'user_ids.npy')
+
+            # serving lookup tables
+            serialized_objects_dir = os.path.join(artifacts_dir, data_validation_config['serialized_objects_dir'])
+            title_index_file_path = os.path.join(serialized_objects_dir, 'title_index.parquet')
+            book_metadata_file_path = os.path.join(serialized_objects_dir, 'book_metadata.parquet')
+            poster_urls_file_path = os.path.join(serialized_objects_dir, 'poster_urls.npy')
+            title_search_prefix = os.path.join(serialized_objects_dir, 'title_search')
+
             response = DataTransformationConfig(
                 clean_data_file_path = clean_data_file_path,
                 transformed_data_dir = transformed_data_dir,
+                book_matrix_file_path = book_matrix_file_path,
+                book_titles_file_path = book_titles_file_path,
+                user_ids_file_path = user_ids_file_path,
+                title_index_file_path = title_index_file_path,
+                book_metadata_file_path = book_metadata_file_path,
+                poster_urls_file_path = poster_urls_file_path,
+                title_search_prefix = title_search_prefix,
             )
             logging.info("Data Transformation Config Loaded")
             return response
@@ -134,20 +207,38 @@ class AppConfiguration:
             models_dir = model_trainer_config['trained_model_dir']
             transformed_data_dir = data_transformation_config['transformed_data_dir']
 
-            # model file name
+            # model file name and type
             trained_model_name = model_trainer_config['trained_model_name']
+            model_type = model_trainer_config.get('model_type', 'knn')
+
+            # neighbor engine and its parameters
+            neighbor_engine = model_trainer_config.get('neighbor_engine', 'brute')
+            engine_params = (model_trainer_config.get('engine_params') or {}).get(neighbor_engine) or {}
 
             # transformed data file name
-            transformed_data_file = 'transformed_data.pkl'
+            book_matrix_file = 'book_matrix.npz'
 
             # nested directory paths
-            transformed_data_file_dir = os.path.join(artifacts_dir, dataset_dir, transformed_data_dir, transformed_data_file)
+            book_matrix_file_path = os.path.join(artifacts_dir, dataset_dir, transformed_data_dir, book_matrix_file)
             trained_model_dir = os.path.join(artifacts_dir, models_dir)
 
             response = ModelTrainerConfig(
-                transformed_data_file_dir = transformed_data_file_dir,
+                book_matrix_file_path = book_matrix_file_path,
                 trained_model_dir = trained_model_dir,
-                trained_model_name = trained_model_name
+                trained_model_name = trained_model_name,
+                model_type = model_type,
+                item_similarity_prefix = os.path.join(trained_model_dir, model_trainer_config.get('item_similarity_name', 'item_similarity')),
+                similarity_top_k = int(model_trainer_config.get('similarity_top_k', 50)),
+                item_embeddings_path = os.path.join(trained_model_dir, model_trainer_config.get('item_embeddings_name', 'item_embeddings.npy')),
+                svd_rank = int(model_trainer_config.get('svd_rank', 64)),
+                # training-time block work shares the neighbor indexing pool settings
+                workers = int(self.config_info['neighbor_index_config'].get('workers', 1)),
+                block_size = int(self.config_info['neighbor_index_config'].get('block_size', 1024)),
+                neighbor_engine = neighbor_engine,
+                engine_params = engine_params,
+                recall_report_path = os.path.join(trained_model_dir, model_trainer_config['recall_report_name']),
+                recall_sample_size = int(model_trainer_config['recall_sample_size']),
+                recall_k = int(model_trainer_config['recall_k'])
             )
 
             logging.info("Model Trainer Config Loaded")
@@ -156,35 +247,172 @@ class AppConfiguration:
         except Exception as e:
             raise AppException(e, sys) from e
         
-    def get_recommendation_config(self) -> ModelRecommendationConfig:
+    def get_neighbor_index_config(self) -> NeighborIndexConfig:
         try:
             # get the config dict
+            neighbor_index_config = self.config_info['neighbor_index_config']
             model_trainer_config = self.config_info['model_trainer_config']
-            data_validation_config = self.config_info['data_validation_config']
+            data_transformation_config = self.config_info['data_transformation_config']
+            data_ingestion_config = self.config_info['data_ingestion_config']
+            dataset_dir = data_ingestion_config['dataset_dir']
+
+            # base directory paths
+            artifacts_dir = self.config_info['artifacts_config']['artifacts_dir']
+            models_dir = model_trainer_config['trained_model_dir']
+            transformed_data_dir = data_transformation_config['transformed_data_dir']
+            neighbor_dir = neighbor_index_config['neighbor_index_dir']
+
+            # number of neighbors kept per title
+            top_k = int(neighbor_index_config['top_k'])
+
+            # file names
+            trained_model_name = model_trainer_config['trained_model_name']
+            book_matrix_file = 'book_matrix.npz'
+
+            # nested directory paths
+            book_matrix_file_path = os.path.join(artifacts_dir, dataset_dir, transformed_data_dir, book_matrix_file)
+            trained_model_path = os.path.join(artifacts_dir, models_dir, trained_model_name)
+            neighbor_index_dir = os.path.join(artifacts_dir, neighbor_dir)
+
+            response = NeighborIndexConfig(
+                book_matrix_file_path = book_matrix_file_path,
+                model_type = model_trainer_config.get('model_type', 'knn'),
+                trained_model_path = trained_model_path,
+                item_similarity_prefix = os.path.join(artifacts_dir, models_dir, model_trainer_config.get('item_similarity_name', 'item_similarity')),
+                item_embeddings_path = os.path.join(artifacts_dir, models_dir, model_trainer_config.get('item_embeddings_name', 'item_embeddings.npy')),
+                neighbor_index_dir = neighbor_index_dir,
+                neighbor_indices_path = os.path.join(neighbor_index_dir, 'neighbor_indices.npy'),
+                neighbor_distances_path = os.path.join(neighbor_index_dir, 'neighbor_distances.npy'),
+                neighbor_graph_prefix = os.path.join(neighbor_index_dir, 'neighbor_graph'),
+                precision_report_path = os.path.join(neighbor_index_dir, 'precision_report.json'),
+                top_k = top_k,
+                workers = int(neighbor_index_config.get('workers', 1)),
+                block_size = int(neighbor_index_config.get('block_size', 1024)),
+                precision_check_sample_size = int(neighbor_index_config.get('precision_check_sample_size', 200)),
+                min_precision_match = float(neighbor_index_config.get('min_precision_match', 0.99))
+            )
+
+            logging.info("Neighbor Index Config Loaded")
+            return response
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def get_model_evaluation_config(self) -> ModelEvaluationConfig:
+        try:
+            # get the config dict
+            model_evaluation_config = self.config_info.get('model_evaluation_config') or {}
+            model_trainer_config = self.config_info['model_trainer_config']
+            neighbor_index_config = self.config_info['neighbor_index_config']
+            data_transformation_config = self.config_info['data_transformation_config']
+            dataset_dir = self.config_info['data_ingestion_config']['dataset_dir']
 
             # base directory paths
             artifacts_dir = self.config_info['artifacts_config']['artifacts_dir']
+            transformed_data_dir = data_transformation_config['transformed_data_dir']
+            evaluation_dir = os.path.join(artifacts_dir, model_evaluation_config.get('evaluation_dir', 'evaluation'))
+
+            # the configured model alone unless the candidates are compared,
+            # a knn candidate without a neighbor_engine uses brute force, like model training
+            configured_model = {'model_type': model_trainer_config.get('model_type', 'knn'),
+                                'neighbor_engine': model_trainer_config.get('neighbor_engine', 'brute')}
+            compare_candidates = bool(model_evaluation_config.get('compare_candidates', False))
+            candidates = []
+            for candidate in (compare_candidates and model_evaluation_config.get('candidates')) or [configured_model]:
+                model_type = candidate.get('model_type', 'knn')
+                candidates.append({'model_type': model_type,
+                                   'neighbor_engine': candidate.get('neighbor_engine', 'brute') if model_type == 'knn' else None})
+
+            response = ModelEvaluationConfig(
+                book_matrix_file_path = os.path.join(artifacts_dir, dataset_dir, transformed_data_dir, 'book_matrix.npz'),
+                evaluation_dir = evaluation_dir,
+                evaluation_report_path = os.path.join(evaluation_dir, model_evaluation_config.get('evaluation_report_name', 'evaluation_report.json')),
+                enabled = bool(model_evaluation_config.get('enabled', True)),
+                holdout_fraction = float(model_evaluation_config.get('holdout_fraction', 0.2)),
+                min_user_ratings = int(model_evaluation_config.get('min_user_ratings', 5)),
+                k = int(model_evaluation_config.get('k', 10)),
+                random_state = int(model_evaluation_config.get('random_state', 42)),
+                latency_sample_size = int(model_evaluation_config.get('latency_sample_size', 200)),
+                min_relative_ndcg = float(model_evaluation_config.get('min_relative_ndcg', 0.95)),
+                candidates = candidates,
+                engine_params = model_trainer_config.get('engine_params') or {},
+                similarity_top_k = int(model_trainer_config.get('similarity_top_k', 50)),
+                svd_rank = int(model_trainer_config.get('svd_rank', 64)),
+                top_k = int(neighbor_index_config['top_k']),
+                workers = int(neighbor_index_config.get('workers', 1)),
+                block_size = int(neighbor_index_config.get('block_size', 1024))
+            )
+
+            logging.info("Model Evaluation Config Loaded")
+            return response
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def get_recommendation_config(self, version: str = None) -> ModelRecommendationConfig:
+        """Serving artifact paths, inside the published artifact version when one is given"""
+        try:
+            # get the config dict
+            model_trainer_config = self.config_info['model_trainer_config']
+            data_validation_config = self.config_info['data_validation_config']
+            data_transformation_config = self.config_info['data_transformation_config']
+            data_ingestion_config = self.config_info['data_ingestion_config']
+            neighbor_index_config = self.config_info['neighbor_index_config']
+
+            # model the artifacts were trained with, config.yaml only describes the next training run
+            model = {'model_type': model_trainer_config.get('model_type', 'knn'),
+                     'neighbor_engine': model_trainer_config.get('neighbor_engine', 'brute')}
+
+            # base directory paths, a version directory mirrors the artifacts directory layout
+            artifacts_dir = self.config_info['artifacts_config']['artifacts_dir']
+            if version is not None:
+                artifacts_dir = os.path.join(self.get_artifact_versions_config().versions_dir, version)
+                # a published version records its model, versions published before that keep the config's
+                with open(os.path.join(artifacts_dir, VERSION_MANIFEST_NAME)) as manifest_file:
+                    model.update(json.load(manifest_file).get('model') or {})
+            dataset_dir = data_ingestion_config['dataset_dir']
+            transformed_data_dir = data_transformation_config['transformed_data_dir']
             serialized_objects_dir = data_validation_config['serialized_objects_dir']
             model_dir = model_trainer_config['trained_model_dir']
+            neighbor_dir = neighbor_index_config['neighbor_index_dir']
             # model file name
             trained_model_name = model_trainer_config['trained_model_name']
                     
             # serialized objects file names
-            book_name_serialized_objects = os.path.join(artifacts_dir, serialized_objects_dir, 'book_names.pkl')
-            book_pivot_serialized_objects = os.path.join(artifacts_dir, serialized_objects_dir, 'book_pivot.pkl')
-            final_rating_serialized_objects = os.path.join(artifacts_dir, serialized_objects_dir, 'final_rating.pkl')
+            title_index_file_path = os.path.join(artifacts_dir, serialized_objects_dir, 'title_index.parquet')
+            book_metadata_file_path = os.path.join(artifacts_dir, serialized_objects_dir, 'book_metadata.parquet')
+            poster_urls_file_path = os.path.join(artifacts_dir, serialized_objects_dir, 'poster_urls.npy')
+            title_search_prefix = os.path.join(artifacts_dir, serialized_objects_dir, 'title_search')
             
             # nested directory paths
             trained_model_dir = os.path.join(artifacts_dir, model_dir)
 
             # trained model file path
             trained_model_path = os.path.join(trained_model_dir,trained_model_name)
+
+            # sparse book matrix and its title labels
+            book_matrix_file_path = os.path.join(artifacts_dir, dataset_dir, transformed_data_dir, 'book_matrix.npz')
+            book_titles_file_path = os.path.join(artifacts_dir, dataset_dir, transformed_data_dir, 'book_titles.npy')
+
+            # precomputed neighbor table file paths
+            neighbor_indices_path = os.path.join(artifacts_dir, neighbor_dir, 'neighbor_indices.npy')
+            neighbor_distances_path = os.path.join(artifacts_dir, neighbor_dir, 'neighbor_distances.npy')
+            neighbor_graph_prefix = os.path.join(artifacts_dir, neighbor_dir, 'neighbor_graph')
           
             response = ModelRecommendationConfig(
-                book_name_serialized_objects = book_name_serialized_objects,
-                book_pivot_serialized_objects = book_pivot_serialized_objects,
-                final_rating_serialized_objects = final_rating_serialized_objects,
-                trained_model_path = trained_model_path
+                book_matrix_file_path = book_matrix_file_path,
+                book_titles_file_path = book_titles_file_path,
+                title_index_file_path = title_index_file_path,
+                book_metadata_file_path = book_metadata_file_path,
+                poster_urls_file_path = poster_urls_file_path,
+                title_search_prefix = title_search_prefix,
+                model_type = model['model_type'],
+                neighbor_engine = model['neighbor_engine'],
+                trained_model_path = trained_model_path,
+                neighbor_indices_path = neighbor_indices_path,
+                neighbor_distances_path = neighbor_distances_path,
+                neighbor_graph_prefix = neighbor_graph_prefix,
+                version = version
             )
 
             logging.info("Model Recommendation Config Loaded")
@@ -192,4 +420,99 @@ class AppConfiguration:
 
         except Exception as e:
             raise AppException(e, sys) from e
-            
\ No newline at end of file
+
+    def get_serving_config(self) -> ServingConfig:
+        try:
+            # get the config dict
+            serving_config = self.config_info['serving_config']
+
+            response = ServingConfig(
+                host = serving_config['host'],
+                port = int(serving_config['port']),
+                workers = int(serving_config['workers']),
+                max_batch_size = int(serving_config['max_batch_size'])
+            )
+
+            logging.info("Serving Config Loaded")
+            return response
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def get_poster_cache_config(self) -> PosterCacheConfig:
+        try:
+            # get the config dict
+            poster_cache_config = self.config_info['poster_cache_config']
+            artifacts_dir = self.config_info['artifacts_config']['artifacts_dir']
+
+            response = PosterCacheConfig(
+                poster_cache_dir = os.path.join(artifacts_dir, poster_cache_config['poster_cache_dir']),
+                max_bytes = int(float(poster_cache_config['max_cache_mb']) * 1024 * 1024),
+                thumbnail_width = int(poster_cache_config['thumbnail_width']),
+                thumbnail_height = int(poster_cache_config['thumbnail_height']),
+                fetch_workers = int(poster_cache_config['fetch_workers']),
+                fetch_timeout = float(poster_cache_config['fetch_timeout'])
+            )
+
+            logging.info("Poster Cache Config Loaded")
+            return response
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def get_result_cache_config(self) -> ResultCacheConfig:
+        try:
+            # get the config dict
+            result_cache_config = self.config_info.get('result_cache_config') or {}
+
+            response = ResultCacheConfig(
+                enabled = bool(result_cache_config.get('enabled', True)),
+                max_entries = int(result_cache_config.get('max_entries', 10000)),
+                ttl_seconds = float(result_cache_config.get('ttl_seconds', 3600))
+            )
+
+            logging.info("Result Cache Config Loaded")
+            return response
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def get_training_job_config(self) -> TrainingJobConfig:
+        try:
+            # get the config dict
+            training_job_config = self.config_info['training_job_config']
+            artifacts_dir = self.config_info['artifacts_config']['artifacts_dir']
+            job_dir = os.path.join(artifacts_dir, training_job_config['job_dir'])
+
+            response = TrainingJobConfig(
+                job_dir = job_dir,
+                lock_file_path = os.path.join(job_dir, 'training.lock'),
+                status_file_path = os.path.join(job_dir, 'status.json'),
+                cancel_file_path = os.path.join(job_dir, 'cancel')
+            )
+
+            logging.info("Training Job Config Loaded")
+            return response
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def get_metrics_config(self) -> MetricsConfig:
+        try:
+            # get the config dict
+            metrics_config = self.config_info.get('metrics_config') or {}
+            artifacts_dir = self.config_info['artifacts_config']['artifacts_dir']
+
+            response = MetricsConfig(
+                enabled = bool(metrics_config.get('enabled', True)),
+                dump_file_path = os.path.join(artifacts_dir, metrics_config.get('dump_file_name', 'metrics.prom'))
+            )
+
+            logging.info("Metrics Config Loaded")
+            return response
+
+        except Exception as e:
+            raise AppException(e, sys) from e
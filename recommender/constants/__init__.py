@@ -4,4 +4,9 @@ ROOT_DIR = os.getcwd()
 # Main config file path
 CONFIG_FOLDER_NAME = "config"
 CONFIG_FILE_NAME = "config.yaml"
-CONFIG_FILE_PATH = os.path.join(ROOT_DIR,CONFIG_FOLDER_NAME,CONFIG_FILE_NAME)
\ No newline at end of file
+CONFIG_FILE_PATH = os.path.join(ROOT_DIR,CONFIG_FOLDER_NAME,CONFIG_FILE_NAME)
+
+# training pipeline stages in run order, as reported to on_stage
+TRAINING_STAGES = ('data_ingestion', 'data_validation', 'data_transformation', 'model_training', 'neighbor_indexing', 'model_evaluation')
+# stages whose outputs serving reads, snapshotted into every published artifact version
+SERVING_STAGES = ('data_transformation', 'model_training', 'neighbor_indexing')
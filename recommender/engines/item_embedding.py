@@ -0,0 +1,64 @@
+import sys
+import numpy as np
+from scipy.sparse.linalg import svds
+from recommender.exception.exception_handler import AppException
+from recommender.utils.parallel import map_row_blocks
+
+
+def svd_item_embeddings(book_sparse, rank: int, random_state: int = 0) -> np.ndarray:
+    """
+    Low-rank title embeddings from a truncated SVD of the titles x users rating matrix.
+
+    The rows of U * S keep the dot products of the title vectors in the top rank directions,
+    they are L2-normalized so a dot product is a cosine similarity. Returns a C-contiguous
+    n_titles x rank float32 array, rank is capped below the smaller side of the matrix.
+    """
+    try:
+        rank = max(1, min(rank, min(book_sparse.shape) - 1))
+        # factorized in float64, ARPACK is far less accurate in single precision
+        u, s, _ = svds(book_sparse.astype(np.float64), k=rank, random_state=random_state)
+        # svds returns the singular values in ascending order
+        order = np.argsort(-s)
+        embeddings = u[:, order] * s[order]
+        norms = np.linalg.norm(embeddings, axis=1)
+        norms[norms == 0] = 1.0
+        return np.ascontiguousarray(embeddings / norms[:, None], dtype=np.float32)
+    except Exception as e:
+        raise AppException(e, sys) from e
+
+
+def _embedding_block(shared, start, end):
+    rows = shared['rows'][start:end]
+    embeddings, n_neighbors = shared['embeddings'], shared['n_neighbors']
+    # one dense product scores the block against every title
+    similarity = embeddings[rows] @ embeddings.T
+    # the title itself goes first, like in the kneighbors tables
+    similarity[np.arange(len(rows)), rows] = np.inf
+    top = np.argpartition(-similarity, n_neighbors - 1, axis=1)[:, :n_neighbors]
+    top_similarity = np.take_along_axis(similarity, top, axis=1)
+    # most similar first, ties go to the lower row id
+    order = np.lexsort((top, -top_similarity), axis=1)
+    indices = np.take_along_axis(top, order, axis=1)
+    distances = 1 - np.take_along_axis(top_similarity, order, axis=1)
+    distances[:, 0] = 0
+    return distances.astype(np.float32), indices.astype(np.int32)
+
+
+def embedding_neighbor_table(embeddings: np.ndarray, n_neighbors: int, rows=None, workers: int = 1,
+                             block_size: int = 1024) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (distances, indices) of the n_neighbors most similar titles of the given rows (all rows by default).
+
+    Embeddings are unit length, so distance is the cosine distance 1 - dot product. Rows are
+    scored in blocks over workers processes, a block only holds block_size x n_titles similarities.
+    """
+    try:
+        n_neighbors = min(n_neighbors, embeddings.shape[0])
+        rows = np.arange(embeddings.shape[0]) if rows is None else np.asarray(rows)
+        shared = {'embeddings': embeddings, 'rows': rows, 'n_neighbors': n_neighbors}
+        blocks = map_row_blocks(_embedding_block, len(rows), block_size, workers, shared)
+        if not blocks:
+            return np.empty((0, n_neighbors), dtype=np.float32), np.empty((0, n_neighbors), dtype=np.int32)
+        return np.vstack([d for d, _ in blocks]), np.vstack([i for _, i in blocks])
+    except Exception as e:
+        raise AppException(e, sys) from e
@@ -0,0 +1,78 @@
+import sys
+import numpy as np
+from scipy.sparse import csr_matrix, vstack
+from recommender.exception.exception_handler import AppException
+from recommender.engines.neighbor_engine import l2_normalize
+from recommender.utils.parallel import map_row_blocks
+
+
+def _top_k_rows(similarity: csr_matrix, top_k: int) -> csr_matrix:
+    """Keeps the top_k largest entries of every row, ties go to the lower column index"""
+    data, indices, indptr = [], [], [0]
+    for row in range(similarity.shape[0]):
+        start, end = similarity.indptr[row], similarity.indptr[row + 1]
+        values, columns = similarity.data[start:end], similarity.indices[start:end]
+        top = np.lexsort((columns, -values))[:top_k]
+        top = top[np.argsort(columns[top])]
+        data.append(values[top])
+        indices.append(columns[top])
+        indptr.append(indptr[-1] + len(top))
+    return csr_matrix((np.concatenate(data) if data else np.empty(0),
+                       np.concatenate(indices) if indices else np.empty(0, dtype=np.int32),
+                       np.asarray(indptr)), shape=similarity.shape)
+
+
+def _similarity_block(shared, start, end):
+    rows = shared['rows'][start:end]
+    vectors = shared['vectors']
+    # one sparse product gives the cosine of these titles with every title that shares a reader
+    similarity = (vectors[rows] @ vectors.T).tocoo()
+    # a title is not its own neighbor
+    keep = (similarity.col != rows[similarity.row]) & (similarity.data > 0)
+    similarity = csr_matrix((similarity.data[keep], (similarity.row[keep], similarity.col[keep])), shape=similarity.shape)
+    return _top_k_rows(similarity, shared['top_k']).astype(np.float32)
+
+
+def item_cosine_similarity(book_sparse, top_k: int, rows=None, workers: int = 1, block_size: int = 1024) -> csr_matrix:
+    """
+    Pruned item-item cosine similarity of the rows of book_sparse.
+
+    Title vectors are L2-normalized, so the product of a block of rows with the transposed
+    matrix is their cosine similarity with every title. Only titles with a common reader get
+    an entry, and each row keeps its top_k similarities. Returns a len(rows) x n_titles
+    float32 CSR matrix.
+    """
+    try:
+        vectors = l2_normalize(book_sparse)
+        rows = np.arange(book_sparse.shape[0]) if rows is None else np.asarray(rows)
+        shared = {'vectors': vectors, 'rows': rows, 'top_k': top_k}
+        blocks = map_row_blocks(_similarity_block, len(rows), block_size, workers, shared)
+        if not blocks:
+            return csr_matrix((0, book_sparse.shape[0]), dtype=np.float32)
+        return vstack(blocks, format='csr')
+    except Exception as e:
+        raise AppException(e, sys) from e
+
+
+def similarity_neighbor_table(similarity: csr_matrix, n_neighbors: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (distances, indices) table of the similarity matrix in the layout of the kneighbors tables.
+
+    The first column is the title itself, the others its most similar titles with cosine
+    distance 1 - similarity. Rows with fewer neighbors are padded with the title itself,
+    which every reader of the table already skips.
+    """
+    try:
+        n_titles = similarity.shape[0]
+        indices = np.repeat(np.arange(n_titles, dtype=np.int32)[:, None], n_neighbors, axis=1)
+        distances = np.ones((n_titles, n_neighbors), dtype=np.float32)
+        distances[:, 0] = 0
+        for row in range(n_titles):
+            start, end = similarity.indptr[row], similarity.indptr[row + 1]
+            values, columns = similarity.data[start:end], similarity.indices[start:end]
+            top = np.lexsort((columns, -values))[:n_neighbors - 1]
+            indices[row, 1:len(top) + 1] = columns[top]
+            distances[row, 1:len(top) + 1] = 1 - values[top]
+        return distances, indices
+    except Exception as e:
+        raise AppException(e, sys) from e
@@ -0,0 +1,166 @@
+import sys
+import numpy as np
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from scipy.sparse import csr_matrix, issparse
+from sklearn.neighbors import NearestNeighbors
+from recommender.exception.exception_handler import AppException
+
+
+def l2_normalize(X, dtype=np.float32):
+    """
+    Returns a copy of X whose rows have unit L2 norm (all-zero rows stay zero).
+    Norms are accumulated in float64, the vectors are stored as dtype.
+    """
+    X = csr_matrix(X if issparse(X) else np.atleast_2d(X), dtype=dtype, copy=True)
+    X.sum_duplicates()
+    norms = np.sqrt(np.bincount(np.repeat(np.arange(X.shape[0]), np.diff(X.indptr)),
+                                weights=np.square(X.data, dtype=np.float64), minlength=X.shape[0]))
+    norms[norms == 0] = 1.0
+    X.data /= np.repeat(norms, np.diff(X.indptr)).astype(dtype)
+    return X
+
+
+# Abstract class for nearest neighbor engines
+class NeighborEngine(ABC):
+    """Common interface of the neighbor engines, mirrors sklearn's NearestNeighbors."""
+
+    @abstractmethod
+    def fit(self, X) -> "NeighborEngine":
+        pass
+
+    @abstractmethod
+    def kneighbors(self, X, n_neighbors: int = 5) -> tuple[np.ndarray, np.ndarray]:
+        """Returns (distances, indices), both of shape (n_queries, n_neighbors)."""
+        pass
+
+
+# Exact search, wraps scikit-learn's brute force NearestNeighbors
+class BruteForceEngine(NeighborEngine):
+    def __init__(self, metric: str = 'minkowski'):
+        self.metric = metric
+        self.model = NearestNeighbors(algorithm='brute', metric=metric)
+
+    def fit(self, X) -> "BruteForceEngine":
+        self.model.fit(X)
+        return self
+
+    def kneighbors(self, X, n_neighbors: int = 5) -> tuple[np.ndarray, np.ndarray]:
+        return self.model.kneighbors(X, n_neighbors=n_neighbors)
+
+
+# Base class of the approximate engines, candidates are re-ranked by exact cosine distance
+class _CandidateEngine(NeighborEngine):
+    metric = 'cosine'
+
+    def fit(self, X) -> "_CandidateEngine":
+        self._vectors = l2_normalize(X)
+        self._build(self._vectors)
+        return self
+
+    @abstractmethod
+    def _build(self, vectors: csr_matrix) -> None:
+        pass
+
+    @abstractmethod
+    def _candidates(self, queries: csr_matrix) -> list[np.ndarray]:
+        pass
+
+    def kneighbors(self, X, n_neighbors: int = 5) -> tuple[np.ndarray, np.ndarray]:
+        try:
+            queries = l2_normalize(X)
+            n_items = self._vectors.shape[0]
+            n_neighbors = min(n_neighbors, n_items)
+            distances = np.empty((queries.shape[0], n_neighbors), dtype=np.float32)
+            indices = np.empty((queries.shape[0], n_neighbors), dtype=np.int64)
+
+            for row, candidates in enumerate(self._candidates(queries)):
+                # too few candidates in the probed buckets, fall back to an exact scan for this query
+                if len(candidates) < n_neighbors:
+                    candidates = np.arange(n_items)
+                sims = (self._vectors[candidates] @ queries[row].T).toarray().ravel()
+                top = np.argpartition(-sims, n_neighbors - 1)[:n_neighbors]
+                top = top[np.lexsort((candidates[top], -sims[top]))]
+                distances[row] = 1.0 - sims[top]
+                indices[row] = candidates[top]
+
+            return distances, indices
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+# Random-projection LSH: each table hashes a vector by the signs of n_bits random projections
+class LSHEngine(_CandidateEngine):
+    def __init__(self, n_tables: int = 8, n_bits: int = 10, random_state: int = 42):
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.random_state = random_state
+
+    def _hash(self, vectors: csr_matrix) -> np.ndarray:
+        bits = np.asarray(vectors @ self._planes) > 0
+        bits = bits.reshape(vectors.shape[0], self.n_tables, self.n_bits)
+        return bits @ (1 << np.arange(self.n_bits, dtype=np.int64))
+
+    def _build(self, vectors: csr_matrix) -> None:
+        rng = np.random.default_rng(self.random_state)
+        # planes are drawn in float64 so a seed gives the same planes whatever the vector dtype, then cast to it for projecting
+        self._planes = rng.standard_normal((vectors.shape[1], self.n_tables * self.n_bits)).astype(vectors.dtype)
+        codes = self._hash(vectors)
+        self._buckets = []
+        for table in range(self.n_tables):
+            buckets = defaultdict(list)
+            for item, code in enumerate(codes[:, table]):
+                buckets[code].append(item)
+            self._buckets.append({code: np.asarray(items) for code, items in buckets.items()})
+
+    def _candidates(self, queries: csr_matrix) -> list[np.ndarray]:
+        empty = np.empty(0, dtype=np.int64)
+        codes = self._hash(queries)
+        return [np.unique(np.concatenate([self._buckets[table].get(code, empty)
+                                          for table, code in enumerate(query_codes)]))
+                for query_codes in codes]
+
+
+# IVF: spherical k-means partitions the vectors, a query scans only its n_probe closest lists
+class IVFEngine(_CandidateEngine):
+    def __init__(self, n_lists: int = 32, n_probe: int = 4, n_iter: int = 10, random_state: int = 42):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.random_state = random_state
+
+    def _build(self, vectors: csr_matrix) -> None:
+        rng = np.random.default_rng(self.random_state)
+        n_lists = min(self.n_lists, vectors.shape[0])
+        centroids = vectors[rng.choice(vectors.shape[0], n_lists, replace=False)].toarray()
+
+        for _ in range(self.n_iter):
+            assignment = np.asarray(vectors @ centroids.T).argmax(axis=1)
+            for lst in range(n_lists):
+                members = vectors[assignment == lst]
+                if members.shape[0]:
+                    centroid = np.asarray(members.sum(axis=0)).ravel()
+                    centroids[lst] = centroid / (np.linalg.norm(centroid) or 1.0)
+
+        self._centroids = centroids
+        assignment = np.asarray(vectors @ centroids.T).argmax(axis=1)
+        self._lists = [np.flatnonzero(assignment == lst) for lst in range(n_lists)]
+
+    def _candidates(self, queries: csr_matrix) -> list[np.ndarray]:
+        n_probe = min(self.n_probe, len(self._lists))
+        probes = np.argsort(-np.asarray(queries @ self._centroids.T), axis=1)[:, :n_probe]
+        return [np.sort(np.concatenate([self._lists[lst] for lst in query_probes])) for query_probes in probes]
+
+
+# Factory class for neighbor engines
+class NeighborEngineFactory:
+    @staticmethod
+    def get_neighbor_engine(engine_name: str = 'brute', **engine_params) -> NeighborEngine:
+        if engine_name == 'brute':
+            return BruteForceEngine(**engine_params)
+        elif engine_name == 'lsh':
+            return LSHEngine(**engine_params)
+        elif engine_name == 'ivf':
+            return IVFEngine(**engine_params)
+        else:
+            raise ValueError(f"Unsupported neighbor engine: {engine_name}")
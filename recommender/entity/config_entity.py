@@ -1,5 +1,17 @@
 from dataclasses import dataclass
 
+@dataclass(frozen=True)
+class PipelineManifestConfig:
+  manifest_file_path: str
+  skip_unchanged_stages: bool
+
+@dataclass(frozen=True)
+class ArtifactVersionsConfig:
+  artifacts_dir: str
+  versions_dir: str
+  pointer_file_path: str
+  keep_versions: int
+
 @dataclass(frozen=True)
 class DataIngestionConfig:
     kaggle_dataset_name: str
@@ -9,24 +21,132 @@ class DataIngestionConfig:
 @dataclass(frozen=True)
 class DataValidationConfig:
   clean_data_dir: str
+  clean_data_file_path: str
   serialized_objects_dir: str
   books_csv_file: str
   ratings_csv_file: str
+  user_ratings_threshold: int
+  book_ratings_threshold: int
+  streaming: bool
+  chunk_size: int
+  delta_data_dir: str
+  user_counts_file_path: str
+  title_counts_file_path: str
 
 @dataclass(frozen=True)
 class DataTransformationConfig:
   clean_data_file_path: str
   transformed_data_dir: str
+  book_matrix_file_path: str
+  book_titles_file_path: str
+  user_ids_file_path: str
+  title_index_file_path: str
+  book_metadata_file_path: str
+  poster_urls_file_path: str
+  title_search_prefix: str
 
 @dataclass(frozen=True)
 class ModelTrainerConfig:
-  transformed_data_file_dir: str
+  book_matrix_file_path: str
   trained_model_dir: str
   trained_model_name: str
+  model_type: str
+  item_similarity_prefix: str
+  similarity_top_k: int
+  item_embeddings_path: str
+  svd_rank: int
+  workers: int
+  block_size: int
+  neighbor_engine: str
+  engine_params: dict
+  recall_report_path: str
+  recall_sample_size: int
+  recall_k: int
+
+@dataclass(frozen=True)
+class NeighborIndexConfig:
+  book_matrix_file_path: str
+  model_type: str
+  trained_model_path: str
+  item_similarity_prefix: str
+  item_embeddings_path: str
+  neighbor_index_dir: str
+  neighbor_indices_path: str
+  neighbor_distances_path: str
+  neighbor_graph_prefix: str
+  precision_report_path: str
+  top_k: int
+  workers: int
+  block_size: int
+  precision_check_sample_size: int
+  min_precision_match: float
+
+@dataclass(frozen=True)
+class ModelEvaluationConfig:
+  book_matrix_file_path: str
+  evaluation_dir: str
+  evaluation_report_path: str
+  enabled: bool
+  holdout_fraction: float
+  min_user_ratings: int
+  k: int
+  random_state: int
+  latency_sample_size: int
+  min_relative_ndcg: float
+  candidates: list
+  engine_params: dict
+  similarity_top_k: int
+  svd_rank: int
+  top_k: int
+  workers: int
+  block_size: int
 
 @dataclass(frozen=True)
 class ModelRecommendationConfig:
-  book_name_serialized_objects: str
-  book_pivot_serialized_objects: str
-  final_rating_serialized_objects: str
+  book_matrix_file_path: str
+  book_titles_file_path: str
+  title_index_file_path: str
+  book_metadata_file_path: str
+  poster_urls_file_path: str
+  title_search_prefix: str
+  model_type: str
+  neighbor_engine: str
   trained_model_path: str
+  neighbor_indices_path: str
+  neighbor_distances_path: str
+  neighbor_graph_prefix: str
+  version: str
+
+@dataclass(frozen=True)
+class ServingConfig:
+  host: str
+  port: int
+  workers: int
+  max_batch_size: int
+
+@dataclass(frozen=True)
+class PosterCacheConfig:
+  poster_cache_dir: str
+  max_bytes: int
+  thumbnail_width: int
+  thumbnail_height: int
+  fetch_workers: int
+  fetch_timeout: float
+
+@dataclass(frozen=True)
+class ResultCacheConfig:
+  enabled: bool
+  max_entries: int
+  ttl_seconds: float
+
+@dataclass(frozen=True)
+class TrainingJobConfig:
+  job_dir: str
+  lock_file_path: str
+  status_file_path: str
+  cancel_file_path: str
+
+@dataclass(frozen=True)
+class MetricsConfig:
+  enabled: bool
+  dump_file_path: str
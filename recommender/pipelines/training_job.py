@@ -0,0 +1,203 @@
+import os
+import sys
+import json
+import time
+import signal
+import multiprocessing
+from recommender.logger.log import logging
+from recommender.config.configuration import AppConfiguration
+from recommender.constants import TRAINING_STAGES
+from recommender.exception.exception_handler import AppException
+from recommender.utils.array_io import atomic_write
+
+# job states written to the status file
+RUNNING_STATES = ('starting', 'running')
+
+
+class TrainingCancelled(Exception):
+    """Raised inside the training process when its job is cancelled"""
+
+
+def _pid_alive(pid) -> bool:
+    if not pid:
+        return False
+    if os.name == 'nt':
+        # os.kill(pid, 0) would send CTRL_C_EVENT on Windows, trust the lock instead
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read_json(file_path: str) -> dict:
+    try:
+        with open(file_path) as json_file:
+            return json.load(json_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_json(file_path: str, payload: dict) -> None:
+    with atomic_write(file_path) as tmp_path:
+        with open(tmp_path, 'w') as json_file:
+            json.dump(payload, json_file, indent=2)
+
+
+def _update_status(job_config, **fields) -> dict:
+    status = _read_json(job_config.status_file_path)
+    status.update(fields, updated_at=time.time())
+    _write_json(job_config.status_file_path, status)
+    return status
+
+
+def _run_training_job(job_config, config_file_path: str, force: bool) -> None:
+    """Entry point of the training process, trains with the config file of the process that started it"""
+    from recommender.pipelines.training_pipeline import TrainingPipeline
+
+    def on_sigterm(signum, frame):
+        raise TrainingCancelled()
+    signal.signal(signal.SIGTERM, on_sigterm)
+
+    stages = {}
+
+    def on_stage(stage, event):
+        # cooperative cancellation point for platforms without SIGTERM
+        if os.path.exists(job_config.cancel_file_path):
+            raise TrainingCancelled()
+        stages[stage] = event
+        _update_status(job_config, state='running', stage=stage, stages=stages,
+                       stages_done=sum(e != 'started' for e in stages.values()))
+
+    try:
+        _update_status(job_config, state='running', pid=os.getpid())
+        TrainingPipeline(AppConfiguration(config_file_path)).start_training_pipeline(force=force, on_stage=on_stage)
+        # a cancel during model evaluation ends the pipeline without an error, after the version was published
+        state = 'cancelled' if os.path.exists(job_config.cancel_file_path) else 'succeeded'
+        _update_status(job_config, state=state, finished_at=time.time())
+    except BaseException as e:
+        if os.path.exists(job_config.cancel_file_path):
+            _update_status(job_config, state='cancelled', finished_at=time.time())
+        else:
+            _update_status(job_config, state='failed', error=str(e), finished_at=time.time())
+    finally:
+        for file_path in (job_config.lock_file_path, job_config.cancel_file_path):
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+
+class TrainingJobRunner:
+    """
+    Runs the training pipeline in a separate process.
+
+    A lock file holding the pid of the training process makes sure only one run happens at
+    a time, across sessions and processes. A lock left by a process that died is detected
+    and taken over. Progress is published to a JSON status file after every stage, and
+    cancel() stops the run with SIGTERM (or at the next stage boundary where there is none).
+    """
+
+    def __init__(self, app_config: AppConfiguration = None):
+        try:
+            app_config = app_config or AppConfiguration()
+            self.config_file_path = app_config.config_file_path
+            self.job_config = app_config.get_training_job_config()
+            os.makedirs(self.job_config.job_dir, exist_ok=True)
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def _lock_owner(self):
+        return _read_json(self.job_config.lock_file_path).get('pid')
+
+    def _acquire_lock(self) -> bool:
+        for _ in range(2):
+            try:
+                fd = os.open(self.job_config.lock_file_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                with os.fdopen(fd, 'w') as lock_file:
+                    json.dump({'pid': os.getpid()}, lock_file)
+                return True
+            except FileExistsError:
+                owner = self._lock_owner()
+                if _pid_alive(owner):
+                    return False
+                logging.warning(f"Removing stale training lock of process {owner}")
+                try:
+                    os.remove(self.job_config.lock_file_path)
+                except FileNotFoundError:
+                    pass
+        return False
+
+    def start(self, force: bool = False) -> bool:
+        """Starts a training run, returns False when one is already running"""
+        try:
+            if not self._acquire_lock():
+                logging.info("Training job already running, not starting another one")
+                return False
+
+            if os.path.exists(self.job_config.cancel_file_path):
+                os.remove(self.job_config.cancel_file_path)
+            _write_json(self.job_config.status_file_path, {
+                'state': 'starting', 'stage': None, 'stages': {}, 'stages_done': 0,
+                'n_stages': len(TRAINING_STAGES), 'started_at': time.time(), 'updated_at': time.time(),
+            })
+
+            # spawn, forking a process that runs server threads is not safe
+            process = multiprocessing.get_context('spawn').Process(target=_run_training_job,
+                                                                   args=(self.job_config, self.config_file_path, force),
+                                                                   name='training-job')
+            process.start()
+            # the lock now belongs to the training process, so it outlives this one
+            _write_json(self.job_config.lock_file_path, {'pid': process.pid})
+            logging.info(f"Started training job in process {process.pid}")
+            return True
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def status(self) -> dict:
+        """Current job status, {'state': 'idle'} before the first run"""
+        try:
+            # reaps a finished training process started from here, a zombie would still look alive
+            multiprocessing.active_children()
+            status = _read_json(self.job_config.status_file_path) or {'state': 'idle'}
+            if status['state'] in RUNNING_STATES and not _pid_alive(self._lock_owner()):
+                # the training process died without reporting (killed before its handler was set, out of memory, ...)
+                if os.path.exists(self.job_config.cancel_file_path):
+                    status = _update_status(self.job_config, state='cancelled', finished_at=time.time())
+                else:
+                    status = _update_status(self.job_config, state='failed', error='training process exited unexpectedly',
+                                            finished_at=time.time())
+                for file_path in (self.job_config.lock_file_path, self.job_config.cancel_file_path):
+                    if os.path.exists(file_path):
+                        os.remove(file_path)
+            return status
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def is_running(self) -> bool:
+        return self.status()['state'] in RUNNING_STATES
+
+    def cancel(self) -> bool:
+        """Asks the running job to stop, returns False when nothing is running"""
+        try:
+            if not self.is_running():
+                return False
+            open(self.job_config.cancel_file_path, 'w').close()
+            if os.name != 'nt':
+                os.kill(self._lock_owner(), signal.SIGTERM)
+            logging.info("Cancelling training job")
+            return True
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def wait(self, timeout: float = None, poll_interval: float = 0.5) -> dict:
+        """Blocks until the job is no longer running (or timeout seconds passed), returns its status"""
+        try:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while self.is_running() and (deadline is None or time.monotonic() < deadline):
+                time.sleep(poll_interval)
+            return self.status()
+        except Exception as e:
+            raise AppException(e, sys) from e
@@ -1,18 +1,166 @@
 import sys
+import os
 from recommender.components.data_ingestion import DataIngestionFactory, ZipDataIngestion
-from recommender.components.data_validation import DataValidation
+from recommender.components.data_validation import DataValidation, list_ratings_files
 from recommender.components.data_transformation import DataTransformation
 from recommender.components.model_training import ModelTrainer
+from recommender.components.neighbor_indexing import NeighborIndexer
+from recommender.components.model_evaluation import ModelEvaluator
+from recommender.components.incremental_training import IncrementalTrainer
+from recommender.config.configuration import AppConfiguration
+from recommender.constants import TRAINING_STAGES, SERVING_STAGES
 from recommender.exception.exception_handler import AppException
+from recommender.utils.array_io import csr_buffer_paths
+from recommender.utils.title_search import title_search_paths
+from recommender.utils.stage_manifest import StageManifest
+from recommender.utils.artifact_versions import ArtifactVersions
+from recommender.utils.metrics import get_metrics
 from recommender.logger import log
 import logging
 
 class TrainingPipeline:
-    def __init__(self):
-        pass
+    def __init__(self, app_config: AppConfiguration = None):
+        try:
+            app_config = app_config or AppConfiguration()
+            self.app_config = app_config
+            self.manifest_config = app_config.get_pipeline_manifest_config()
+            self.stage_manifest = StageManifest(self.manifest_config.manifest_file_path)
+            self.artifact_versions = ArtifactVersions(app_config.get_artifact_versions_config())
+            self.metrics_config = app_config.get_metrics_config()
+            self.metrics = get_metrics()
+            self.metrics.configure(self.metrics_config)
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def stage_spec(self, stage, zip_file_path=None) -> dict:
+        """Config sections, input files and output files of a pipeline stage"""
+        try:
+            data_validation_config = self.app_config.get_data_validation_config()
+            data_transformation_config = self.app_config.get_data_transformation_config()
+            model_trainer_config = self.app_config.get_model_trainer_config()
+            neighbor_index_config = self.app_config.get_neighbor_index_config()
+            model_evaluation_config = self.app_config.get_model_evaluation_config()
+            trained_model_path = os.path.join(model_trainer_config.trained_model_dir, model_trainer_config.trained_model_name)
+            # the item_cosine model is stored as CSR buffers and the svd model as an embedding array instead of a pickle
+            if model_trainer_config.model_type == 'item_cosine':
+                model_files = list(csr_buffer_paths(model_trainer_config.item_similarity_prefix).values())
+            elif model_trainer_config.model_type == 'svd':
+                model_files = [model_trainer_config.item_embeddings_path]
+            else:
+                model_files = [trained_model_path]
+
+            specs = {
+                'data_ingestion': dict(
+                    config = ['data_ingestion_config'],
+                    inputs = [zip_file_path],
+                    outputs = [data_validation_config.books_csv_file, data_validation_config.ratings_csv_file]),
+                'data_validation': dict(
+                    config = ['data_validation_config'],
+                    inputs = [data_validation_config.books_csv_file] + list_ratings_files(data_validation_config),
+                    outputs = [data_validation_config.clean_data_file_path,
+                               data_validation_config.user_counts_file_path,
+                               data_validation_config.title_counts_file_path]),
+                'data_transformation': dict(
+                    config = ['data_transformation_config'],
+                    inputs = [data_transformation_config.clean_data_file_path],
+                    outputs = [data_transformation_config.book_matrix_file_path,
+                               data_transformation_config.book_titles_file_path,
+                               data_transformation_config.user_ids_file_path,
+                               data_transformation_config.title_index_file_path,
+                               data_transformation_config.book_metadata_file_path,
+                               data_transformation_config.poster_urls_file_path,
+                               *title_search_paths(data_transformation_config.title_search_prefix).values()]),
+                'model_training': dict(
+                    config = ['model_trainer_config'],
+                    inputs = [model_trainer_config.book_matrix_file_path],
+                    outputs = model_files),
+                'neighbor_indexing': dict(
+                    config = ['neighbor_index_config'],
+                    inputs = [neighbor_index_config.book_matrix_file_path, *model_files],
+                    outputs = [neighbor_index_config.neighbor_indices_path,
+                               neighbor_index_config.neighbor_distances_path,
+                               *csr_buffer_paths(neighbor_index_config.neighbor_graph_prefix).values()]),
+                'model_evaluation': dict(
+                    # candidates take their engine parameters from the model trainer section
+                    config = ['model_evaluation_config', 'model_trainer_config', 'neighbor_index_config'],
+                    inputs = [model_evaluation_config.book_matrix_file_path],
+                    outputs = [model_evaluation_config.evaluation_report_path] if model_evaluation_config.enabled else []),
+            }
+            return specs[stage]
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def stage_fingerprint(self, spec) -> str:
+        try:
+            config = {section: self.app_config.get_config_section(section) for section in spec['config']}
+            # output paths are part of the fingerprint, moving an artifact reruns its stage
+            return self.stage_manifest.fingerprint({'sections': config, 'outputs': spec['outputs']}, spec['inputs'])
+        except Exception as e:
+            raise AppException(e, sys) from e
 
 
-    def start_training_pipeline(self):
+    def run_stage(self, stage, run, force=False, on_stage=None, **spec_args) -> bool:
+        """
+        Runs a stage unless its inputs, config and outputs match the manifest, returns whether it ran.
+        on_stage(stage, event) is called with 'started' and then 'completed', 'skipped' or 'failed'.
+        """
+        try:
+            on_stage = on_stage or (lambda stage, event: None)
+            on_stage(stage, 'started')
+            spec = self.stage_spec(stage, **spec_args)
+            fingerprint = self.stage_fingerprint(spec)
+            if (not force and self.manifest_config.skip_unchanged_stages
+                    and self.stage_manifest.is_fresh(stage, fingerprint, spec['outputs'])):
+                logging.info(f"{'='*20}{stage} inputs unchanged, skipping stage{'='*20}")
+                self.metrics.inc('pipeline_stage_runs_total', stage=stage, result='skipped')
+                on_stage(stage, 'skipped')
+                return False
+
+            # a failed run must not leave the previous record claiming the outputs are current
+            self.stage_manifest.invalidate(stage)
+            try:
+                with self.metrics.timer('pipeline_stage_seconds', stage=stage):
+                    run()
+            except BaseException:
+                self.metrics.inc('pipeline_stage_runs_total', stage=stage, result='failed')
+                on_stage(stage, 'failed')
+                raise
+            self.stage_manifest.record(stage, fingerprint, spec['outputs'])
+            self.metrics.inc('pipeline_stage_runs_total', stage=stage, result='completed')
+            on_stage(stage, 'completed')
+            return True
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def publish_version(self, source) -> str:
+        """Snapshots the serving artifacts of the last run as a new version and points serving at it"""
+        try:
+            # everything from the rating matrix to the neighbor table, the dataset files are not served
+            files = [file_path for stage in SERVING_STAGES for file_path in self.stage_spec(stage)['outputs']]
+            # serving takes the model type from the version, not from config.yaml, so a rollback needs no config change
+            model_trainer_config = self.app_config.get_model_trainer_config()
+            model = {'model_type': model_trainer_config.model_type, 'neighbor_engine': model_trainer_config.neighbor_engine}
+            return self.artifact_versions.publish({file_path: self.stage_manifest.file_hash(file_path) for file_path in files},
+                                                  source, model)
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def dump_metrics(self) -> None:
+        """Writes the run's stage timings in Prometheus text format next to the artifacts"""
+        try:
+            if self.metrics.enabled:
+                self.metrics.dump(self.metrics_config.dump_file_path)
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def start_training_pipeline(self, force=False, on_stage=None):
         # step 1: Data Ingestion
         try:
             # get data ingestor
@@ -23,42 +171,88 @@ class TrainingPipeline:
             if isinstance(ingestor, ZipDataIngestion):
                 file_path = ingestor.download_data()
 
-            # ingest data
-            ingestor.ingest_data(file_path)
+            # ingest data, the zip is only extracted again when its content changed
+            self.run_stage('data_ingestion', lambda: ingestor.ingest_data(file_path), force, on_stage, zip_file_path=file_path)
 
         except Exception as e:
             logging.error(f"Error during ingestion: {e}")
             raise AppException(e, sys) from e
-        
+
         # step 2: Data Validation / Preprocessing
-        try:      
+        try:
             # initiate data reprocess data
-            data_validation = DataValidation()
-            data_validation.start_data_validation()
+            self.run_stage('data_validation', lambda: DataValidation(self.app_config).start_data_validation(), force, on_stage)
 
         except Exception as e:
             logging.error(f"Error during data validation: {e}")
             raise AppException(e, sys) from e
-        
+
         # step 3: Data Transformation
         try:
             # initiate data transformation
-            data_transformation = DataTransformation()
-            data_transformation.initiate_data_transformation()
+            self.run_stage('data_transformation', lambda: DataTransformation(self.app_config).initiate_data_transformation(), force, on_stage)
 
         except Exception as e:
             logging.error(f"Error during data transformation: {e}")
             raise AppException(e, sys) from e
-        
+
         # step 4: Model Training
         try:
             # initiate model training
-            model_trainier = ModelTrainer()
-            model_trainier.initiate_model_trainer()
+            self.run_stage('model_training', lambda: ModelTrainer(self.app_config).initiate_model_trainer(), force, on_stage)
 
         except Exception as e:
             logging.error(f"Error during model training: {e}")
             raise AppException(e, sys) from e
 
+        # step 5: Neighbor Indexing
+        try:
+            # precompute every title's top-K neighbors for serving
+            self.run_stage('neighbor_indexing', lambda: NeighborIndexer(self.app_config).initiate_neighbor_indexing(), force, on_stage)
+
+        except Exception as e:
+            logging.error(f"Error during neighbor indexing: {e}")
+            raise AppException(e, sys) from e
+
+        # step 6: Publish, servers swap to the new version once the current pointer moves
+        try:
+            version = self.publish_version('training')
+
+        except Exception as e:
+            logging.error(f"Error while publishing artifacts: {e}")
+            raise AppException(e, sys) from e
+
+        # step 7: Model Evaluation, runs after publishing so a slow comparison never delays the new version.
+        # the published version is already being served, a failed evaluation is logged without failing the run
+        try:
+            self.run_stage('model_evaluation', lambda: ModelEvaluator(self.app_config).initiate_model_evaluation(), force, on_stage)
+        except Exception as e:
+            logging.error(f"Error during model evaluation, version {version} stays published: {e}")
+
+        self.dump_metrics()
+        return version
+
 
-            
\ No newline at end of file
+    def start_incremental_pipeline(self, delta_file_path):
+        # folds a delta ratings file into the last trained artifacts, no re-ingestion or full rebuild
+        try:
+            for stage in TRAINING_STAGES[1:]:
+                self.stage_manifest.invalidate(stage)
+
+            incremental_trainer = IncrementalTrainer(self.app_config)
+            with self.metrics.timer('pipeline_stage_seconds', stage='incremental_training'):
+                incremental_trainer.initiate_incremental_training(delta_file_path)
+
+            # the updated artifacts already include the staged delta, so a later full run can skip these stages,
+            # the evaluation report still describes the previous matrix and is redone by the next full run
+            for stage in ('data_validation', *SERVING_STAGES):
+                spec = self.stage_spec(stage)
+                self.stage_manifest.record(stage, self.stage_fingerprint(spec), spec['outputs'])
+
+            version = self.publish_version('incremental')
+            self.dump_metrics()
+            return version
+
+        except Exception as e:
+            logging.error(f"Error during incremental training: {e}")
+            raise AppException(e, sys) from e
@@ -0,0 +1,86 @@
+import os
+import sys
+import pickle
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable
+from recommender.logger.log import logging
+from recommender.exception.exception_handler import AppException
+from recommender.utils.metrics import get_metrics
+
+
+def load_pickle(file_path: str) -> Any:
+    """Default artifact loader: unpickles the file at file_path."""
+    with open(file_path, 'rb') as file_obj:
+        return pickle.load(file_obj)
+
+
+@dataclass(frozen=True)
+class _StoreEntry:
+    signature: tuple
+    value: Any
+
+
+class ModelStore:
+    """
+    Process-wide registry of deserialized serving artifacts.
+
+    Every artifact is loaded once per process and shared by all callers (and
+    therefore by all Streamlit sessions). An entry is reloaded only when the
+    file on disk changes, detected through its modification time and size.
+    """
+
+    def __init__(self) -> None:
+        self._entries: dict[str, _StoreEntry] = {}
+        self._lock = threading.Lock()
+        self._hits = get_metrics().counter('cache_requests_total', cache='model_store', result='hit')
+        self._misses = get_metrics().counter('cache_requests_total', cache='model_store', result='miss')
+
+    @staticmethod
+    def _file_signature(file_path: str) -> tuple:
+        stat = os.stat(file_path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def load(self, file_path: str, loader: Callable[[str], Any] = load_pickle) -> Any:
+        """Returns the cached artifact for file_path, (re)loading it if the file changed."""
+        try:
+            signature = self._file_signature(file_path)
+            entry = self._entries.get(file_path)
+            if entry is not None and entry.signature == signature:
+                self._hits.inc()
+                return entry.value
+
+            with self._lock:
+                # another thread may have loaded it while we were waiting
+                entry = self._entries.get(file_path)
+                if entry is not None and entry.signature == signature:
+                    self._hits.inc()
+                    return entry.value
+
+                self._misses.inc()
+                with get_metrics().timer('artifact_load_seconds', artifact=os.path.basename(file_path)):
+                    value = loader(file_path)
+                self._entries[file_path] = _StoreEntry(signature=signature, value=value)
+                logging.info(f"Loaded serving artifact {file_path} into model store")
+                return value
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def retain(self, prefix: str) -> None:
+        """Drops every cached artifact outside prefix, used to release a version that is no longer served."""
+        with self._lock:
+            for file_path in [path for path in self._entries if not path.startswith(prefix)]:
+                del self._entries[file_path]
+
+    def clear(self) -> None:
+        """Drops every cached artifact so the next load reads from disk."""
+        with self._lock:
+            self._entries.clear()
+
+
+# Shared instance used by every Recommendation in this process
+model_store = ModelStore()
+
+
+def get_model_store() -> ModelStore:
+    return model_store
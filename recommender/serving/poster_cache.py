@@ -0,0 +1,216 @@
+import os
+import io
+import sys
+import zlib
+import struct
+import hashlib
+import threading
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from recommender.logger.log import logging
+from recommender.exception.exception_handler import AppException
+from recommender.utils.metrics import get_metrics
+
+# Pillow is optional, without it covers are cached as downloaded instead of as thumbnails
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+PLACEHOLDER_NAME = 'placeholder.png'
+# dead Amazon covers come back as a 1x1 gif of a few dozen bytes
+MIN_POSTER_BYTES = 100
+
+
+def solid_png(width: int, height: int, rgb=(224, 224, 224)) -> bytes:
+    """Encodes a single-color RGB PNG, used as placeholder so no image library is needed"""
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+    raw = (b'\x00' + bytes(rgb) * width) * height
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw, 9))
+            + chunk(b'IEND', b''))
+
+
+def image_content_type(payload: bytes) -> str:
+    """MIME type of cached poster bytes, from their magic number"""
+    if payload.startswith(b'\x89PNG'):
+        return 'image/png'
+    if payload.startswith(b'GIF8'):
+        return 'image/gif'
+    return 'image/jpeg'
+
+
+class PosterCache:
+    """
+    Disk cache of book cover thumbnails.
+
+    Covers are keyed by the sha1 of their URL. Missing covers of a request are downloaded
+    concurrently on a thread pool, resized to thumbnails and written to cache_dir.
+
+    Dead URLs are remembered as empty files and served as the placeholder, so they are not
+    fetched again on every render. Network errors are not cached and are retried on the
+    next request. When the cache grows past max_bytes the least recently used files are
+    removed, the order survives restarts through file mtimes.
+    """
+
+    def __init__(self, poster_cache_config) -> None:
+        try:
+            self.config = poster_cache_config
+            os.makedirs(self.config.poster_cache_dir, exist_ok=True)
+            self._executor = ThreadPoolExecutor(max_workers=self.config.fetch_workers, thread_name_prefix='poster-fetch')
+            self._lock = threading.Lock()
+            self._inflight = {}
+            self._hits = get_metrics().counter('cache_requests_total', cache='poster', result='hit')
+            self._misses = get_metrics().counter('cache_requests_total', cache='poster', result='miss')
+
+            # precomputed placeholder, kept outside the LRU
+            self.placeholder_path = os.path.join(self.config.poster_cache_dir, PLACEHOLDER_NAME)
+            if not os.path.exists(self.placeholder_path):
+                with open(self.placeholder_path, 'wb') as placeholder_file:
+                    placeholder_file.write(solid_png(self.config.thumbnail_width, self.config.thumbnail_height))
+            with open(self.placeholder_path, 'rb') as placeholder_file:
+                self.placeholder = placeholder_file.read()
+
+            # rebuild the LRU order from the files already on disk, oldest first
+            entries = []
+            for name in os.listdir(self.config.poster_cache_dir):
+                if name == PLACEHOLDER_NAME or '.tmp' in name:
+                    continue
+                stat = os.stat(os.path.join(self.config.poster_cache_dir, name))
+                entries.append((stat.st_mtime_ns, name, stat.st_size))
+            self._entries = OrderedDict((name, size) for _, name, size in sorted(entries))
+            self._total_bytes = sum(self._entries.values())
+            logging.info(f"Poster cache at {self.config.poster_cache_dir} with {len(self._entries)} covers")
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.config.poster_cache_dir, key)
+
+    def _touch(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+
+    def _make_thumbnail(self, payload: bytes):
+        """Thumbnail bytes of a downloaded cover, None when it is not a usable image"""
+        if len(payload) < MIN_POSTER_BYTES:
+            return None
+        if Image is None:
+            return payload
+        try:
+            image = Image.open(io.BytesIO(payload))
+            if image.width < 2 or image.height < 2:
+                return None
+            image = image.convert('RGB')
+            image.thumbnail((self.config.thumbnail_width, self.config.thumbnail_height))
+            output = io.BytesIO()
+            image.save(output, format='JPEG', quality=85)
+            return output.getvalue()
+        except Exception:
+            return None
+
+    def _download(self, url: str):
+        """Thumbnail of the cover at url, None when the URL is dead. Network errors are raised"""
+        try:
+            request = urllib.request.Request(url, headers={'User-Agent': 'book-recommender-system'})
+            with urllib.request.urlopen(request, timeout=self.config.fetch_timeout) as response:
+                return self._make_thumbnail(response.read())
+        except urllib.error.HTTPError as e:
+            if 400 <= e.code < 500:
+                return None
+            raise
+
+    def _store(self, key: str, thumbnail) -> None:
+        """Writes the thumbnail (an empty marker for a dead URL) and evicts down to max_bytes"""
+        payload = thumbnail or b''
+        tmp_path = f"{self._path(key)}.tmp{threading.get_ident()}"
+        with open(tmp_path, 'wb') as poster_file:
+            poster_file.write(payload)
+        os.replace(tmp_path, self._path(key))
+
+        evicted = []
+        with self._lock:
+            self._total_bytes += len(payload) - self._entries.pop(key, 0)
+            self._entries[key] = len(payload)
+            while self._total_bytes > self.config.max_bytes and len(self._entries) > 1:
+                old_key, size = self._entries.popitem(last=False)
+                self._total_bytes -= size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+
+    def _fetch(self, key: str, url: str) -> None:
+        try:
+            self._store(key, self._download(url))
+        except Exception as e:
+            # transient failures are not cached, the cover is tried again on its next request
+            logging.info(f"Could not fetch poster {url}: {e}")
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _submit(self, key: str, url: str):
+        """Future of the download of url, a cover requested twice is fetched once"""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._executor.submit(self._fetch, key, url)
+                self._inflight[key] = future
+            return future
+
+    def _read(self, key: str) -> bytes:
+        try:
+            with open(self._path(key), 'rb') as poster_file:
+                payload = poster_file.read()
+        except OSError:
+            payload = b''
+        return payload or self.placeholder
+
+    def get_posters(self, urls) -> list:
+        """Image bytes of every url in order, the placeholder for missing or dead covers"""
+        try:
+            keys = [self._key(url) if url else None for url in urls]
+            pending = []
+            for key, url in zip(keys, urls):
+                if key is None:
+                    continue
+                if key in self._entries:
+                    self._hits.inc()
+                    self._touch(key)
+                else:
+                    self._misses.inc()
+                    pending.append(self._submit(key, url))
+
+            # every missing cover of the request is downloaded at the same time
+            with get_metrics().timer('poster_fetch_wait_seconds'):
+                for future in pending:
+                    future.result()
+            return [self._read(key) if key else self.placeholder for key in keys]
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def get_poster(self, url: str) -> bytes:
+        return self.get_posters([url])[0]
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,323 @@
+import os
+import sys
+import threading
+import numpy as np
+from recommender.logger.log import logging
+from recommender.config.configuration import AppConfiguration
+from recommender.exception.exception_handler import AppException
+from recommender.serving.model_store import get_model_store
+from recommender.serving.result_cache import ResultCache
+from recommender.utils.array_io import load_array, load_csr_buffers, csr_buffer_paths
+from recommender.utils.artifact_versions import ArtifactVersions
+from recommender.utils.title_search import TitleSearch, title_search_paths
+from recommender.utils.metrics import get_metrics
+
+
+def load_title_index(file_path: str) -> dict:
+    """Reads the title -> row id table into a dict for constant time lookups"""
+    # read with pyarrow directly, pandas is a training dependency
+    import pyarrow.parquet as pq
+    title_index = pq.read_table(file_path, columns=['title', 'row_id'])
+    return dict(zip(title_index.column('title').to_pylist(), title_index.column('row_id').to_pylist()))
+
+
+class Recommendation:
+    def __init__(self, app_config: AppConfiguration = None):
+        try:
+            app_config = app_config or AppConfiguration()
+            self.app_config = app_config
+            self.artifact_versions = ArtifactVersions(app_config.get_artifact_versions_config())
+            self.model_store = get_model_store()
+            self.metrics = get_metrics()
+            self.metrics.configure(app_config.get_metrics_config())
+            self.result_cache = ResultCache(app_config.get_result_cache_config())
+            self._swap_lock = threading.Lock()
+            self._pointer_signature = self.artifact_versions.pointer_signature()
+            # without a published version the artifacts are read from the working directories
+            self._recommendation_config = app_config.get_recommendation_config(self.artifact_versions.current())
+
+            # timers of the request path, bound once
+            self._title_lookup_timer = self.metrics.histogram('title_lookup_seconds')
+            self._title_search_timer = self.metrics.histogram('title_search_seconds')
+            # one per model type, a swapped or rolled back version may use another one
+            self._neighbor_query_timers = {}
+            self._poster_resolution_timer = self.metrics.histogram('poster_resolution_seconds')
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    @property
+    def recommendation_config(self):
+        """
+        Artifact paths of the served version.
+        When the current pointer moves, the first request to notice loads the new version while
+        the others keep being answered from the old one, then every request switches to it.
+        """
+        signature = self.artifact_versions.pointer_signature()
+        if signature != self._pointer_signature and self._swap_lock.acquire(blocking=False):
+            try:
+                if signature != self._pointer_signature:
+                    self._swap_version(signature)
+            finally:
+                self._swap_lock.release()
+        return self._recommendation_config
+
+
+    def _swap_version(self, signature):
+        version = self.artifact_versions.current()
+        try:
+            recommendation_config = self.app_config.get_recommendation_config(version)
+            self.load_artifacts(recommendation_config)
+        except Exception as e:
+            # a broken version is not retried until the pointer moves again
+            logging.error(f"Could not load artifact version {version}, still serving {self._recommendation_config.version}: {e}")
+            self._pointer_signature = signature
+            return
+
+        self._recommendation_config = recommendation_config
+        self._pointer_signature = signature
+        # results are keyed by version, the old ones can no longer be hit
+        self.result_cache.clear()
+        self.metrics.inc('artifact_version_swaps_total')
+        if version is not None:
+            # artifacts of the previous version are released once in-flight requests drop them
+            self.model_store.retain(os.path.join(self.artifact_versions.version_dir(version), ''))
+        logging.info(f"Swapped serving artifacts to version {version}")
+
+
+    def _neighbor_query_timer(self, recommendation_config):
+        """neighbor_query_seconds timer labeled with the model type of the version a request reads"""
+        model_type = recommendation_config.model_type
+        timer = self._neighbor_query_timers.get(model_type)
+        if timer is None:
+            timer = self._neighbor_query_timers[model_type] = self.metrics.histogram('neighbor_query_seconds', model_type=model_type)
+        return timer
+
+
+    def fetch_poster(self,suggestion, recommendation_config=None):
+        try:
+            recommendation_config = recommendation_config or self.recommendation_config
+            with self._poster_resolution_timer.time():
+                poster_urls = self.model_store.load(recommendation_config.poster_urls_file_path, loader=load_array)
+
+                # metadata rows are aligned with the neighbor ids, so this is an array lookup
+                poster_url = poster_urls[suggestion].tolist()
+            return poster_url
+        
+        except Exception as e:
+            raise AppException(e, sys) from e
+        
+
+
+    def get_poster_url(self, book_name):
+        try:
+            recommendation_config = self.recommendation_config
+            with self._title_lookup_timer.time():
+                title_index = self.model_store.load(recommendation_config.title_index_file_path, loader=load_title_index)
+                book_id = title_index[book_name]
+            return self.fetch_poster(book_id, recommendation_config)
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def has_title(self, book_name):
+        try:
+            with self._title_lookup_timer.time():
+                title_index = self.model_store.load(self.recommendation_config.title_index_file_path, loader=load_title_index)
+                return book_name in title_index
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def get_book_titles(self):
+        """All titles known to the model, in matrix row order"""
+        try:
+            return self.model_store.load(self.recommendation_config.book_titles_file_path, loader=load_array)
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def get_title_search(self, recommendation_config=None):
+        """Fuzzy title/author search index built at transformation time"""
+        try:
+            prefix = (recommendation_config or self.recommendation_config).title_search_prefix
+            return self.model_store.load(title_search_paths(prefix)['lengths'], loader=lambda _: TitleSearch(prefix))
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def search_titles(self, query, limit=10):
+        """
+        Titles matching query for the book selector, as {'title', 'author'} dicts.
+        Case, accents and small typos are ignored, the query may be part of the title or the author.
+        """
+        try:
+            recommendation_config = self.recommendation_config
+            with self._title_search_timer.time():
+                title_search = self.get_title_search(recommendation_config)
+                rows = title_search.search(query, limit)
+            book_titles = self.model_store.load(recommendation_config.book_titles_file_path, loader=load_array)
+            return [{'title': str(book_titles[row]), 'author': str(title_search.authors[row])} for row in rows]
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def load_artifacts(self, recommendation_config=None):
+        """Loads every serving artifact into the model store, used to warm up a server or a new version before it takes traffic"""
+        try:
+            recommendation_config = recommendation_config or self.recommendation_config
+            self.model_store.load(recommendation_config.title_index_file_path, loader=load_title_index)
+            self.model_store.load(recommendation_config.poster_urls_file_path, loader=load_array)
+            self.model_store.load(recommendation_config.neighbor_indices_path, loader=load_array)
+            self.model_store.load(recommendation_config.book_titles_file_path, loader=load_array)
+            self.get_neighbor_graph(recommendation_config)
+            self.get_title_search(recommendation_config)
+            logging.info(f"Serving artifacts loaded (version {recommendation_config.version})")
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def max_recommendations(self, recommendation_config=None) -> int:
+        """Most neighbors a title can get: the neighbor table holds top_k of them next to the title itself"""
+        try:
+            recommendation_config = recommendation_config or self.recommendation_config
+            neighbor_indices = self.model_store.load(recommendation_config.neighbor_indices_path, loader=load_array)
+            return neighbor_indices.shape[1] - 1
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def _check_n_recommendations(self, n_recommendations, recommendation_config=None) -> None:
+        """Raises a ValueError for more recommendations than the neighbor table was built with"""
+        max_recommendations = self.max_recommendations(recommendation_config)
+        if n_recommendations > max_recommendations:
+            raise ValueError(f"{n_recommendations} recommendations requested, the neighbor table holds {max_recommendations} per title "
+                             f"(top_k in neighbor_index_config)")
+
+
+    def recommend_book(self,book_name,n_recommendations=5):
+        """
+        The title followed by up to n_recommendations neighbors, with their poster urls.
+        Every model type reads the precomputed neighbor table. An item_cosine title shares readers
+        with fewer titles than top_k at times, its list is then shorter than n_recommendations + 1.
+        """
+        try:
+            # one version for the whole request, even if the pointer moves meanwhile
+            recommendation_config = self.recommendation_config
+            self._check_n_recommendations(n_recommendations, recommendation_config)
+            cache_key = (recommendation_config.version, book_name, n_recommendations)
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                # fresh lists, callers may modify what they get
+                return list(cached[0]), list(cached[1])
+
+            with self._title_lookup_timer.time():
+                title_index = self.model_store.load(recommendation_config.title_index_file_path, loader=load_title_index)
+                book_id = title_index[book_name]
+            book_titles = self.model_store.load(recommendation_config.book_titles_file_path, loader=load_array)
+
+            with self._neighbor_query_timer(recommendation_config).time():
+                # neighbors are precomputed at training time, so this is a row lookup
+                neighbor_indices = self.model_store.load(recommendation_config.neighbor_indices_path, loader=load_array)
+                row = neighbor_indices[book_id, :n_recommendations + 1]
+
+                # the queried book always comes first and is not repeated among its neighbors,
+                # nor among the padding of rows with fewer neighbors than top_k
+                suggestion = np.concatenate(([book_id], row[row != book_id][:n_recommendations]))
+
+            poster_url = self.fetch_poster(suggestion, recommendation_config)
+            books_list = book_titles[suggestion].tolist()
+            self.result_cache.put(cache_key, (tuple(books_list), tuple(poster_url)))
+            return books_list , poster_url   
+        
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def get_neighbor_graph(self, recommendation_config=None):
+        """Sparse titles x titles matrix of the precomputed neighbors, weighted by 1 / (1 + distance)"""
+        try:
+            # the CSR buffers are memory-mapped, the entry follows the data file's changes
+            prefix = (recommendation_config or self.recommendation_config).neighbor_graph_prefix
+            return self.model_store.load(csr_buffer_paths(prefix)['data'], loader=lambda _: load_csr_buffers(prefix))
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def recommend_for_users(self, histories, n_recommendations=5):
+        """
+        Scores many reading histories at once.
+
+        histories: list of title lists, one per user
+        Returns one ranked title list per history, the books of the history itself are excluded.
+        Titles that are not in the catalog are skipped.
+        """
+        try:
+            from scipy.sparse import csr_matrix
+            recommendation_config = self.recommendation_config
+            title_index = self.model_store.load(recommendation_config.title_index_file_path, loader=load_title_index)
+            book_titles = self.model_store.load(recommendation_config.book_titles_file_path, loader=load_array)
+            graph = self.get_neighbor_graph(recommendation_config)
+
+            # users x titles indicator matrix of the histories
+            rows, cols = [], []
+            for user, history in enumerate(histories):
+                for title in history:
+                    book_id = title_index.get(title)
+                    if book_id is None:
+                        logging.warning(f"Skipping unknown title in history: {title}")
+                        continue
+                    rows.append(user)
+                    cols.append(book_id)
+            history_matrix = csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(len(histories), graph.shape[0]))
+            history_matrix.sum_duplicates()
+
+            # one sparse product scores every user against every title, then drop already read books
+            scores = (history_matrix @ graph).tocsr()
+            scores = (scores - scores.multiply(history_matrix > 0)).tocsr()
+            scores.eliminate_zeros()
+
+            recommendations = []
+            for user in range(scores.shape[0]):
+                start, end = scores.indptr[user], scores.indptr[user + 1]
+                ids, values = scores.indices[start:end], scores.data[start:end]
+                top = np.lexsort((ids, -values))[:n_recommendations]
+                recommendations.append(book_titles[ids[top]].tolist())
+            return recommendations
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+    def recommend_books(self, book_names, n_recommendations=5):
+        """
+        Batch version of recommend_book for a list of titles (or one user's reading history).
+
+        Returns a dict with the neighbor list of every known title under 'neighbors' and the
+        aggregated "because you read these" ranking, without the input books, under 'because_you_read'.
+        Like recommend_book, n_recommendations can be at most the top_k of the neighbor table.
+        """
+        try:
+            recommendation_config = self.recommendation_config
+            self._check_n_recommendations(n_recommendations, recommendation_config)
+            title_index = self.model_store.load(recommendation_config.title_index_file_path, loader=load_title_index)
+            book_titles = self.model_store.load(recommendation_config.book_titles_file_path, loader=load_array)
+            neighbor_indices = self.model_store.load(recommendation_config.neighbor_indices_path, loader=load_array)
+
+            known = [title for title in book_names if title in title_index]
+            book_ids = np.array([title_index[title] for title in known], dtype=np.int64)
+
+            # one gather for all titles, the title itself is removed from its own list
+            suggestions = neighbor_indices[book_ids, :n_recommendations + 1]
+            neighbors = {
+                title: book_titles[row[row != book_id][:n_recommendations]].tolist()
+                for title, book_id, row in zip(known, book_ids, suggestions)
+            }
+
+            return {
+                'neighbors': neighbors,
+                'because_you_read': self.recommend_for_users([known], n_recommendations)[0],
+            }
+
+        except Exception as e:
+            raise AppException(e, sys) from e
@@ -0,0 +1,89 @@
+import sys
+import time
+import threading
+from collections import OrderedDict
+from recommender.exception.exception_handler import AppException
+from recommender.utils.metrics import get_metrics
+
+
+class ResultCache:
+    """
+    In-memory LRU cache of recommendation results with a time to live.
+
+    Keys start with the model version, so a newly published version never sees the results
+    of the previous one, and clear() drops those right away when the version is swapped.
+    Past max_entries the least recently used result is evicted, and a result older than
+    ttl_seconds is recomputed. Every operation takes one lock, results are computed outside
+    of it, so two sessions asking for the same new key at once may both compute it.
+    """
+
+    def __init__(self, result_cache_config) -> None:
+        try:
+            self.config = result_cache_config
+            self.enabled = result_cache_config.enabled and result_cache_config.max_entries > 0
+            self._entries = OrderedDict()
+            self._lock = threading.Lock()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.expirations = 0
+
+            metrics = get_metrics()
+            self._hit_counter = metrics.counter('cache_requests_total', cache='result', result='hit')
+            self._miss_counter = metrics.counter('cache_requests_total', cache='result', result='miss')
+            self._eviction_counter = metrics.counter('cache_evictions_total', cache='result', reason='size')
+            self._expiration_counter = metrics.counter('cache_evictions_total', cache='result', reason='ttl')
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def get(self, key):
+        """Cached value of key, None on a miss"""
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                self.expirations += 1
+                self._expiration_counter.inc()
+                entry = None
+            if entry is None:
+                self.misses += 1
+                self._miss_counter.inc()
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self._hit_counter.inc()
+            return entry[1]
+
+    def put(self, key, value) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.config.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.config.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+                self._eviction_counter.inc()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Counters to size the cache with: a low hit ratio with many evictions asks for more entries"""
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'max_entries': self.config.max_entries,
+                'ttl_seconds': self.config.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / requests if requests else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
@@ -0,0 +1,241 @@
+import sys
+import json
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from recommender.logger.log import logging
+from recommender.config.configuration import AppConfiguration
+from recommender.exception.exception_handler import AppException
+from recommender.serving.recommendation import Recommendation
+from recommender.serving.poster_cache import PosterCache, image_content_type
+from recommender.utils.metrics import get_metrics
+
+# metric label of every known path, anything else is counted as 'other'
+ENDPOINTS = ('/health', '/metrics', '/recommend', '/poster', '/search', '/recommend/batch')
+# most titles a single search returns
+MAX_SEARCH_RESULTS = 50
+
+
+class RecommendationRequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON endpoints:
+        GET  /health
+        GET  /metrics   Prometheus text format
+        GET  /recommend?title=...&k=5   k is at most the top_k of the neighbor table
+        GET  /poster?title=...   cached cover thumbnail, a placeholder image when it has none
+        GET  /search?q=...&k=10   titles matching a title or author, for autocomplete
+        POST /recommend/batch   {"titles": [...], "k": 5} or {"histories": [[...], ...], "k": 5},
+                                titles that are not in the catalog are listed under 'unknown_titles'
+    """
+
+    def log_message(self, format, *args):
+        logging.info(f"{self.client_address[0]} - {format % args}")
+
+    def _endpoint(self):
+        path = urlparse(self.path).path
+        return path if path in ENDPOINTS else 'other'
+
+    def send_response(self, code, message=None):
+        # every response is counted per endpoint and status
+        get_metrics().inc('http_requests_total', endpoint=self._endpoint(), status=code)
+        super().send_response(code, message)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_image(self, payload):
+        self.send_response(200)
+        self.send_header('Content-Type', image_content_type(payload))
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('Cache-Control', 'public, max-age=86400')
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _parse_k(self, value, max_k=None, from_query=False):
+        # digits in a query string, an integer in a JSON body: int() would truncate 2.7 and take true as 1
+        if from_query and value.isdigit():
+            k = int(value)
+        elif not from_query and isinstance(value, int) and not isinstance(value, bool):
+            k = value
+        else:
+            raise ValueError("k must be a positive integer")
+        if k < 1:
+            raise ValueError("k must be a positive integer")
+        if max_k is not None and k > max_k:
+            raise ValueError(f"k must be at most {max_k}, the number of neighbors kept per title")
+        return k
+
+    def _parse_titles(self, value, name):
+        if not isinstance(value, list) or not all(isinstance(title, str) for title in value):
+            raise ValueError(f"{name} must be a list of title strings")
+        return value
+
+    def _unknown_titles(self, titles):
+        # reported next to the results, like GET /recommend answers 404 for an unknown title
+        engine = self.server.engine
+        return [title for title in dict.fromkeys(titles) if not engine.has_title(title)]
+
+    def do_GET(self):
+        with get_metrics().timer('http_request_seconds', endpoint=self._endpoint()):
+            self._handle_get()
+
+    def do_POST(self):
+        with get_metrics().timer('http_request_seconds', endpoint=self._endpoint()):
+            self._handle_post()
+
+    def _handle_get(self):
+        url = urlparse(self.path)
+        try:
+            if url.path == '/health':
+                engine = self.server.engine
+                return self._send_json(200, {'status': 'ok', 'version': engine.recommendation_config.version,
+                                             'result_cache': engine.result_cache.stats()})
+
+            if url.path == '/metrics':
+                body = get_metrics().render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+
+            if url.path == '/recommend':
+                params = parse_qs(url.query)
+                title = params.get('title', [None])[0]
+                if not title:
+                    return self._send_json(400, {'error': "missing 'title' query parameter"})
+                engine = self.server.engine
+                k = self._parse_k(params.get('k', ['5'])[0], engine.max_recommendations(), from_query=True)
+                if not engine.has_title(title):
+                    return self._send_json(404, {'error': f"unknown title: {title}"})
+
+                books, posters = engine.recommend_book(title, n_recommendations=k)
+                recommendations = [{'title': book, 'image_url': poster} for book, poster in zip(books[1:], posters[1:])]
+                return self._send_json(200, {'title': title, 'recommendations': recommendations})
+
+            if url.path == '/search':
+                params = parse_qs(url.query)
+                query = params.get('q', [''])[0]
+                k = min(self._parse_k(params.get('k', ['10'])[0], from_query=True), MAX_SEARCH_RESULTS)
+                return self._send_json(200, {'query': query, 'matches': self.server.engine.search_titles(query, k)})
+
+            if url.path == '/poster':
+                title = parse_qs(url.query).get('title', [None])[0]
+                engine = self.server.engine
+                if not title:
+                    return self._send_json(400, {'error': "missing 'title' query parameter"})
+                if not engine.has_title(title):
+                    return self._send_json(404, {'error': f"unknown title: {title}"})
+
+                return self._send_image(self.server.poster_cache.get_poster(engine.get_poster_url(title)))
+
+            return self._send_json(404, {'error': f"unknown endpoint: {url.path}"})
+
+        except ValueError as e:
+            return self._send_json(400, {'error': str(e)})
+        except Exception as e:
+            logging.error(f"Error while serving {self.path}: {e}")
+            return self._send_json(500, {'error': 'internal server error'})
+
+    def _handle_post(self):
+        url = urlparse(self.path)
+        try:
+            if url.path != '/recommend/batch':
+                return self._send_json(404, {'error': f"unknown endpoint: {url.path}"})
+
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(payload, dict):
+                raise ValueError("expected a JSON object")
+            engine = self.server.engine
+
+            if 'histories' in payload:
+                # histories are ranked over the whole neighbor graph, k is not bounded by top_k
+                k = self._parse_k(payload.get('k', 5))
+                histories = payload['histories']
+                if not isinstance(histories, list) or not all(isinstance(history, list) for history in histories):
+                    raise ValueError("'histories' must be a list of lists of title strings")
+                histories = [self._parse_titles(history, 'every history') for history in histories]
+                if len(histories) > self.server.serving_config.max_batch_size:
+                    return self._send_json(413, {'error': 'too many histories in one batch'})
+                return self._send_json(200, {'recommendations': engine.recommend_for_users(histories, k),
+                                             'unknown_titles': self._unknown_titles(title for history in histories for title in history)})
+
+            titles = payload.get('titles')
+            if not titles:
+                return self._send_json(400, {'error': "expected 'titles' or 'histories' in the request body"})
+            titles = self._parse_titles(titles, "'titles'")
+            if len(titles) > self.server.serving_config.max_batch_size:
+                return self._send_json(413, {'error': 'too many titles in one batch'})
+            k = self._parse_k(payload.get('k', 5), engine.max_recommendations())
+            return self._send_json(200, {**engine.recommend_books(titles, k), 'unknown_titles': self._unknown_titles(titles)})
+
+        except (ValueError, TypeError, AttributeError) as e:
+            return self._send_json(400, {'error': f"invalid request body: {e}"})
+        except Exception as e:
+            logging.error(f"Error while serving {self.path}: {e}")
+            return self._send_json(500, {'error': 'internal server error'})
+
+
+class RecommendationServer(HTTPServer):
+    """HTTP server that hands every accepted connection to a fixed-size worker pool"""
+
+    def __init__(self, engine: Recommendation, serving_config, poster_cache: PosterCache = None,
+                 handler_class=RecommendationRequestHandler):
+        self.engine = engine
+        self.serving_config = serving_config
+        self.poster_cache = poster_cache
+        self.executor = ThreadPoolExecutor(max_workers=serving_config.workers, thread_name_prefix='recommender')
+        super().__init__((serving_config.host, serving_config.port), handler_class)
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process_request_worker, request, client_address)
+
+    def _process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+        if self.poster_cache is not None:
+            self.poster_cache.close()
+
+
+def create_server(app_config: AppConfiguration = None) -> RecommendationServer:
+    """Builds the server with all serving artifacts preloaded"""
+    try:
+        app_config = app_config or AppConfiguration()
+        serving_config = app_config.get_serving_config()
+        engine = Recommendation(app_config)
+        engine.load_artifacts()
+        poster_cache = PosterCache(app_config.get_poster_cache_config())
+        return RecommendationServer(engine, serving_config, poster_cache)
+    except Exception as e:
+        raise AppException(e, sys) from e
+
+
+def run_server(app_config: AppConfiguration = None) -> None:
+    server = create_server(app_config)
+    host, port = server.server_address[:2]
+    logging.info(f"Recommendation server listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    run_server()
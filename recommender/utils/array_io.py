@@ -0,0 +1,115 @@
+import os
+import sys
+import numpy as np
+from contextlib import contextmanager
+from recommender.exception.exception_handler import AppException
+
+
+@contextmanager
+def atomic_write(file_path: str):
+    """
+    Yields a temporary path next to file_path and renames it into place once the block succeeds.
+    Readers see either the previous file or the complete new one, never a partial write.
+    The extension is kept so writers that append one (np.savez) still hit the yielded path.
+    """
+    root, ext = os.path.splitext(file_path)
+    tmp_path = f"{root}.tmp{os.getpid()}{ext}"
+    try:
+        yield tmp_path
+        os.replace(tmp_path, file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def save_array(file_path: str, array: np.ndarray) -> None:
+    """
+    Saves array as a raw .npy file.
+    The file is written next to its destination and renamed into place, so processes that
+    have the previous version memory-mapped keep reading intact data.
+    """
+    try:
+        with atomic_write(file_path) as tmp_path:
+            with open(tmp_path, 'wb') as file_obj:
+                np.save(file_obj, np.ascontiguousarray(array))
+    except Exception as e:
+        raise AppException(e, sys) from e
+
+
+def load_array(file_path: str) -> np.ndarray:
+    """Opens a .npy file read-only and memory-mapped, workers share one page-cache copy."""
+    try:
+        return np.load(file_path, mmap_mode='r')
+    except Exception as e:
+        raise AppException(e, sys) from e
+
+
+def csr_buffer_paths(prefix: str) -> dict:
+    """File paths of the buffers of a CSR matrix stored under prefix."""
+    return {part: f"{prefix}_{part}.npy" for part in ('data', 'indices', 'indptr', 'shape')}
+
+
+def save_csr_buffers(prefix: str, matrix) -> None:
+    """Saves a CSR matrix as raw data/indices/indptr/shape arrays that can be memory-mapped."""
+    try:
+        from scipy.sparse import csr_matrix
+        matrix = csr_matrix(matrix)
+        matrix.sum_duplicates()
+        matrix.sort_indices()
+        index_dtype = np.int32 if matrix.nnz < np.iinfo(np.int32).max else np.int64
+        paths = csr_buffer_paths(prefix)
+        save_array(paths['data'], matrix.data)
+        save_array(paths['indices'], matrix.indices.astype(index_dtype, copy=False))
+        save_array(paths['indptr'], matrix.indptr.astype(index_dtype, copy=False))
+        save_array(paths['shape'], np.asarray(matrix.shape, dtype=np.int64))
+    except Exception as e:
+        raise AppException(e, sys) from e
+
+
+def load_csr_buffers(prefix: str):
+    """Rebuilds a CSR matrix on top of memory-mapped buffers without copying them."""
+    try:
+        # scipy is only needed once a sparse artifact is read, not to import the serving path
+        from scipy.sparse import csr_matrix
+        paths = csr_buffer_paths(prefix)
+        shape = tuple(int(n) for n in np.load(paths['shape']))
+        matrix = csr_matrix((load_array(paths['data']), load_array(paths['indices']), load_array(paths['indptr'])),
+                            shape=shape, copy=False)
+        # buffers are saved canonical, this stops scipy from trying to fix them in place
+        matrix.has_sorted_indices = True
+        matrix.has_canonical_format = True
+        return matrix
+    except Exception as e:
+        raise AppException(e, sys) from e
+
+
+def save_rating_matrix(file_path: str, matrix) -> None:
+    """
+    Saves a titles x users rating matrix as .npz with uint8 ratings and int32 indices.
+    Ratings that are not whole numbers in 0..255 are kept as float32 instead.
+    """
+    try:
+        from scipy.sparse import csr_matrix, save_npz
+        matrix = csr_matrix(matrix)
+        data = matrix.data
+        if data.size == 0 or (np.all(data == np.round(data)) and data.min() >= 0 and data.max() <= np.iinfo(np.uint8).max):
+            data = data.astype(np.uint8)
+        else:
+            data = data.astype(np.float32)
+        index_dtype = np.int32 if matrix.nnz < np.iinfo(np.int32).max else np.int64
+        compact = csr_matrix((data, matrix.indices.astype(index_dtype), matrix.indptr.astype(index_dtype)), shape=matrix.shape)
+        with atomic_write(file_path) as tmp_path:
+            save_npz(tmp_path, compact)
+    except Exception as e:
+        raise AppException(e, sys) from e
+
+
+def load_rating_matrix(file_path: str):
+    """Loads a rating matrix as float32 CSR with int32 indices, the dtypes the neighbor engines compute in."""
+    try:
+        from scipy.sparse import csr_matrix, load_npz
+        matrix = load_npz(file_path).tocsr()
+        # older artifacts hold float64 ratings, they load the same way
+        return csr_matrix((matrix.data.astype(np.float32), matrix.indices, matrix.indptr), shape=matrix.shape, copy=False)
+    except Exception as e:
+        raise AppException(e, sys) from e
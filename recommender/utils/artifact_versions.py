@@ -0,0 +1,154 @@
+import os
+import sys
+import json
+import time
+import shutil
+import secrets
+from recommender.logger.log import logging
+from recommender.exception.exception_handler import AppException
+from recommender.utils.array_io import atomic_write
+
+VERSION_MANIFEST_NAME = 'version.json'
+
+
+class ArtifactVersions:
+    """
+    Immutable, versioned snapshots of the serving artifacts.
+
+    Every published version is a directory under versions_dir that mirrors the layout of
+    artifacts_dir and holds a version.json manifest (creation time, source, file hashes and
+    the model type the artifacts were trained with, which serving reads its paths from).
+    The pointer file names the version being served, it is replaced atomically, so
+    promoting a new version or rolling back to an older one is a single rename.
+    """
+
+    def __init__(self, versions_config) -> None:
+        try:
+            self.config = versions_config
+            os.makedirs(self.config.versions_dir, exist_ok=True)
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def version_dir(self, version: str) -> str:
+        return os.path.join(self.config.versions_dir, version)
+
+    def pointer_signature(self):
+        """(mtime, size, inode) of the pointer file, changes whenever the pointer is flipped"""
+        try:
+            stat = os.stat(self.config.pointer_file_path)
+            return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        except FileNotFoundError:
+            return None
+
+    def current(self):
+        """Version the pointer names, None before the first publish"""
+        try:
+            with open(self.config.pointer_file_path) as pointer_file:
+                return pointer_file.read().strip() or None
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def list_versions(self) -> list:
+        """Published versions, oldest first"""
+        try:
+            # unfinished publishes are hidden .staging- directories
+            versions = [name for name in os.listdir(self.config.versions_dir)
+                        if not name.startswith('.')
+                        and os.path.isfile(os.path.join(self.config.versions_dir, name, VERSION_MANIFEST_NAME))]
+            # names only have second resolution, the manifest keeps the exact creation time
+            return sorted(versions, key=lambda name: (self.read_manifest(name)['created_at'], name))
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def read_manifest(self, version: str) -> dict:
+        try:
+            with open(os.path.join(self.version_dir(version), VERSION_MANIFEST_NAME)) as manifest_file:
+                return json.load(manifest_file)
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def set_current(self, version: str) -> None:
+        """Points serving at version, an atomic rename of the pointer file"""
+        try:
+            if version not in self.list_versions():
+                raise ValueError(f"unknown artifact version: {version}")
+            with atomic_write(self.config.pointer_file_path) as tmp_path:
+                with open(tmp_path, 'w') as pointer_file:
+                    pointer_file.write(version)
+            logging.info(f"Serving artifact version {version}")
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def rollback(self, version: str = None) -> str:
+        """Points serving back at version, by default the one published before the current one"""
+        try:
+            if version is None:
+                versions = self.list_versions()
+                current = self.current()
+                older = versions[:versions.index(current)] if current in versions else versions
+                if not older:
+                    raise ValueError(f"no version older than {current} to roll back to")
+                version = older[-1]
+            self.set_current(version)
+            return version
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def publish(self, file_hashes: dict, source: str, model: dict = None) -> str:
+        """
+        Snapshots the artifact files into a new version and makes it current.
+
+        file_hashes maps artifact paths (under artifacts_dir) to their sha256. Files are hard
+        linked, every artifact writer replaces its file instead of writing into it, so a linked
+        snapshot never changes afterwards. Copies are made where links are not supported.
+        model ({'model_type', 'neighbor_engine'}) is recorded in the manifest. When the files
+        and model match the current version nothing is published and it is returned.
+        """
+        try:
+            artifacts_dir = self.config.artifacts_dir
+            files = {os.path.relpath(file_path, artifacts_dir): sha256 for file_path, sha256 in file_hashes.items()}
+            model = model or {}
+            current = self.current()
+            manifest = self.read_manifest(current) if current is not None else None
+            if manifest is not None and manifest['files'] == files and manifest.get('model', {}) == model:
+                logging.info(f"Artifacts unchanged since version {current}, nothing to publish")
+                return current
+
+            version = f"{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(3)}"
+            # assembled under a hidden name, the version only appears once it is complete
+            staging_dir = os.path.join(self.config.versions_dir, f".staging-{version}")
+            for relative_path in files:
+                target_path = os.path.join(staging_dir, relative_path)
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                try:
+                    os.link(os.path.join(artifacts_dir, relative_path), target_path)
+                except OSError:
+                    shutil.copy2(os.path.join(artifacts_dir, relative_path), target_path)
+
+            manifest = {'version': version, 'created_at': time.time(), 'source': source, 'files': files, 'model': model}
+            with open(os.path.join(staging_dir, VERSION_MANIFEST_NAME), 'w') as manifest_file:
+                json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+            os.rename(staging_dir, self.version_dir(version))
+
+            self.set_current(version)
+            self.prune()
+            logging.info(f"Published artifact version {version} ({len(files)} files)")
+            return version
+
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def prune(self) -> None:
+        """Removes the oldest versions past keep_versions, the current one is always kept"""
+        try:
+            current = self.current()
+            versions = self.list_versions()
+            for version in versions[:max(len(versions) - self.config.keep_versions, 0)]:
+                if version != current:
+                    # processes that still have its arrays memory-mapped keep reading them until they swap
+                    shutil.rmtree(self.version_dir(version), ignore_errors=True)
+                    logging.info(f"Removed artifact version {version}")
+        except Exception as e:
+            raise AppException(e, sys) from e
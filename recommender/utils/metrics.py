@@ -0,0 +1,238 @@
+import sys
+import time
+import bisect
+import threading
+from recommender.exception.exception_handler import AppException
+from recommender.utils.array_io import atomic_write
+
+METRIC_PREFIX = 'recommender_'
+# upper bounds in seconds, from a title lookup (~10us) to a full training stage
+DEFAULT_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 60, 300)
+
+
+class _NullTimer:
+    """Shared do-nothing timer handed out while metrics are disabled"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Counter:
+    """One labelled counter, bound once so hot paths skip the label lookup"""
+
+    def __init__(self, registry) -> None:
+        self._registry = registry
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount: float = 1) -> None:
+        if not self._registry.enabled:
+            return
+        with self._lock:
+            self.value += amount
+
+    def reset(self) -> None:
+        with self._lock:
+            self.value = 0
+
+
+class Histogram:
+    """One labelled timer: count, sum and per-bucket counts of the observed durations"""
+
+    def __init__(self, registry) -> None:
+        self._registry = registry
+        self._lock = threading.Lock()
+        self.reset()
+
+    def observe(self, seconds: float) -> None:
+        if not self._registry.enabled:
+            return
+        bucket = bisect.bisect_left(self._registry.buckets, seconds)
+        with self._lock:
+            self.count += 1
+            self.sum += seconds
+            self.bucket_counts[bucket] += 1
+
+    def time(self):
+        """Context manager that observes the wall time of its block"""
+        if not self._registry.enabled:
+            return _NULL_TIMER
+        return _Timer(self)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.count = 0
+            self.sum = 0.0
+            # one count per bucket plus +Inf
+            self.bucket_counts = [0] * (len(self._registry.buckets) + 1)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    items = key + extra
+    if not items:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in items) + '}'
+
+
+class MetricsRegistry:
+    """
+    In-process counters and timers.
+
+    Metrics are keyed by name and labels. counter() and histogram() return the metric for
+    a label set, hot paths keep it and only pay for a lock and an addition per update.
+    inc(), observe() and timer() look the metric up on every call, for code that runs rarely.
+    Timers are rendered as Prometheus histograms, and counters named cache_requests_total
+    with result="hit"/"miss" labels yield a cache_hit_ratio gauge per cache. While disabled,
+    updates return right away and timers are a shared no-op context manager.
+    """
+
+    def __init__(self, enabled: bool = True, buckets: tuple = DEFAULT_BUCKETS) -> None:
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def configure(self, metrics_config) -> None:
+        self.enabled = metrics_config.enabled
+
+    def counter(self, name: str, **labels) -> Counter:
+        key = (name, _label_key(labels))
+        with self._lock:
+            if key not in self._counters:
+                self._counters[key] = Counter(self)
+            return self._counters[key]
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        key = (name, _label_key(labels))
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = Histogram(self)
+            return self._histograms[key]
+
+    def inc(self, name: str, amount: float = 1, **labels) -> None:
+        if self.enabled:
+            self.counter(name, **labels).inc(amount)
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        if self.enabled:
+            self.histogram(name, **labels).observe(seconds)
+
+    def timer(self, name: str, **labels):
+        """Context manager that observes the wall time of its block under name"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return self.histogram(name, **labels).time()
+
+    def _items(self):
+        with self._lock:
+            return sorted(self._counters.items()), sorted(self._histograms.items())
+
+    def cache_hit_ratios(self) -> dict:
+        counters, _ = self._items()
+        requests = {}
+        for (name, key), counter in counters:
+            if name != 'cache_requests_total':
+                continue
+            labels = dict(key)
+            hits_total = requests.setdefault(labels.get('cache'), [0, 0])
+            hits_total[0] += counter.value if labels.get('result') == 'hit' else 0
+            hits_total[1] += counter.value
+        return {cache: hits / total for cache, (hits, total) in requests.items() if total}
+
+    def snapshot(self) -> dict:
+        """Plain dict copy of every metric, for callers in the same process"""
+        counters, histograms = self._items()
+        return {
+            'counters': [{'name': name, 'labels': dict(key), 'value': counter.value} for (name, key), counter in counters],
+            'timers': [{'name': name, 'labels': dict(key), 'count': histogram.count, 'sum_seconds': histogram.sum,
+                        'mean_seconds': histogram.sum / histogram.count if histogram.count else None}
+                       for (name, key), histogram in histograms],
+            'cache_hit_ratio': self.cache_hit_ratios(),
+        }
+
+    def render_prometheus(self) -> str:
+        """Every metric in the Prometheus text exposition format"""
+        counters, histograms = self._items()
+        lines = []
+        for name, group in _group(counters):
+            lines.append(f"# TYPE {METRIC_PREFIX}{name} counter")
+            lines.extend(f"{METRIC_PREFIX}{name}{_format_labels(key)} {counter.value}" for key, counter in group)
+
+        for name, group in _group(histograms):
+            lines.append(f"# TYPE {METRIC_PREFIX}{name} histogram")
+            for key, histogram in group:
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + ('+Inf',), histogram.bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f"{METRIC_PREFIX}{name}_bucket{_format_labels(key, (('le', bound),))} {cumulative}")
+                lines.append(f"{METRIC_PREFIX}{name}_sum{_format_labels(key)} {histogram.sum}")
+                lines.append(f"{METRIC_PREFIX}{name}_count{_format_labels(key)} {histogram.count}")
+
+        ratios = self.cache_hit_ratios()
+        if ratios:
+            lines.append(f"# TYPE {METRIC_PREFIX}cache_hit_ratio gauge")
+            lines.extend(f"{METRIC_PREFIX}cache_hit_ratio{_format_labels((('cache', cache),))} {ratio}"
+                         for cache, ratio in sorted(ratios.items()))
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, file_path: str) -> None:
+        """Writes the Prometheus text to file_path, e.g. for a node exporter textfile collector"""
+        try:
+            with atomic_write(file_path) as tmp_path:
+                with open(tmp_path, 'w') as metrics_file:
+                    metrics_file.write(self.render_prometheus())
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def reset(self) -> None:
+        """Zeroes every metric, handles bound by callers stay valid"""
+        counters, histograms = self._items()
+        for _, metric in counters + histograms:
+            metric.reset()
+
+
+def _group(items):
+    """Groups sorted ((name, key), metric) items by name"""
+    groups = {}
+    for (name, key), metric in items:
+        groups.setdefault(name, []).append((key, metric))
+    return groups.items()
+
+
+# Shared registry of this process
+metrics = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    return metrics
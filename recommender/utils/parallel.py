@@ -0,0 +1,50 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from threadpoolctl import threadpool_limits
+from recommender.exception.exception_handler import AppException
+
+
+# objects shared by every block of a worker process, set once by the pool initializer
+_shared = {}
+
+
+def _init_worker(shared: dict) -> None:
+    _shared.clear()
+    _shared.update(shared)
+    # one BLAS thread per process, the pool already uses every requested core
+    threadpool_limits(limits=1)
+
+
+def _run_block(args):
+    block_fn, start, end = args
+    return block_fn(_shared, start, end)
+
+
+def resolve_workers(workers: int) -> int:
+    """0 (or a negative count) means one worker per cpu core"""
+    return workers if workers > 0 else (os.cpu_count() or 1)
+
+
+def map_row_blocks(block_fn, n_rows: int, block_size: int, workers: int = 1, shared: dict = None) -> list:
+    """
+    Runs block_fn(shared, start, end) over consecutive row blocks and returns the results in row order.
+
+    With more than one worker the blocks are spread over a process pool. shared is sent to
+    every worker once, block_fn must be a module level function so it can be pickled.
+    A worker computes one block at a time and only the block results are kept, so peak
+    memory is bounded by block_size instead of the number of rows.
+    """
+    try:
+        shared = shared or {}
+        bounds = [(start, min(start + block_size, n_rows)) for start in range(0, n_rows, block_size)]
+        workers = min(resolve_workers(workers), len(bounds))
+
+        if workers <= 1:
+            return [block_fn(shared, start, end) for start, end in bounds]
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shared,)) as pool:
+            return list(pool.map(_run_block, [(block_fn, start, end) for start, end in bounds]))
+
+    except Exception as e:
+        raise AppException(e, sys) from e
@@ -0,0 +1,100 @@
+import os
+import sys
+import json
+import hashlib
+from recommender.logger.log import logging
+from recommender.exception.exception_handler import AppException
+from recommender.utils.array_io import atomic_write
+
+
+def hash_file(file_path: str, chunk_size: int = 1 << 20) -> str:
+    """sha256 of the file content, read in chunks"""
+    try:
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as file_obj:
+            for block in iter(lambda: file_obj.read(chunk_size), b''):
+                digest.update(block)
+        return digest.hexdigest()
+    except Exception as e:
+        raise AppException(e, sys) from e
+
+
+class StageManifest:
+    """
+    JSON record of the last successful run of every pipeline stage.
+
+    A stage's fingerprint is the sha256 of its config sections and of the content of its
+    input files. The stage is fresh when the fingerprint matches the recorded one and its
+    outputs are still on disk unchanged. File hashes are cached by (mtime, size), so an
+    unchanged file is only read once.
+    """
+
+    def __init__(self, manifest_path: str) -> None:
+        try:
+            self.manifest_path = manifest_path
+            self.manifest = {'stages': {}, 'files': {}}
+            if os.path.exists(manifest_path):
+                with open(manifest_path) as manifest_file:
+                    self.manifest = json.load(manifest_file)
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def file_hash(self, file_path: str):
+        """Content hash of file_path, None when the file does not exist"""
+        try:
+            if not os.path.exists(file_path):
+                return None
+            stat = os.stat(file_path)
+            cached = self.manifest['files'].get(file_path)
+            if cached and cached['mtime_ns'] == stat.st_mtime_ns and cached['size'] == stat.st_size:
+                return cached['sha256']
+
+            sha256 = hash_file(file_path)
+            self.manifest['files'][file_path] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': sha256}
+            return sha256
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def fingerprint(self, config: dict, inputs: list) -> str:
+        try:
+            payload = {'config': config, 'inputs': {file_path: self.file_hash(file_path) for file_path in inputs}}
+            return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def is_fresh(self, stage: str, fingerprint: str, outputs: list) -> bool:
+        try:
+            record = self.manifest['stages'].get(stage)
+            if record is None or record['fingerprint'] != fingerprint:
+                return False
+            # outputs deleted or edited since the run make the stage stale as well
+            return all(self.file_hash(file_path) == sha256 for file_path, sha256 in record['outputs'].items())
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def record(self, stage: str, fingerprint: str, outputs: list) -> None:
+        try:
+            self.manifest['stages'][stage] = {
+                'fingerprint': fingerprint,
+                'outputs': {file_path: self.file_hash(file_path) for file_path in outputs},
+            }
+            self.save()
+            logging.info(f"Recorded {stage} stage in {self.manifest_path}")
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def invalidate(self, stage: str) -> None:
+        try:
+            if self.manifest['stages'].pop(stage, None) is not None:
+                self.save()
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def save(self) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.manifest_path) or '.', exist_ok=True)
+            with atomic_write(self.manifest_path) as tmp_path:
+                with open(tmp_path, 'w') as manifest_file:
+                    json.dump(self.manifest, manifest_file, indent=2, sort_keys=True)
+        except Exception as e:
+            raise AppException(e, sys) from e
@@ -0,0 +1,157 @@
+import re
+import sys
+import html
+import unicodedata
+import numpy as np
+from recommender.exception.exception_handler import AppException
+from recommender.utils.array_io import save_array, load_array
+
+# a candidate must share at least this share of the query's trigrams
+MIN_SIMILARITY = 0.3
+# row ids a query may read, rare trigrams are used first and frequent ones ("the", "ing") dropped past it
+MAX_POSTINGS = 10000
+MAX_QUERY_LENGTH = 200
+# upper bound of the code points, appended to a prefix to find the end of its range
+_MAX_CHAR = '\U0010ffff'
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+
+def normalize_text(text) -> str:
+    """Lowercase ascii words of text: accents are stripped, and punctuation and html entities become a space"""
+    text = unicodedata.normalize('NFKD', html.unescape(str(text)))
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(_NON_ALNUM.sub(' ', text.casefold()).split())
+
+
+def trigrams(normalized: str, open_ended: bool = False) -> set:
+    """
+    Trigrams of every word padded with two leading and one trailing space, like pg_trgm.
+    With open_ended the last word has no trailing space, so a word still being typed matches its completions.
+    """
+    words = normalized.split()
+    grams = set()
+    for position, word in enumerate(words):
+        padded = f"  {word}" if open_ended and position == len(words) - 1 else f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def title_search_paths(prefix: str) -> dict:
+    """File paths of the arrays of a title search index stored under prefix."""
+    return {part: f"{prefix}_{part}.npy" for part in ('keys', 'order', 'authors', 'trigrams', 'indptr', 'postings', 'lengths')}
+
+
+def save_title_search(prefix: str, titles, authors) -> None:
+    """
+    Builds the search index over titles and their authors, rows aligned with the title row ids.
+
+    keys/order: normalized titles sorted, with their row ids, for prefix lookups by binary search
+    trigrams/indptr/postings: sorted trigram vocabulary and the row ids containing each trigram
+    lengths: trigram count of every row, authors: author of every row for display
+    """
+    try:
+        # missing authors come as None or NaN
+        authors = [author if isinstance(author, str) else '' for author in authors]
+        keys = [normalize_text(title) for title in titles]
+        postings = {}
+        lengths = np.zeros(len(keys), dtype=np.int32)
+        for row_id, (key, author) in enumerate(zip(keys, authors)):
+            grams = trigrams(key) | trigrams(normalize_text(author))
+            lengths[row_id] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(row_id)
+
+        vocabulary = sorted(postings)
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(postings[gram]) for gram in vocabulary])
+        flat = np.fromiter((row_id for gram in vocabulary for row_id in postings[gram]), dtype=np.int32, count=int(indptr[-1]))
+
+        keys = np.asarray(keys, dtype=str)
+        order = np.argsort(keys, kind='stable').astype(np.int32)
+        paths = title_search_paths(prefix)
+        save_array(paths['keys'], keys[order])
+        save_array(paths['order'], order)
+        save_array(paths['authors'], np.asarray(authors, dtype=str))
+        save_array(paths['trigrams'], np.asarray(vocabulary, dtype='<U3'))
+        save_array(paths['indptr'], indptr)
+        save_array(paths['postings'], flat)
+        # written last, the serving model store keys the index on this file
+        save_array(paths['lengths'], lengths)
+    except Exception as e:
+        raise AppException(e, sys) from e
+
+
+class TitleSearch:
+    """
+    Case, accent and typo tolerant lookup of titles by title or author.
+
+    Titles starting with the query come first, in alphabetical order, found by binary search
+    over the sorted normalized titles. The rest are ranked by the share of the query's trigrams
+    they contain, shorter titles first on ties. The arrays are memory-mapped like the other
+    serving artifacts.
+    """
+
+    def __init__(self, prefix: str) -> None:
+        try:
+            paths = title_search_paths(prefix)
+            self.keys = load_array(paths['keys'])
+            self.order = load_array(paths['order'])
+            self.authors = load_array(paths['authors'])
+            self.trigrams = load_array(paths['trigrams'])
+            self.indptr = load_array(paths['indptr'])
+            self.postings = load_array(paths['postings'])
+            self.lengths = load_array(paths['lengths'])
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def _prefix_matches(self, query: str, limit: int) -> np.ndarray:
+        start = np.searchsorted(self.keys, query, side='left')
+        end = np.searchsorted(self.keys, query + _MAX_CHAR, side='left')
+        return self.order[start:min(end, start + limit)]
+
+    def _trigram_matches(self, query: str, limit: int) -> np.ndarray:
+        grams = sorted(trigrams(query, open_ended=True))
+        positions = np.searchsorted(self.trigrams, grams)
+        found = np.array([position for gram, position in zip(grams, positions)
+                          if position < len(self.trigrams) and self.trigrams[position] == gram], dtype=np.int64)
+        if not len(found):
+            return np.empty(0, dtype=np.int64)
+
+        # the rarest trigrams tell titles apart best and are the cheapest to read
+        sizes = self.indptr[found + 1] - self.indptr[found]
+        rarest = np.argsort(sizes, kind='stable')
+        n_used = max(1, int(np.searchsorted(np.cumsum(sizes[rarest]), MAX_POSTINGS, side='right')))
+        used = found[rarest[:n_used]]
+        # trigrams missing from the vocabulary (typos) still count against the similarity
+        n_grams = len(used) + len(grams) - len(found)
+
+        hits = np.concatenate([self.postings[self.indptr[position]:self.indptr[position + 1]] for position in used])
+        # sorting the hits stays proportional to them, a bincount would touch every row of the catalog
+        rows, counts = np.unique(hits, return_counts=True)
+        matched = counts >= max(1, int(np.ceil(MIN_SIMILARITY * n_grams)))
+        candidates, counts = rows[matched].astype(np.int64), counts[matched].astype(np.int64)
+
+        # most shared trigrams, then fewest trigrams, then row id, packed in one int64 so
+        # only the top limit candidates are sorted: 11 bits of missed trigrams, 16 of length, 36 of row id
+        lengths = np.minimum(self.lengths[candidates], 0xffff).astype(np.int64)
+        rank_key = ((n_grams - counts) << 52) | (lengths << 36) | candidates
+        if len(rank_key) > limit:
+            rank_key = rank_key[np.argpartition(rank_key, limit)[:limit]]
+        rank_key.sort()
+        return rank_key & 0xfffffffff
+
+    def search(self, query, limit: int = 10) -> list:
+        """Row ids of the best matches of query, at most limit of them"""
+        try:
+            # longer queries would not fit the rank key and never come from a search box
+            query = normalize_text(query)[:MAX_QUERY_LENGTH]
+            if not query or limit <= 0:
+                return []
+            rows = self._prefix_matches(query, limit).tolist()
+            if len(rows) < limit:
+                seen = set(rows)
+                candidates = self._trigram_matches(query, limit + len(rows))
+                rows.extend(row for row in candidates.tolist() if row not in seen)
+            return rows[:limit]
+        except Exception as e:
+            raise AppException(e, sys) from e
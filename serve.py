@@ -0,0 +1,3 @@
+from recommender.serving.server import run_server
+
+run_server()
\ No newline at end of file
@@ -0,0 +1,161 @@
+"""
+Publishing, the current pointer, rollback, pruning and the hot swap of a live Recommendation.
+
+The builds for the hot swap run this file as a script in their own working directory with
+test_incremental_training's helpers, the pipeline reads its config and writes its artifacts
+relative to the directory the process starts in.
+"""
+import os
+import sys
+import hashlib
+import subprocess
+
+import numpy as np
+import pytest
+
+from recommender.entity.config_entity import ArtifactVersionsConfig
+from recommender.exception.exception_handler import AppException
+from recommender.utils.artifact_versions import ArtifactVersions
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(TESTS_DIR)
+
+
+def make_versions(artifacts_dir, keep_versions=3) -> ArtifactVersions:
+    versions_dir = os.path.join(artifacts_dir, 'versions')
+    return ArtifactVersions(ArtifactVersionsConfig(artifacts_dir=str(artifacts_dir), versions_dir=versions_dir,
+                                                   pointer_file_path=os.path.join(versions_dir, 'CURRENT'),
+                                                   keep_versions=keep_versions))
+
+
+def write_artifact(artifacts_dir, name: str, payload: bytes) -> dict:
+    """Replaces the artifact file like the pipeline writers do and returns its file hashes entry"""
+    file_path = os.path.join(artifacts_dir, name)
+    tmp_path = file_path + '.tmp'
+    with open(tmp_path, 'wb') as artifact_file:
+        artifact_file.write(payload)
+    os.replace(tmp_path, file_path)
+    return {file_path: hashlib.sha256(payload).hexdigest()}
+
+
+def read_artifact(artifact_versions, version, name: str) -> bytes:
+    with open(os.path.join(artifact_versions.version_dir(version), name), 'rb') as artifact_file:
+        return artifact_file.read()
+
+
+def test_publish_rollback_and_prune(tmp_path):
+    artifact_versions = make_versions(tmp_path, keep_versions=3)
+    assert artifact_versions.current() is None
+    assert artifact_versions.pointer_signature() is None
+
+    first = artifact_versions.publish(write_artifact(tmp_path, 'table.npy', b'first'), 'training', {'model_type': 'knn'})
+    assert artifact_versions.current() == first
+    signature = artifact_versions.pointer_signature()
+
+    # unchanged files and model publish nothing, a changed model does
+    assert artifact_versions.publish(write_artifact(tmp_path, 'table.npy', b'first'), 'training', {'model_type': 'knn'}) == first
+    assert artifact_versions.pointer_signature() == signature
+
+    second = artifact_versions.publish(write_artifact(tmp_path, 'table.npy', b'first'), 'training', {'model_type': 'item_cosine'})
+    third = artifact_versions.publish(write_artifact(tmp_path, 'table.npy', b'third'), 'incremental', {'model_type': 'item_cosine'})
+    # published within the same second, the order is still the publish order
+    assert artifact_versions.list_versions() == [first, second, third]
+    assert artifact_versions.current() == third
+    assert artifact_versions.pointer_signature() != signature
+
+    # a snapshot keeps its bytes after the working artifact is replaced
+    assert read_artifact(artifact_versions, first, 'table.npy') == b'first'
+    assert read_artifact(artifact_versions, third, 'table.npy') == b'third'
+    assert artifact_versions.read_manifest(second)['model'] == {'model_type': 'item_cosine'}
+    assert artifact_versions.read_manifest(third)['source'] == 'incremental'
+
+    assert artifact_versions.rollback() == second
+    assert artifact_versions.rollback() == first
+    assert artifact_versions.current() == first
+    with pytest.raises(AppException, match='no version older than'):
+        artifact_versions.rollback()
+    with pytest.raises(AppException, match='unknown artifact version'):
+        artifact_versions.rollback('20000101-000000-000000')
+    assert artifact_versions.rollback(third) == third
+
+    # the oldest versions past keep_versions go, the one being served stays
+    artifact_versions.rollback(first)
+    fourth = artifact_versions.publish(write_artifact(tmp_path, 'table.npy', b'fourth'), 'training', {'model_type': 'knn'})
+    assert artifact_versions.list_versions() == [second, third, fourth]
+    fifth = artifact_versions.publish(write_artifact(tmp_path, 'table.npy', b'fifth'), 'training', {'model_type': 'knn'})
+    assert artifact_versions.list_versions() == [third, fourth, fifth]
+    assert not os.path.exists(artifact_versions.version_dir(first))
+
+    artifact_versions.rollback(third)
+    make_versions(tmp_path, keep_versions=1).prune()
+    assert artifact_versions.list_versions() == [third, fifth]
+
+
+def build_versions() -> None:
+    """A knn build, then an item_cosine build of the same ratings, each published as a version"""
+    import test_incremental_training as builds
+    sys.path[:0] = [builds.BENCHMARKS_DIR]
+    from synthetic_data import generate_dataset
+
+    generate_dataset(builds.N_RATINGS, builds.ZIP_FILE_PATH, builds.SEED)
+    # the zip is already local, the Kaggle client only needs credentials to be importable
+    os.environ.setdefault('KAGGLE_USERNAME', 'test')
+    os.environ.setdefault('KAGGLE_KEY', 'test')
+
+    from recommender.config.configuration import AppConfiguration
+    from recommender.pipelines.training_pipeline import TrainingPipeline
+    for model_type in ('knn', 'item_cosine'):
+        TrainingPipeline(AppConfiguration(builds.write_config(model_type, 'brute'))).start_training_pipeline()
+
+
+def expected_neighbors(artifact_versions, version, title, n_recommendations=5) -> list:
+    """The title and its nearest titles, read straight from the version's neighbor table"""
+    version_dir = artifact_versions.version_dir(version)
+    titles = np.load(os.path.join(version_dir, 'dataset', 'transformed_data', 'book_titles.npy'), allow_pickle=True)
+    indices = np.load(os.path.join(version_dir, 'neighbor_index', 'neighbor_indices.npy'))
+    book_id = int(np.flatnonzero(titles == title)[0])
+    row = indices[book_id, :n_recommendations + 1]
+    return [title] + [str(titles[neighbor]) for neighbor in row[row != book_id][:n_recommendations]]
+
+
+def test_live_recommendation_follows_rollback_across_model_types(tmp_path, monkeypatch):
+    process = subprocess.run([sys.executable, os.path.abspath(__file__)], cwd=tmp_path, capture_output=True, text=True,
+                             env={**os.environ, 'PYTHONPATH': REPO_ROOT})
+    assert process.returncode == 0, f"build failed:\n{process.stderr[-3000:]}"
+
+    monkeypatch.chdir(tmp_path)
+    from recommender.config.configuration import AppConfiguration
+    from recommender.serving.recommendation import Recommendation
+    app_config = AppConfiguration(os.path.join('config', 'config.yaml'))
+    artifact_versions = ArtifactVersions(app_config.get_artifact_versions_config())
+    knn_version, cosine_version = artifact_versions.list_versions()
+    assert artifact_versions.read_manifest(knn_version)['model']['model_type'] == 'knn'
+    assert artifact_versions.read_manifest(cosine_version)['model']['model_type'] == 'item_cosine'
+
+    engine = Recommendation(app_config)
+    assert engine.recommendation_config.version == cosine_version
+    # a title the two models give different neighbors, so the served version shows in the answer
+    title = next(title for title in engine.get_book_titles()
+                 if expected_neighbors(artifact_versions, knn_version, title) != expected_neighbors(artifact_versions, cosine_version, title))
+
+    books, _ = engine.recommend_book(title)
+    assert list(books) == expected_neighbors(artifact_versions, cosine_version, title)
+    assert engine.result_cache.stats()['entries'] == 1
+
+    # the live config still says item_cosine, the rolled back version is read as the knn version it is
+    assert artifact_versions.rollback() == knn_version
+    assert engine.recommendation_config.version == knn_version
+    assert engine.recommendation_config.model_type == 'knn'
+    assert engine.result_cache.stats()['entries'] == 0
+    books, _ = engine.recommend_book(title)
+    assert list(books) == expected_neighbors(artifact_versions, knn_version, title)
+
+    artifact_versions.rollback(cosine_version)
+    assert engine.recommendation_config.model_type == 'item_cosine'
+    assert engine.result_cache.stats()['entries'] == 0
+    books, _ = engine.recommend_book(title)
+    assert list(books) == expected_neighbors(artifact_versions, cosine_version, title)
+
+
+if __name__ == '__main__':
+    build_versions()
@@ -0,0 +1,22 @@
+import os
+import sys
+import glob
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+from check_import_time import REPO_ROOT, SERVING_MODULES, DEFAULT_BUDGET_SECONDS, measure_imports, leaked_modules
+
+# the entry modules of serve.py and the app, plus every other module of the serving package
+SERVING_PACKAGE_MODULES = tuple(dict.fromkeys(SERVING_MODULES + tuple(sorted(
+    f"recommender.serving.{os.path.splitext(os.path.basename(path))[0]}"
+    for path in glob.glob(os.path.join(REPO_ROOT, 'recommender', 'serving', '*.py'))))))
+
+
+def test_serving_import_leaves_out_training_modules():
+    leaked = leaked_modules(measure_imports(SERVING_PACKAGE_MODULES)['modules'])
+    assert not leaked, f"training-only modules imported on the serving path: {leaked}"
+
+
+def test_serving_import_time_within_budget():
+    # the fastest of a few cold interpreters, a single run is at the mercy of the machine's load
+    seconds = min(measure_imports(SERVING_PACKAGE_MODULES)['seconds'] for _ in range(3))
+    assert seconds <= DEFAULT_BUDGET_SECONDS, f"serving import took {seconds:.3f}s, budget {DEFAULT_BUDGET_SECONDS:.3f}s"
@@ -0,0 +1,166 @@
+"""
+Incremental training against a full rebuild.
+
+Every build runs this file as a script in its own working directory, the pipeline reads its
+config and writes its artifacts relative to the directory the process starts in.
+"""
+import os
+import sys
+import zipfile
+import subprocess
+
+import numpy as np
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS_DIR = os.path.join(REPO_ROOT, 'benchmarks')
+
+N_RATINGS = 60_000
+SEED = 0
+# low enough for the small synthetic dump to keep a few hundred titles
+USER_RATINGS_THRESHOLD = 20
+BOOK_RATINGS_THRESHOLD = 6
+ZIP_FILE_PATH = os.path.join('artifacts', 'dataset', 'raw_data', 'bookrecommendation.zip')
+RATINGS_FILE_NAME = 'BX-Book-Ratings.csv'
+
+
+def write_config(model_type: str, neighbor_engine: str) -> str:
+    import yaml
+    with open(os.path.join(REPO_ROOT, 'config', 'config.yaml')) as config_file:
+        config = yaml.safe_load(config_file)
+    config['data_validation_config'].update(user_ratings_threshold=USER_RATINGS_THRESHOLD,
+                                            book_ratings_threshold=BOOK_RATINGS_THRESHOLD)
+    config['model_trainer_config'].update(model_type=model_type, neighbor_engine=neighbor_engine)
+    config['model_evaluation_config']['enabled'] = False
+    os.makedirs('config', exist_ok=True)
+    with open(os.path.join('config', 'config.yaml'), 'w') as config_file:
+        yaml.safe_dump(config, config_file, sort_keys=False)
+    return os.path.abspath(os.path.join('config', 'config.yaml'))
+
+
+def write_delta(file_path: str) -> None:
+    """
+    New ratings that exercise every incremental path: known users rating known titles, users
+    and titles just below a threshold crossing it, and a user that was never seen before.
+    """
+    import pandas as pd
+    rng = np.random.default_rng(SEED + 1)
+    clean_dir = os.path.join('artifacts', 'dataset', 'clean_data')
+    clean = pd.read_parquet(os.path.join(clean_dir, 'clean_data.parquet'))
+    user_counts = pd.read_parquet(os.path.join(clean_dir, 'user_counts.parquet')).set_index('user_id')['count']
+    title_counts = pd.read_parquet(os.path.join(clean_dir, 'title_counts.parquet')).set_index('title')['count']
+    books = pd.read_csv(os.path.join('artifacts', 'dataset', 'ingested_data', 'BX-Books.csv'), sep=';',
+                        usecols=['ISBN', 'Book-Title'], dtype=str, encoding='latin-1')
+    kept_users, kept_isbns = clean['user_id'].unique(), clean['ISBN'].unique()
+
+    parts = [pd.DataFrame({'User-ID': rng.choice(kept_users, 300), 'ISBN': rng.choice(kept_isbns, 300),
+                           'Book-Rating': rng.integers(0, 11, 300)})]
+
+    # users a few ratings short of the user threshold cross it
+    near_users = user_counts[(user_counts <= USER_RATINGS_THRESHOLD) & (user_counts > USER_RATINGS_THRESHOLD - 5)].index[:3]
+    for user in near_users:
+        n = USER_RATINGS_THRESHOLD + 1 - user_counts[user]
+        parts.append(pd.DataFrame({'User-ID': user, 'ISBN': rng.choice(kept_isbns, n, replace=False), 'Book-Rating': 7}))
+
+    # titles a few ratings from kept users short of the book threshold cross it
+    near_titles = title_counts[(title_counts < BOOK_RATINGS_THRESHOLD) & (title_counts >= BOOK_RATINGS_THRESHOLD - 2)].index[:3]
+    for title in near_titles:
+        isbn = books.loc[books['Book-Title'] == title, 'ISBN'].iloc[0]
+        raters = rng.choice(kept_users, BOOK_RATINGS_THRESHOLD, replace=False)
+        parts.append(pd.DataFrame({'User-ID': raters, 'ISBN': isbn, 'Book-Rating': 8}))
+
+    # a user the base ratings never saw
+    new_user = int(user_counts.index.max()) + 1
+    parts.append(pd.DataFrame({'User-ID': new_user, 'ISBN': rng.choice(kept_isbns, USER_RATINGS_THRESHOLD + 5, replace=False),
+                               'Book-Rating': rng.integers(1, 11, USER_RATINGS_THRESHOLD + 5)}))
+
+    pd.concat(parts, ignore_index=True).to_csv(file_path, sep=';', index=False, encoding='latin-1')
+
+
+def append_to_ratings(delta_file_path: str) -> None:
+    """Rewrites the raw zip with the delta ratings appended to its ratings file"""
+    with zipfile.ZipFile(ZIP_FILE_PATH) as zip_file:
+        files = {name: zip_file.read(name) for name in zip_file.namelist()}
+    with open(delta_file_path, 'rb') as delta_file:
+        delta_rows = delta_file.read().split(b'\n', 1)[1]
+    files[RATINGS_FILE_NAME] = files[RATINGS_FILE_NAME].rstrip(b'\n') + b'\n' + delta_rows
+    with zipfile.ZipFile(ZIP_FILE_PATH, 'w', compression=zipfile.ZIP_STORED) as zip_file:
+        for name, payload in files.items():
+            zip_file.writestr(name, payload)
+
+
+def build(mode: str, model_type: str, neighbor_engine: str, delta_file_path: str) -> None:
+    """
+    incremental: full build of the base ratings, then the delta written to delta_file_path is folded in.
+    rebuild: full build of the base ratings with the delta at delta_file_path appended.
+    """
+    sys.path[:0] = [REPO_ROOT, BENCHMARKS_DIR]
+    from synthetic_data import generate_dataset
+
+    config_file_path = write_config(model_type, neighbor_engine)
+    generate_dataset(N_RATINGS, ZIP_FILE_PATH, SEED)
+    if mode == 'rebuild':
+        append_to_ratings(delta_file_path)
+    # the zip is already local, the Kaggle client only needs credentials to be importable
+    os.environ.setdefault('KAGGLE_USERNAME', 'test')
+    os.environ.setdefault('KAGGLE_KEY', 'test')
+
+    from recommender.config.configuration import AppConfiguration
+    from recommender.pipelines.training_pipeline import TrainingPipeline
+    app_config = AppConfiguration(config_file_path)
+    TrainingPipeline(app_config).start_training_pipeline()
+    if mode == 'incremental':
+        write_delta(delta_file_path)
+        TrainingPipeline(app_config).start_incremental_pipeline(delta_file_path)
+
+
+def run_build(work_dir, mode: str, model_type: str, neighbor_engine: str, delta_file_path) -> dict:
+    os.makedirs(work_dir)
+    process = subprocess.run([sys.executable, os.path.abspath(__file__), mode, model_type, neighbor_engine, str(delta_file_path)],
+                             cwd=work_dir, capture_output=True, text=True)
+    assert process.returncode == 0, f"{mode} build failed:\n{process.stderr[-3000:]}"
+    return load_artifacts(work_dir)
+
+
+def load_artifacts(work_dir) -> dict:
+    from scipy.sparse import load_npz
+    transformed_dir = os.path.join(work_dir, 'artifacts', 'dataset', 'transformed_data')
+    neighbor_dir = os.path.join(work_dir, 'artifacts', 'neighbor_index')
+    return {
+        'titles': np.load(os.path.join(transformed_dir, 'book_titles.npy'), allow_pickle=True).astype(str),
+        'user_ids': np.load(os.path.join(transformed_dir, 'user_ids.npy')),
+        'matrix': load_npz(os.path.join(transformed_dir, 'book_matrix.npz')).tocsr(),
+        'indices': np.load(os.path.join(neighbor_dir, 'neighbor_indices.npy')),
+        'distances': np.load(os.path.join(neighbor_dir, 'neighbor_distances.npy')),
+    }
+
+
+@pytest.mark.parametrize('model_type, neighbor_engine', [('knn', 'brute'), ('item_cosine', 'brute')])
+def test_incremental_update_matches_full_rebuild(tmp_path, model_type, neighbor_engine):
+    delta_file_path = tmp_path / 'delta.csv'
+    incremental = run_build(tmp_path / 'incremental', 'incremental', model_type, neighbor_engine, delta_file_path)
+    rebuild = run_build(tmp_path / 'rebuild', 'rebuild', model_type, neighbor_engine, delta_file_path)
+
+    # new titles and users are appended by the incremental update, so rows and columns are compared by name
+    assert sorted(incremental['titles']) == sorted(rebuild['titles'])
+    assert sorted(incremental['user_ids']) == sorted(rebuild['user_ids'])
+    assert incremental['matrix'].nnz == rebuild['matrix'].nnz
+
+    rebuild_row = {title: row for row, title in enumerate(rebuild['titles'])}
+    rows = np.array([rebuild_row[title] for title in incremental['titles']])
+    rebuild_column = {user: column for column, user in enumerate(rebuild['user_ids'])}
+    columns = np.array([rebuild_column[user] for user in incremental['user_ids']])
+    assert (incremental['matrix'] != rebuild['matrix'][rows][:, columns]).nnz == 0
+
+    # equal distances row by row, titles at exactly the same distance may be listed in another order
+    np.testing.assert_allclose(incremental['distances'], rebuild['distances'][rows], rtol=0, atol=1e-5)
+    for row, rebuild_row_id in enumerate(rows):
+        distances = incremental['distances'][row]
+        # titles strictly closer than the last listed distance are the same set in both builds
+        inside = distances < distances[-1] - 1e-5
+        assert (set(incremental['titles'][incremental['indices'][row][inside]])
+                == set(rebuild['titles'][rebuild['indices'][rebuild_row_id][inside]]))
+
+
+if __name__ == '__main__':
+    build(*sys.argv[1:])
@@ -0,0 +1,149 @@
+import io
+import os
+import socket
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from recommender.entity.config_entity import PosterCacheConfig
+from recommender.serving.poster_cache import PosterCache
+
+# Pillow is optional for the app, the thumbnails are checked with it
+Image = pytest.importorskip('PIL.Image')
+
+THUMBNAIL_WIDTH, THUMBNAIL_HEIGHT = 64, 96
+# the 43 byte transparent gif Amazon answers for covers it does not have
+TINY_GIF = (b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00'
+            b',\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;')
+
+
+def cover_jpeg(width=300, height=450) -> bytes:
+    image = Image.new('RGB', (width, height))
+    image.putdata([(x % 256, y % 256, (x * y) % 256) for y in range(height) for x in range(width)])
+    output = io.BytesIO()
+    image.save(output, format='JPEG')
+    return output.getvalue()
+
+
+COVER = cover_jpeg()
+
+
+class CoverHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.path.startswith('/cover'):
+            body, status, content_type = COVER, 200, 'image/jpeg'
+        elif self.path.startswith('/tiny'):
+            body, status, content_type = TINY_GIF, 200, 'image/gif'
+        else:
+            body, status, content_type = b'not found', 404, 'text/plain'
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port=0):
+    server = ThreadingHTTPServer(('127.0.0.1', port), CoverHandler)
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def server():
+    server = start_server()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_cache(cache_dir, max_bytes=1024 * 1024) -> PosterCache:
+    return PosterCache(PosterCacheConfig(poster_cache_dir=str(cache_dir), max_bytes=max_bytes,
+                                         thumbnail_width=THUMBNAIL_WIDTH, thumbnail_height=THUMBNAIL_HEIGHT,
+                                         fetch_workers=4, fetch_timeout=5))
+
+
+def url(server, path) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}{path}"
+
+
+def test_cover_is_cached_as_thumbnail(server, tmp_path):
+    cache = make_cache(tmp_path)
+    try:
+        poster = cache.get_poster(url(server, '/cover.jpg'))
+        image = Image.open(io.BytesIO(poster))
+        assert image.format == 'JPEG'
+        assert image.width <= THUMBNAIL_WIDTH and image.height <= THUMBNAIL_HEIGHT
+        assert len(poster) < len(COVER)
+
+        # the second request is served from disk
+        assert cache.get_poster(url(server, '/cover.jpg')) == poster
+        assert server.requests == ['/cover.jpg']
+    finally:
+        cache.close()
+
+
+def test_dead_covers_get_the_placeholder_and_are_not_fetched_again(server, tmp_path):
+    cache = make_cache(tmp_path)
+    try:
+        urls = [url(server, '/missing.jpg'), url(server, '/tiny.gif'), None, '']
+        assert cache.get_posters(urls) == [cache.placeholder] * len(urls)
+        assert cache.get_posters(urls) == [cache.placeholder] * len(urls)
+        assert sorted(server.requests) == ['/missing.jpg', '/tiny.gif']
+    finally:
+        cache.close()
+
+
+def test_refused_connection_is_not_cached(tmp_path):
+    # a port nothing listens on until the server below is started
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    cover_url = f"http://127.0.0.1:{port}/cover.jpg"
+
+    cache = make_cache(tmp_path)
+    try:
+        assert cache.get_poster(cover_url) == cache.placeholder
+        assert os.listdir(tmp_path) == ['placeholder.png']
+
+        server = start_server(port)
+        try:
+            poster = cache.get_poster(cover_url)
+            assert poster != cache.placeholder
+            assert server.requests == ['/cover.jpg']
+        finally:
+            server.shutdown()
+            server.server_close()
+    finally:
+        cache.close()
+
+
+def test_least_recently_used_cover_is_evicted_past_max_bytes(server, tmp_path):
+    # sized from one thumbnail so that two covers fit and a third does not
+    probe = make_cache(tmp_path / 'probe')
+    thumbnail_bytes = len(probe.get_poster(url(server, '/cover.jpg?probe')))
+    probe.close()
+
+    cache = make_cache(tmp_path / 'cache', max_bytes=int(2.5 * thumbnail_bytes))
+    try:
+        first, second, third = (url(server, f"/cover.jpg?{n}") for n in range(3))
+        cache.get_posters([first, second])
+        # first becomes the most recently used, second is the one to go
+        cache.get_poster(first)
+        cache.get_poster(third)
+
+        cached = set(os.listdir(tmp_path / 'cache')) - {'placeholder.png'}
+        assert cached == {PosterCache._key(first), PosterCache._key(third)}
+
+        # the evicted cover is downloaded again, the kept one is not
+        server.requests.clear()
+        cache.get_posters([first, second])
+        assert server.requests == ['/cover.jpg?1']
+    finally:
+        cache.close()